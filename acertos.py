@@ -0,0 +1,92 @@
+"""Saldos por membro e plano de acertos ("quem paga quem") de um grupo.
+
+Cada despesa é dividida igualmente entre `usuarios_ids`; quem pagou é
+`pagador_id` ou, se vazio, o primeiro de `usuarios_ids`. O saldo de um membro
+é o que pagou menos a sua parte (positivo = tem a receber).
+"""
+import heapq
+from typing import Dict, Iterable, List
+
+from odmantic import AIOEngine
+
+from arquivamento import limite_do_arquivo, unir_arquivo
+from models import Despesa
+
+
+# Soma no Mongo o que cada usuário pagou e o que deve, numa única agregação
+def _pipeline_saldos(grupo_id: str, com_arquivo: bool = False) -> list:
+    filtro = {"grupo_id": grupo_id, "usuarios_ids.0": {"$exists": True}}
+    return [
+        {"$match": filtro},
+        *([unir_arquivo(filtro)] if com_arquivo else []),
+        {"$project": {
+            "_id": 0,
+            "valor": 1,
+            "usuarios_ids": 1,
+            "pagador": {"$ifNull": ["$pagador_id", {"$arrayElemAt": ["$usuarios_ids", 0]}]},
+            "cota": {"$divide": ["$valor", {"$size": "$usuarios_ids"}]},
+        }},
+        {"$facet": {
+            "pago": [{"$group": {"_id": "$pagador", "valor": {"$sum": "$valor"}}}],
+            "devido": [
+                {"$unwind": "$usuarios_ids"},
+                {"$group": {"_id": "$usuarios_ids", "valor": {"$sum": "$cota"}}},
+            ],
+        }},
+    ]
+
+
+async def calcular_saldos(engine: AIOEngine, grupo_id: str, membros: Iterable[str] = ()) -> List[dict]:
+    """Retorna pago/devido/saldo de cada usuário (membros sem despesas entram zerados)."""
+    # Saldos valem para todo o histórico: inclui o arquivo se o grupo tiver despesas arquivadas
+    com_arquivo = await limite_do_arquivo(engine, grupo_id) is not None
+    resultado = await engine.get_collection(Despesa).aggregate(
+        _pipeline_saldos(grupo_id, com_arquivo), allowDiskUse=True
+    ).to_list(length=1)
+    pago = {linha["_id"]: linha["valor"] for linha in resultado[0]["pago"]} if resultado else {}
+    devido = {linha["_id"]: linha["valor"] for linha in resultado[0]["devido"]} if resultado else {}
+
+    saldos = []
+    for usuario_id in set(membros) | set(pago) | set(devido):
+        saldos.append({
+            "usuario_id": usuario_id,
+            "pago": round(pago.get(usuario_id, 0.0), 2),
+            "devido": round(devido.get(usuario_id, 0.0), 2),
+            "saldo": round(pago.get(usuario_id, 0.0) - devido.get(usuario_id, 0.0), 2),
+        })
+    saldos.sort(key=lambda s: (-s["saldo"], s["usuario_id"]))
+    return saldos
+
+
+def _em_centavos(saldos: Dict[str, float]) -> Dict[str, int]:
+    centavos = {usuario_id: round(valor * 100) for usuario_id, valor in saldos.items()}
+    # O arredondamento pode deixar sobra de alguns centavos: ajusta no maior saldo
+    sobra = sum(centavos.values())
+    if sobra and centavos:
+        maior = max(centavos, key=lambda u: abs(centavos[u]))
+        centavos[maior] -= sobra
+    return centavos
+
+
+def plano_de_acertos(saldos: Dict[str, float]) -> List[dict]:
+    """Gera transferências que zeram os saldos (no máximo n-1 transferências).
+
+    Guloso: o maior devedor paga o maior credor até um dos dois zerar.
+    """
+    centavos = _em_centavos(saldos)
+    credores = [(-valor, usuario_id) for usuario_id, valor in centavos.items() if valor > 0]
+    devedores = [(valor, usuario_id) for usuario_id, valor in centavos.items() if valor < 0]
+    heapq.heapify(credores)
+    heapq.heapify(devedores)
+
+    transferencias = []
+    while credores and devedores:
+        credito, credor = heapq.heappop(credores)
+        debito, devedor = heapq.heappop(devedores)
+        valor = min(-credito, -debito)
+        transferencias.append({"de": devedor, "para": credor, "valor": valor / 100})
+        if -credito > valor:
+            heapq.heappush(credores, (credito + valor, credor))
+        if -debito > valor:
+            heapq.heappush(devedores, (debito + valor, devedor))
+    return transferencias
@@ -0,0 +1,264 @@
+"""Arquivamento de despesas antigas ou já acertadas (coleção `despesa_arquivo`).
+
+A coleção `despesa` só cresce; as listagens do dia a dia só precisam das
+despesas recentes. Despesas mais antigas que `ARQUIVO_IDADE_DIAS` (tarefa
+periódica iniciada no lifespan) ou as de um grupo até uma data, arquivadas
+depois de um acerto (POST /grupos/{grupo_id}/arquivar), vão em lotes para
+`despesa_arquivo`: `insert_many` no arquivo e `delete_many` na coleção ativa na
+mesma transação (exige replica set; em um servidor standalone as duas etapas
+rodam sem transação, o delete só apaga a despesa que não mudou desde a cópia,
+e as leituras descartam duplicatas).
+
+Antes de mover, o limite do arquivo (global ou do grupo, e o maior de todos,
+usado nas leituras sem grupo) é gravado em `arquivo_limite`. As listagens de
+despesas só leem o arquivo quando a faixa pedida (`de`) começa antes desse
+limite; sem `de`, trazem só as despesas ativas; as exportações incluem sempre o
+arquivo. Arquivar não altera totais, saldos nem relatórios: os resumos e
+relatórios pré-agregados continuam valendo, e as agregações sobre as despesas
+(saldos, relatórios fora da cobertura, reconstruções) incluem o arquivo com
+`$unionWith` quando há algo arquivado.
+
+Rode a tarefa periódica em um único processo.
+
+Configuração (variáveis de ambiente):
+    ARQUIVO_IDADE_DIAS          idade a partir da qual a despesa é arquivada (padrão 0: tarefa desligada)
+    ARQUIVO_INTERVALO_SEGUNDOS  intervalo entre as execuções da tarefa (padrão 3600)
+    ARQUIVO_LOTE                despesas movidas por transação (padrão 1000)
+
+Execução avulsa:
+    python -m arquivamento --idade-dias 365
+"""
+import argparse
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from odmantic import AIOEngine
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+
+from cache import cache_entidades
+from coalescencia import buscar_documentos
+from eventos import publicar
+from models import Despesa, DespesaArquivada
+from paginacao import contar_total
+from versoes import chave_despesas_do_grupo, incrementar
+
+logger = logging.getLogger(__name__)
+
+IDADE_ARQUIVAMENTO_DIAS = int(os.getenv("ARQUIVO_IDADE_DIAS", "0"))
+INTERVALO_ARQUIVAMENTO = float(os.getenv("ARQUIVO_INTERVALO_SEGUNDOS", "3600"))
+TAMANHO_LOTE_ARQUIVAMENTO = int(os.getenv("ARQUIVO_LOTE", "1000"))
+
+COLECAO_LIMITES = "arquivo_limite"
+LIMITE_GLOBAL = "global"  # _id do limite por idade; os limites por grupo usam o id do grupo
+LIMITE_MAXIMO = "maximo"  # maior limite de qualquer escopo (leituras sem grupo: usuário, listagem geral)
+
+_sem_transacao = False  # servidor sem suporte a transações (standalone): ver _mover
+
+
+# Até quando pode haver despesas arquivadas do grupo (ou de qualquer grupo, sem grupo_id): lê só
+# os documentos de limite do escopo pelo _id. Não é coalescida: precisa refletir o limite gravado
+# antes de cada lote, senão uma leitura poderia pular despesas recém-movidas
+async def limite_do_arquivo(engine: AIOEngine, grupo_id: Optional[str] = None) -> Optional[datetime]:
+    chaves = [LIMITE_GLOBAL, grupo_id] if grupo_id is not None else [LIMITE_MAXIMO]
+    cursor = engine.database[COLECAO_LIMITES].find({"_id": {"$in": chaves}})
+    return max([doc["ate"] async for doc in cursor], default=None)
+
+
+# O limite do escopo e o maior de todos avançam juntos (nunca recuam)
+async def _avancar_limite(engine: AIOEngine, chave: str, ate: datetime) -> None:
+    await engine.database[COLECAO_LIMITES].bulk_write([
+        UpdateOne({"_id": chave}, {"$max": {"ate": ate}}, upsert=True),
+        UpdateOne({"_id": LIMITE_MAXIMO}, {"$max": {"ate": ate}}, upsert=True),
+    ])
+
+
+# Etapa de $unionWith que acrescenta as despesas arquivadas que casam com `filtro`
+def unir_arquivo(filtro: dict) -> dict:
+    return {"$unionWith": {"coll": DespesaArquivada.__collection__, "pipeline": [{"$match": filtro}]}}
+
+
+async def buscar_despesas(
+    engine: AIOEngine, filtro: dict, projecao: Optional[dict], inicio: Optional[datetime],
+    grupo_id: Optional[str] = None,
+) -> List[dict]:
+    """Despesas do filtro; o arquivo só é lido se a faixa começar antes do limite arquivado."""
+    # Coleção ativa primeiro: uma despesa movida depois desta leitura ainda aparece no arquivo
+    ativas = await buscar_documentos(engine.get_collection(Despesa), filtro, projecao)
+    if inicio is None:
+        return ativas
+    limite = await limite_do_arquivo(engine, grupo_id)
+    if limite is None or inicio >= limite:
+        return ativas
+    arquivadas = await buscar_documentos(engine.get_collection(DespesaArquivada), filtro, projecao)
+    vistas = {doc["_id"] for doc in ativas}
+    return [doc for doc in arquivadas if doc["_id"] not in vistas] + ativas
+
+
+async def buscar_pagina(
+    engine: AIOEngine, filtro: dict, projecao: Optional[dict], inicio: Optional[datetime],
+    ordem: List[Tuple[str, int]], skip: int, limit: int,
+) -> List[dict]:
+    """Uma página na ordem crescente de `ordem`; antes do limite arquivado, intercala as arquivadas."""
+    ativas = engine.get_collection(Despesa)
+    limite = await limite_do_arquivo(engine) if inicio is not None else None
+    if limite is None or inicio >= limite:
+        return await ativas.find(filtro, projecao, sort=ordem, skip=skip, limit=limit).to_list(length=limit)
+    # As duas coleções em ordem: a página sai das primeiras skip + limit de cada uma
+    quantos = skip + limit
+    docs = await ativas.find(filtro, projecao, sort=ordem, limit=quantos).to_list(length=quantos)
+    vistas = {doc["_id"] for doc in docs}
+    arquivadas = await engine.get_collection(DespesaArquivada).find(
+        filtro, projecao, sort=ordem, limit=quantos
+    ).to_list(length=quantos)
+    docs += [doc for doc in arquivadas if doc["_id"] not in vistas]
+    docs.sort(key=lambda doc: tuple(doc[campo] for campo, _ in ordem))
+    return docs[skip:quantos]
+
+
+async def contar_despesas(engine: AIOEngine, filtro: dict, inicio: Optional[datetime]) -> int:
+    """Total do filtro pela mesma regra de `buscar_pagina` (o arquivo só entra antes do limite arquivado)."""
+    total = await contar_total(engine.get_collection(Despesa), filtro)
+    limite = await limite_do_arquivo(engine) if inicio is not None else None
+    if limite is not None and inicio < limite:
+        total += await engine.get_collection(DespesaArquivada).count_documents(filtro)
+    return total
+
+
+async def _mover_sem_transacao(engine: AIOEngine, docs: List[dict]) -> List[dict]:
+    """Copia para o arquivo e apaga da coleção ativa só o que não mudou desde a leitura.
+
+    O delete de cada despesa filtra pelos campos copiados: uma atualização ou exclusão concorrente
+    faz o delete não casar, e a cópia no arquivo é descartada (a despesa atualizada continua ativa
+    e entra num próximo lote; a excluída não volta pelo arquivo). Devolve as despesas movidas.
+    """
+    arquivo = engine.get_collection(DespesaArquivada)
+    try:
+        await arquivo.insert_many(docs, ordered=False)
+    except BulkWriteError as exc:
+        # Já arquivadas numa execução interrompida antes do delete
+        if any(erro["code"] != 11000 for erro in exc.details["writeErrors"]):
+            raise
+    ativas = engine.get_collection(Despesa)
+    movidos, descartados = [], []
+    for doc in docs:
+        copiado = {campo: valor for campo, valor in doc.items() if campo != "arquivada_em"}
+        resultado = await ativas.delete_one(copiado)
+        (movidos if resultado.deleted_count else descartados).append(doc)
+    if descartados:
+        await arquivo.delete_many({"_id": {"$in": [doc["_id"] for doc in descartados]}})
+    return movidos
+
+
+async def _mover(engine: AIOEngine, filtro: dict, tamanho_lote: int) -> List[dict]:
+    """Move um lote (as mais antigas do filtro) para o arquivo; devolve os documentos movidos."""
+    global _sem_transacao
+    ativas = engine.get_collection(Despesa)
+    agora = datetime.utcnow()
+    movidos: List[dict] = []
+
+    async def lote(sessao) -> None:
+        docs = await ativas.find(
+            filtro, sort=[("data", ASCENDING), ("_id", ASCENDING)], limit=tamanho_lote, session=sessao
+        ).to_list(length=tamanho_lote)
+        if docs:
+            await engine.get_collection(DespesaArquivada).insert_many(
+                [{**doc, "arquivada_em": agora} for doc in docs], session=sessao
+            )
+            await ativas.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}}, session=sessao)
+        movidos[:] = docs
+
+    if not _sem_transacao:
+        try:
+            async with await engine.client.start_session() as sessao:
+                await sessao.with_transaction(lote)
+            return movidos
+        except OperationFailure as exc:
+            if exc.code != 20:  # IllegalOperation: transações só em replica set / mongos
+                raise
+            logger.warning("MongoDB sem suporte a transações: arquivando sem transação")
+            _sem_transacao = True
+
+    docs = await ativas.find(
+        filtro, sort=[("data", ASCENDING), ("_id", ASCENDING)], limit=tamanho_lote
+    ).to_list(length=tamanho_lote)
+    if not docs:
+        return []
+    # Se o lote inteiro mudou no meio tempo, nada foi movido e esta execução termina aqui
+    return await _mover_sem_transacao(engine, [{**doc, "arquivada_em": agora} for doc in docs])
+
+
+async def _depois_de_mover(engine: AIOEngine, docs: List[dict]) -> None:
+    por_grupo = defaultdict(list)
+    for doc in docs:
+        por_grupo[doc["grupo_id"]].append(str(doc["_id"]))
+    cache_entidades.invalidar(Despesa, *(doc["_id"] for doc in docs))
+    # As listagens sem `de` mudam: novas ETags e um evento por grupo
+    await incrementar(engine, *map(chave_despesas_do_grupo, por_grupo))
+    for grupo_id, ids in por_grupo.items():
+        publicar(grupo_id, "despesa.arquivada", {"ids": ids})
+
+
+async def _arquivar(engine: AIOEngine, chave_limite: str, filtro: dict, ate: datetime, tamanho_lote: int) -> int:
+    await _avancar_limite(engine, chave_limite, ate)  # antes de mover: as leituras passam a olhar o arquivo
+    total = 0
+    while True:
+        docs = await _mover(engine, filtro, tamanho_lote)
+        if not docs:
+            return total
+        await _depois_de_mover(engine, docs)
+        total += len(docs)
+
+
+async def arquivar_antigas(engine: AIOEngine, idade: timedelta, tamanho_lote: int = TAMANHO_LOTE_ARQUIVAMENTO) -> int:
+    """Arquiva as despesas com `data` anterior a agora menos `idade`; devolve quantas."""
+    ate = datetime.utcnow() - idade
+    return await _arquivar(engine, LIMITE_GLOBAL, {"data": {"$lt": ate}}, ate, tamanho_lote)
+
+
+async def arquivar_do_grupo(
+    engine: AIOEngine, grupo_id: str, ate: datetime, tamanho_lote: int = TAMANHO_LOTE_ARQUIVAMENTO
+) -> int:
+    """Arquiva as despesas do grupo com `data` anterior a `ate` (ex.: já acertadas)."""
+    return await _arquivar(engine, grupo_id, {"grupo_id": grupo_id, "data": {"$lt": ate}}, ate, tamanho_lote)
+
+
+async def _periodicamente(engine: AIOEngine) -> None:
+    while True:
+        try:
+            arquivadas = await arquivar_antigas(engine, timedelta(days=IDADE_ARQUIVAMENTO_DIAS))
+            if arquivadas:
+                logger.info("%d despesas arquivadas", arquivadas)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("falha ao arquivar despesas; nova tentativa no próximo intervalo")
+        await asyncio.sleep(INTERVALO_ARQUIVAMENTO)
+
+
+# Tarefa periódica (ARQUIVO_IDADE_DIAS > 0), iniciada e cancelada no lifespan
+def iniciar_arquivamento(engine: AIOEngine) -> List[asyncio.Task]:
+    if IDADE_ARQUIVAMENTO_DIAS <= 0:
+        return []
+    return [asyncio.create_task(_periodicamente(engine))]
+
+
+async def _main(idade_dias: int, tamanho_lote: int) -> None:
+    from database import conectar, criar_indices, desconectar
+
+    engine = await conectar()
+    await criar_indices()
+    print(f"despesa_arquivo: {await arquivar_antigas(engine, timedelta(days=idade_dias), tamanho_lote)} despesas arquivadas")
+    await desconectar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Arquiva as despesas mais antigas que a idade informada")
+    parser.add_argument("--idade-dias", type=int, required=True)
+    parser.add_argument("--lote", type=int, default=TAMANHO_LOTE_ARQUIVAMENTO)
+    args = parser.parse_args()
+    asyncio.run(_main(args.idade_dias, args.lote))
@@ -0,0 +1,77 @@
+"""Mede saldos e plano de acertos de um grupo grande (padrão: 100k despesas, 300 membros).
+
+Uso:
+    python -m benchmarks.acertos [--url mongodb://localhost:27017] [--despesas 100000] [--membros 300]
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from odmantic import AIOEngine
+
+from acertos import calcular_saldos, plano_de_acertos
+from models import Despesa
+
+GRUPO_ID = "grupo-benchmark"
+
+
+async def popular(engine: AIOEngine, quantidade: int, membros: list, semente: int = 42):
+    aleatorio = random.Random(semente)
+    colecao = engine.get_collection(Despesa)
+    inicio = datetime(2023, 1, 1)
+    lote = []
+    for i in range(quantidade):
+        envolvidos = aleatorio.sample(membros, aleatorio.randint(2, 8))
+        lote.append(Despesa(
+            titulo=f"Despesa {i}",
+            valor=round(aleatorio.uniform(1, 500), 2),
+            data=inicio + timedelta(minutes=i),
+            grupo_id=GRUPO_ID,
+            usuarios_ids=envolvidos,
+            pagador_id=aleatorio.choice(envolvidos),
+        ).model_dump_doc())
+        if len(lote) == 5000:
+            await colecao.insert_many(lote, ordered=False)
+            lote = []
+    if lote:
+        await colecao.insert_many(lote, ordered=False)
+
+
+async def executar(url: str, nome_banco: str, quantidade: int, quantidade_membros: int, repeticoes: int):
+    client = AsyncIOMotorClient(url)
+    engine = AIOEngine(client=client, database=nome_banco)
+    await client.drop_database(nome_banco)
+    await engine.configure_database([Despesa])
+    membros = [f"usuario-{i}" for i in range(quantidade_membros)]
+    await popular(engine, quantidade, membros)
+
+    tempos_saldos, tempos_plano = [], []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        saldos = await calcular_saldos(engine, GRUPO_ID, membros)
+        tempos_saldos.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        acertos = plano_de_acertos({s["usuario_id"]: s["saldo"] for s in saldos})
+        tempos_plano.append(time.perf_counter() - inicio)
+
+    print(f"{quantidade} despesas, {quantidade_membros} membros, {len(acertos)} transferências")
+    print(f"saldos (agregação): mediana {sorted(tempos_saldos)[repeticoes // 2] * 1000:8.1f} ms")
+    print(f"plano de acertos:   mediana {sorted(tempos_plano)[repeticoes // 2] * 1000:8.1f} ms")
+
+    await client.drop_database(nome_banco)
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="mongodb://localhost:27017")
+    parser.add_argument("--banco", default="facilitae_bench")
+    parser.add_argument("--despesas", type=int, default=100000)
+    parser.add_argument("--membros", type=int, default=300)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(executar(args.url, args.banco, args.despesas, args.membros, args.repeticoes))
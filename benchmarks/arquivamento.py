@@ -0,0 +1,99 @@
+"""Latência das listagens do dia a dia conforme o histórico cresce, sem e com arquivamento.
+
+Para cada tamanho de histórico, o grupo tem sempre `--ativas` despesas dos
+últimos 30 dias e o restante espalhado pelos 5 anos anteriores. Mede a mediana
+de GET /despesas/grupo/{id} e GET /despesas/usuario/{id} com tudo na coleção
+ativa e depois de arquivar o que tem mais de um ano: com o arquivo, a latência
+deve ficar estável qualquer que seja o histórico.
+
+Uso:
+    python -m benchmarks.arquivamento [--url mongodb://localhost:27017] [--historico 10000 100000 500000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from bson import ObjectId
+
+from models import Despesa
+
+LOTE_INSERCAO = 5000
+
+
+async def popular(engine, grupo_id: str, usuarios: list, total: int, ativas: int, semente: int = 42) -> None:
+    aleatorio = random.Random(semente)
+    agora = datetime.utcnow()
+    colecao = engine.get_collection(Despesa)
+    lote = []
+    for i in range(total):
+        if i < ativas:
+            data = agora - timedelta(minutes=aleatorio.randrange(30 * 24 * 60))
+        else:
+            data = agora - timedelta(days=400) - timedelta(minutes=aleatorio.randrange(5 * 365 * 24 * 60))
+        lote.append(Despesa(
+            titulo=f"Despesa {i}",
+            valor=round(aleatorio.uniform(1, 500), 2),
+            data=data,
+            grupo_id=grupo_id,
+            usuarios_ids=aleatorio.sample(usuarios, aleatorio.randint(1, len(usuarios))),
+        ).model_dump_doc())
+        if len(lote) == LOTE_INSERCAO:
+            await colecao.insert_many(lote, ordered=False)
+            lote = []
+    if lote:
+        await colecao.insert_many(lote, ordered=False)
+
+
+async def mediana_ms(cliente: httpx.AsyncClient, url: str, repeticoes: int) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resposta = await cliente.get(url)
+        tempos.append(time.perf_counter() - inicio)
+        resposta.raise_for_status()
+    return statistics.median(tempos) * 1000
+
+
+async def executar(args) -> None:
+    os.environ["DATABASE_URL"] = args.url
+    os.environ["DATABASE_NAME"] = args.banco
+    os.environ["COALESCENCIA_ATIVA"] = "0"  # cada requisição vai ao banco
+    import database
+    import main
+    from arquivamento import arquivar_antigas
+
+    engine = await database.conectar()
+    transporte = httpx.ASGITransport(app=main.app)
+    print(f"{'histórico':>10} | {'rota':<22} | {'sem arquivo':>12} | {'com arquivo':>12}")
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=300) as cliente:
+        for total in args.historico:
+            await database.client.drop_database(args.banco)
+            await database.criar_indices()
+            grupo_id = str((await cliente.post("/grupos/", json={"nome": "Bench"})).json()["id"])
+            usuarios = [str(ObjectId()) for _ in range(4)]
+            usuario_id = (await cliente.post("/usuarios/", json={"nome": "Bench", "email": "bench@x"})).json()["id"]
+            usuarios.append(usuario_id)
+            await popular(engine, grupo_id, usuarios, total, min(args.ativas, total))
+
+            rotas = {"despesas do grupo": f"/despesas/grupo/{grupo_id}", "despesas do usuário": f"/despesas/usuario/{usuario_id}"}
+            antes = {nome: await mediana_ms(cliente, url, args.repeticoes) for nome, url in rotas.items()}
+            await arquivar_antigas(engine, timedelta(days=365))
+            depois = {nome: await mediana_ms(cliente, url, args.repeticoes) for nome, url in rotas.items()}
+            for nome in rotas:
+                print(f"{total:>10} | {nome:<22} | {antes[nome]:>9.1f} ms | {depois[nome]:>9.1f} ms")
+    await database.desconectar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="mongodb://localhost:27017")
+    parser.add_argument("--banco", default="facilitae_bench_arquivo")
+    parser.add_argument("--historico", type=int, nargs="+", default=[10000, 100000, 500000])
+    parser.add_argument("--ativas", type=int, default=500)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    asyncio.run(executar(parser.parse_args()))
@@ -0,0 +1,84 @@
+"""Compara linhas/segundo da criação uma a uma (engine.save) com a ingestão em lote.
+
+Roda contra um MongoDB local, num banco separado que é apagado ao final.
+
+Uso:
+    python -m benchmarks.bulk_ingestao [--url mongodb://localhost:27017] [--linhas 20000] [--lote 1000]
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from odmantic import AIOEngine
+
+from importacao import inserir_em_lotes
+from models import Despesa
+
+
+def gerar_linhas(quantidade: int):
+    inicio = datetime(2024, 1, 1)
+    return [
+        {
+            "titulo": f"Lançamento {i}",
+            "valor": round(10 + i % 500 * 1.37, 2),
+            "data": (inicio + timedelta(minutes=i)).isoformat(),
+            "grupo_id": f"grupo-{i % 50}",
+            "usuarios_ids": [f"usuario-{i % 200}", f"usuario-{(i + 1) % 200}"],
+        }
+        for i in range(quantidade)
+    ]
+
+
+async def um_a_um(engine: AIOEngine, linhas) -> float:
+    """O caminho atual de criar_despesa: valida e salva cada documento."""
+    inicio = time.perf_counter()
+    for linha in linhas:
+        await engine.save(Despesa.model_validate(linha))
+    return time.perf_counter() - inicio
+
+
+async def em_lote(engine: AIOEngine, linhas, tamanho_lote: int) -> float:
+    async def iterar():
+        for linha in linhas:
+            yield linha
+
+    inicio = time.perf_counter()
+    resultado = await inserir_em_lotes(engine.get_collection(Despesa), Despesa, iterar(), tamanho_lote)
+    assert not resultado["erros"], resultado["erros"][:3]
+    return time.perf_counter() - inicio
+
+
+async def executar(url: str, nome_banco: str, quantidade: int, tamanho_lote: int):
+    client = AsyncIOMotorClient(url)
+    engine = AIOEngine(client=client, database=nome_banco)
+    await client.drop_database(nome_banco)
+    await engine.configure_database([Despesa])
+    linhas = gerar_linhas(quantidade)
+
+    resultados = {}
+    for nome, etapa in (
+        ("um_a_um", um_a_um(engine, linhas)),
+        (f"em_lote({tamanho_lote})", em_lote(engine, linhas, tamanho_lote)),
+    ):
+        await engine.get_collection(Despesa).delete_many({})
+        segundos = await etapa
+        resultados[nome] = quantidade / segundos
+        print(f"{nome:<18} {segundos:8.2f} s  {resultados[nome]:10.0f} linhas/s")
+
+    base, lote = resultados.values()
+    print(f"ganho: {lote / base:.1f}x")
+
+    await client.drop_database(nome_banco)
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="mongodb://localhost:27017")
+    parser.add_argument("--banco", default="facilitae_bench")
+    parser.add_argument("--linhas", type=int, default=20000)
+    parser.add_argument("--lote", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(executar(args.url, args.banco, args.linhas, args.lote))
@@ -0,0 +1,77 @@
+"""Compara a busca por nome antiga (regex sem âncora, case-insensitive) com a busca por prefixo e por texto.
+
+Uso:
+    python -m benchmarks.busca [--url mongodb://localhost:27017] [--usuarios 1000000]
+"""
+import argparse
+import asyncio
+import random
+import re
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from odmantic import AIOEngine
+
+from busca import buscar_por_nome
+from models import Usuario
+
+PRIMEIROS = ["Ana", "João", "José", "Maria", "Cleuvya", "Vitória", "Paulo", "Luíza", "Érica", "Otávio", "Beatriz", "Caio"]
+SOBRENOMES = ["Silva", "Souza", "Conceição", "Araújo", "Lima", "Gonçalves", "Pereira", "Ribeiro", "Câmara", "Nóbrega"]
+TERMOS = ["jo", "Vitória", "cleu", "maria sil", "otav", "zz"]
+
+
+async def popular(engine: AIOEngine, quantidade: int, semente: int = 42):
+    aleatorio = random.Random(semente)
+    colecao = engine.get_collection(Usuario)
+    lote = []
+    for i in range(quantidade):
+        nome = f"{aleatorio.choice(PRIMEIROS)} {aleatorio.choice(SOBRENOMES)} {i}"
+        lote.append(Usuario(nome=nome, email=f"u{i}@exemplo.com").model_dump_doc())
+        if len(lote) == 10000:
+            await colecao.insert_many(lote, ordered=False)
+            lote = []
+    if lote:
+        await colecao.insert_many(lote, ordered=False)
+
+
+async def regex_antiga(engine: AIOEngine, termo: str):
+    """O que buscar_usuario_por_nome fazia antes: regex livre, sem limite."""
+    return await engine.find(Usuario, Usuario.nome.match(re.compile(termo, re.IGNORECASE)))
+
+
+async def medir(funcao, repeticoes: int) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        await funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return sorted(tempos)[repeticoes // 2] * 1000
+
+
+async def executar(url: str, nome_banco: str, quantidade: int, repeticoes: int):
+    client = AsyncIOMotorClient(url)
+    engine = AIOEngine(client=client, database=nome_banco)
+    await client.drop_database(nome_banco)
+    await popular(engine, quantidade)
+    await engine.configure_database([Usuario])
+
+    print(f"{quantidade} usuários — mediana em ms")
+    print(f"{'termo':<12} {'regex antiga':>13} {'prefixo':>9} {'texto':>9}")
+    for termo in TERMOS:
+        antiga = await medir(lambda: regex_antiga(engine, termo), repeticoes)
+        prefixo = await medir(lambda: buscar_por_nome(engine, Usuario, termo, "prefixo"), repeticoes)
+        texto = await medir(lambda: buscar_por_nome(engine, Usuario, termo, "texto"), repeticoes)
+        print(f"{termo:<12} {antiga:13.1f} {prefixo:9.1f} {texto:9.1f}")
+
+    await client.drop_database(nome_banco)
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="mongodb://localhost:27017")
+    parser.add_argument("--banco", default="facilitae_bench")
+    parser.add_argument("--usuarios", type=int, default=1000000)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(executar(args.url, args.banco, args.usuarios, args.repeticoes))
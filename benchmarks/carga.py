@@ -0,0 +1,175 @@
+"""Driver de carga: dispara requisições em cada rota GET de `main.app` e mede a latência.
+
+Por padrão roda em processo (httpx + ASGITransport), usando um banco separado num
+`mongod` local, populado pelo gerador com semente fixa. Com `--base-url` mede um
+servidor já em execução (ex.: `DATABASE_NAME=facilitae_bench uvicorn main:app`),
+que deve apontar para o banco populado com os mesmos parâmetros.
+
+O resultado (vazão e p50/p95/p99 por rota) sai em JSON, para comparar execuções.
+
+Uso:
+    python -m benchmarks.carga [--url mongodb://localhost:27017] [--requisicoes 200] [--concorrencia 16]
+                               [--grupos 100] [--usuarios 2000] [--despesas 100000] [--escritas] [--saida resultado.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import httpx
+
+from benchmarks.gerador import gerar_dados
+
+# Rotas que não fazem sentido medir (o stream SSE não termina)
+ROTAS_IGNORADAS = {"/metrics", "/health/live", "/health/ready", "/grupos/{grupo_id}/eventos"}
+
+PARAMETROS_CONSULTA = {
+    "/despesas/": {"limit": 20},
+    "/usuarios/": {"limit": 20},
+    "/usuarios/buscar": {"query": "jo"},
+    "/grupos/buscar": {"query": "grupo 1"},
+}
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil por posição mais próxima (valores já ordenados)."""
+    if not valores:
+        return 0.0
+    posicao = max(0, min(len(valores) - 1, round(p / 100 * len(valores) + 0.5) - 1))
+    return valores[posicao]
+
+
+# Uma função que sorteia (método, url, corpo) para cada rota GET do app
+def montar_cenarios(app, ids: Dict[str, List[str]], aleatorio: random.Random, escritas: bool) -> Dict[str, Callable]:
+    substituicoes = {"grupo_id": "grupos", "usuario_id": "usuarios", "despesa_id": "despesas"}
+    cenarios = {}
+    # As rotas vêm do schema OpenAPI (rotas com include_in_schema=False ficam de fora)
+    for caminho, metodos in app.openapi()["paths"].items():
+        if "get" not in metodos or caminho in ROTAS_IGNORADAS:
+            continue
+        parametros = re.findall(r"{(\w+)}", caminho)
+        if any(p not in substituicoes for p in parametros):
+            continue
+
+        def sortear(caminho=caminho, parametros=parametros):
+            url = caminho
+            for parametro in parametros:
+                url = url.replace("{" + parametro + "}", aleatorio.choice(ids[substituicoes[parametro]]))
+            return "GET", url, PARAMETROS_CONSULTA.get(caminho), None
+
+        cenarios[f"GET {caminho}"] = sortear
+
+    if escritas:
+        def criar_despesa():
+            grupo_id = aleatorio.choice(ids["grupos"])
+            corpo = {"titulo": "Carga", "valor": round(aleatorio.uniform(1, 200), 2), "grupo_id": grupo_id,
+                     "usuarios_ids": aleatorio.sample(ids["usuarios"], 3)}
+            return "POST", "/despesas/", None, corpo
+
+        cenarios["POST /despesas/"] = criar_despesa
+    return cenarios
+
+
+async def medir_cenario(cliente: httpx.AsyncClient, sortear: Callable, requisicoes: int, concorrencia: int) -> dict:
+    latencias: List[float] = []
+    status: Dict[int, int] = {}
+    restantes = requisicoes
+
+    async def trabalhador():
+        nonlocal restantes
+        while restantes > 0:
+            restantes -= 1
+            metodo, url, params, corpo = sortear()
+            inicio = time.perf_counter()
+            resposta = await cliente.request(metodo, url, params=params, json=corpo)
+            await resposta.aread()
+            latencias.append(time.perf_counter() - inicio)
+            status[resposta.status_code] = status.get(resposta.status_code, 0) + 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+    duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        "requisicoes": len(latencias),
+        "vazao_rps": round(len(latencias) / duracao, 1),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 2),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2),
+        "max_ms": round(latencias[-1] * 1000, 2) if latencias else 0.0,
+        "status": {str(codigo): total for codigo, total in sorted(status.items())},
+    }
+
+
+async def executar(args) -> dict:
+    # O app lê a conexão das variáveis de ambiente na importação
+    os.environ["DATABASE_URL"] = args.url
+    os.environ["DATABASE_NAME"] = args.banco
+    import database
+    import main
+
+    # Em processo o lifespan não roda: conecta aqui (no modo HTTP o servidor já está conectado)
+    engine = await database.conectar()
+    ids = await gerar_dados(engine, args.grupos, args.usuarios, args.despesas, args.semente)
+    aleatorio = random.Random(args.semente)
+    cenarios = montar_cenarios(main.app, ids, aleatorio, args.escritas)
+    if args.rotas:
+        cenarios = {nome: f for nome, f in cenarios.items() if re.search(args.rotas, nome)}
+
+    if args.base_url:
+        cliente = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+    else:
+        cliente = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app, raise_app_exceptions=False), base_url="http://bench", timeout=60)
+
+    resultados = {}
+    async with cliente:
+        for nome, sortear in cenarios.items():
+            await medir_cenario(cliente, sortear, min(args.aquecimento, args.requisicoes), 1)
+            resultados[nome] = await medir_cenario(cliente, sortear, args.requisicoes, args.concorrencia)
+            print(f"{nome:<45} {resultados[nome]['vazao_rps']:>8} req/s  p95 {resultados[nome]['p95_ms']:>8} ms", file=sys.stderr)
+    await database.desconectar()
+
+    return {
+        "executado_em": datetime.now(timezone.utc).isoformat(),
+        "modo": "http" if args.base_url else "asgi",
+        "python": platform.python_version(),
+        "parametros": {
+            "grupos": args.grupos, "usuarios": args.usuarios, "despesas": args.despesas, "semente": args.semente,
+            "requisicoes": args.requisicoes, "concorrencia": args.concorrencia, "escritas": args.escritas,
+        },
+        "rotas": resultados,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="mongodb://localhost:27017")
+    parser.add_argument("--banco", default="facilitae_bench")
+    parser.add_argument("--base-url", help="mede um servidor HTTP em vez do app em processo")
+    parser.add_argument("--grupos", type=int, default=100)
+    parser.add_argument("--usuarios", type=int, default=2000)
+    parser.add_argument("--despesas", type=int, default=100000)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--requisicoes", type=int, default=200, help="requisições por rota")
+    parser.add_argument("--concorrencia", type=int, default=16)
+    parser.add_argument("--aquecimento", type=int, default=10, help="requisições descartadas por rota")
+    parser.add_argument("--rotas", help="regex para filtrar as rotas medidas (ex.: 'grupos')")
+    parser.add_argument("--escritas", action="store_true", help="inclui POST /despesas/")
+    parser.add_argument("--saida", help="arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args()
+
+    relatorio = asyncio.run(executar(args))
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto + "\n")
+    else:
+        print(texto)
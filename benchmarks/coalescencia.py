@@ -0,0 +1,96 @@
+"""Rajadas de requisições iguais com e sem coalescência: comandos do MongoDB e latência.
+
+Para cada rota, dispara `--simultaneas` GETs ao mesmo tempo, primeiro com o
+coalescedor desligado e depois ligado, e conta os comandos do MongoDB pelo
+/metrics (mongo_comando_duracao_segundos_count). Termina com código 1 se a
+coalescência não reduzir os comandos, se as respostas divergirem ou se uma
+rajada logo depois de uma escrita não enxergar a despesa nova.
+
+Uso:
+    python -m benchmarks.coalescencia [--url mongodb://localhost:27017] [--despesas 20000] [--simultaneas 50]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+from benchmarks.etag import comandos_por_colecao
+from benchmarks.gerador import gerar_dados
+
+
+async def rajada(cliente: httpx.AsyncClient, url: str, simultaneas: int):
+    """Devolve (comandos do MongoDB, corpos distintos, segundos) de uma rajada."""
+    antes = await comandos_por_colecao(cliente)
+    inicio = time.perf_counter()
+    respostas = await asyncio.gather(*(cliente.get(url) for _ in range(simultaneas)))
+    duracao = time.perf_counter() - inicio
+    depois = await comandos_por_colecao(cliente)
+    corpos = {resposta.content for resposta in respostas if resposta.status_code == 200}
+    if len(corpos) != 1 or any(resposta.status_code != 200 for resposta in respostas):
+        corpos.add(b"<status diferente de 200>")
+    return sum((depois - antes).values()), corpos, duracao
+
+
+async def executar(args) -> int:
+    os.environ["DATABASE_URL"] = args.url
+    os.environ["DATABASE_NAME"] = args.banco
+    os.environ["COALESCENCIA_JANELA_MS"] = str(args.janela_ms)
+    import database
+    import main
+    from coalescencia import coalescedor
+
+    engine = await database.conectar()
+    await database.criar_indices()
+    ids = await gerar_dados(engine, args.grupos, args.usuarios, args.despesas, args.semente)
+    grupo_id = ids["grupos"][0]  # o grupo com mais despesas
+    rotas = [
+        f"/despesas/grupo/{grupo_id}",
+        f"/despesas/grupo/{grupo_id}/despesas",
+    ]
+
+    falhas = 0
+    transporte = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=120) as cliente:
+        await cliente.get(rotas[0])  # aquece o cache de entidades (o grupo) e as conexões
+        for url in rotas:
+            resultados = {}
+            for ativo in (False, True):
+                coalescedor.ativo = ativo
+                coalescedor.invalidar()
+                resultados[ativo] = await rajada(cliente, url, args.simultaneas)
+            (sem, corpos_sem, t_sem), (com, corpos_com, t_com) = resultados[False], resultados[True]
+            print(f"{url:<60} {args.simultaneas} simultâneas | sem coalescência: {sem:4d} comandos, {t_sem * 1000:7.1f} ms"
+                  f" | com: {com:4d} comandos, {t_com * 1000:7.1f} ms")
+            if com >= sem or len(corpos_com) != 1 or corpos_com != corpos_sem:
+                falhas += 1
+
+        # Uma escrita descarta as leituras coalescidas: a rajada seguinte já vê a despesa nova
+        url = rotas[0]
+        await cliente.get(url)
+        nova = (await cliente.post("/despesas/", json={"titulo": "Nova", "valor": 1.0, "grupo_id": grupo_id, "usuarios_ids": []})).json()
+        _, corpos, _ = await rajada(cliente, url, args.simultaneas)
+        vista = len(corpos) == 1 and nova["id"].encode() in next(iter(corpos))
+        print(f"rajada depois de criar uma despesa: {'vê' if vista else 'NÃO vê'} a despesa nova")
+        if not vista:
+            falhas += 1
+        print(f"coalescedor: {coalescedor.estatisticas()}")
+
+    await database.desconectar()
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="mongodb://localhost:27017")
+    parser.add_argument("--banco", default="facilitae_bench")
+    parser.add_argument("--grupos", type=int, default=20)
+    parser.add_argument("--usuarios", type=int, default=500)
+    parser.add_argument("--despesas", type=int, default=20000)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--simultaneas", type=int, default=50)
+    parser.add_argument("--janela-ms", type=float, default=20)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(executar(args)))
@@ -0,0 +1,69 @@
+"""Dispara entradas simultâneas no mesmo grupo e confere que nenhuma se perdeu.
+
+Compara o fluxo antigo (ler o array `usuarios` do grupo, alterar a lista, regravar)
+com as participações da coleção membro (upsert no índice único). Sai com código 1
+se a coleção membro perder entradas.
+
+Uso:
+    python -m benchmarks.concorrencia_membros [--url mongodb://localhost:27017] [--usuarios 200]
+"""
+import argparse
+import asyncio
+import sys
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from odmantic import AIOEngine
+
+from membros import adicionar_membros
+from models import Grupo, Membro, Usuario
+
+
+# Fluxo antigo: cada requisição regrava o array inteiro que leu
+async def entrar_lendo_e_salvando(engine: AIOEngine, grupo_id, usuario_id: str):
+    colecao = engine.get_collection(Grupo)
+    doc = await colecao.find_one({"_id": grupo_id})
+    await asyncio.sleep(0)  # outras requisições intercalam aqui, como no servidor
+    await colecao.update_one({"_id": grupo_id}, {"$set": {"usuarios": doc.get("usuarios", []) + [usuario_id]}})
+
+
+async def rodada(engine: AIOEngine, usuarios_ids: list, atomico: bool) -> int:
+    grupo = await engine.save(Grupo(nome="Concorrência"))
+    if atomico:
+        tarefas = (adicionar_membros(engine, str(grupo.id), [u]) for u in usuarios_ids)
+    else:
+        tarefas = (entrar_lendo_e_salvando(engine, grupo.id, u) for u in usuarios_ids)
+    await asyncio.gather(*tarefas)
+    if atomico:
+        return await engine.get_collection(Membro).count_documents({"grupo_id": str(grupo.id)})
+    doc = await engine.get_collection(Grupo).find_one({"_id": grupo.id})
+    return len(set(doc.get("usuarios", [])))
+
+
+async def executar(url: str, nome_banco: str, quantidade: int) -> int:
+    client = AsyncIOMotorClient(url)
+    engine = AIOEngine(client=client, database=nome_banco)
+    await client.drop_database(nome_banco)
+    await engine.configure_database([Membro])
+
+    usuarios = [Usuario(nome=f"Usuário {i}", email=f"u{i}@exemplo.com") for i in range(quantidade)]
+    await engine.save_all(usuarios)
+    usuarios_ids = [str(u.id) for u in usuarios]
+
+    membros_antigo = await rodada(engine, usuarios_ids, atomico=False)
+    membros_atomico = await rodada(engine, usuarios_ids, atomico=True)
+    print(f"{quantidade} entradas simultâneas")
+    print(f"ler e salvar:     {membros_antigo:5d} membros ({quantidade - membros_antigo} perdidos)")
+    print(f"coleção membro:   {membros_atomico:5d} membros ({quantidade - membros_atomico} perdidos)")
+
+    await client.drop_database(nome_banco)
+    client.close()
+    return 0 if membros_atomico == quantidade else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="mongodb://localhost:27017")
+    parser.add_argument("--banco", default="facilitae_bench")
+    parser.add_argument("--usuarios", type=int, default=200)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(executar(args.url, args.banco, args.usuarios)))
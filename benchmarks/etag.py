@@ -0,0 +1,101 @@
+"""Conta os comandos do MongoDB de requisições repetidas com e sem If-None-Match.
+
+Para cada rota condicional, faz uma requisição normal (guarda a ETag) e depois
+`--repeticoes` requisições com If-None-Match. Os comandos são lidos de /metrics
+(mongo_comando_duracao_segundos_count, por coleção). Termina com código 1 se uma
+requisição condicional não devolver 304, tocar a coleção de despesas ou continuar
+devolvendo 304 depois de uma escrita no grupo.
+
+Uso:
+    python -m benchmarks.etag [--url mongodb://localhost:27017] [--despesas 20000] [--repeticoes 50]
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+from collections import Counter
+
+import httpx
+
+from benchmarks.gerador import gerar_dados
+
+PADRAO_CONTAGEM = re.compile(r'^mongo_comando_duracao_segundos_count\{colecao="([^"]*)",comando="([^"]*)"\} (\S+)$')
+
+
+async def comandos_por_colecao(cliente: httpx.AsyncClient) -> Counter:
+    texto = (await cliente.get("/metrics")).text
+    contagem = Counter()
+    for linha in texto.splitlines():
+        casamento = PADRAO_CONTAGEM.match(linha)
+        if casamento:
+            contagem[casamento.group(1)] += int(float(casamento.group(3)))
+    return contagem
+
+
+async def medir(cliente: httpx.AsyncClient, url: str, repeticoes: int, etag=None):
+    """Devolve (comandos por coleção, status recebidos, ETag) de `repeticoes` GETs."""
+    cabecalhos = {"If-None-Match": etag} if etag else {}
+    antes = await comandos_por_colecao(cliente)
+    status = Counter()
+    for _ in range(repeticoes):
+        resposta = await cliente.get(url, headers=cabecalhos)
+        status[resposta.status_code] += 1
+    depois = await comandos_por_colecao(cliente)
+    return depois - antes, status, resposta.headers.get("etag")
+
+
+async def executar(args) -> int:
+    os.environ["DATABASE_URL"] = args.url
+    os.environ["DATABASE_NAME"] = args.banco
+    os.environ.setdefault("CACHE_ENTIDADES_ATIVO", "0")  # conta também as leituras de entidades
+    import database
+    import main
+
+    engine = await database.conectar()
+    await database.criar_indices()
+    ids = await gerar_dados(engine, args.grupos, args.usuarios, args.despesas, args.semente)
+    grupo_id = ids["grupos"][0]  # o grupo com mais despesas
+    rotas = [
+        f"/despesas/grupo/{grupo_id}",
+        f"/despesas/grupo/{grupo_id}/despesas",
+        f"/grupos/{grupo_id}/usuarios",
+        f"/grupos/{grupo_id}",
+    ]
+
+    falhas = 0
+    transporte = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=60) as cliente:
+        for url in rotas:
+            sem_etag, _, etag = await medir(cliente, url, args.repeticoes)
+            com_etag, status, _ = await medir(cliente, url, args.repeticoes, etag)
+            print(f"{url:<60} sem ETag: {sum(sem_etag.values()) / args.repeticoes:5.1f} comandos/req"
+                  f"  com If-None-Match: {sum(com_etag.values()) / args.repeticoes:5.1f} comandos/req"
+                  f" {dict(com_etag)} status {dict(status)}")
+            if status != Counter({304: args.repeticoes}) or com_etag.get("despesa"):
+                falhas += 1
+
+        # Uma escrita no grupo tem que invalidar a ETag da listagem
+        url = rotas[0]
+        etag = (await cliente.get(url)).headers["etag"]
+        await cliente.post("/despesas/", json={"titulo": "Nova", "valor": 1.0, "grupo_id": grupo_id, "usuarios_ids": []})
+        depois_da_escrita = (await cliente.get(url, headers={"If-None-Match": etag})).status_code
+        print(f"depois de criar uma despesa: {depois_da_escrita} (esperado 200)")
+        if depois_da_escrita != 200:
+            falhas += 1
+
+    await database.desconectar()
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="mongodb://localhost:27017")
+    parser.add_argument("--banco", default="facilitae_bench")
+    parser.add_argument("--grupos", type=int, default=20)
+    parser.add_argument("--usuarios", type=int, default=500)
+    parser.add_argument("--despesas", type=int, default=20000)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--repeticoes", type=int, default=50)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(executar(args)))
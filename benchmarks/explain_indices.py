@@ -0,0 +1,110 @@
+"""Confere, via explain(), se as consultas usadas pelas rotas são servidas por índices.
+
+Roda contra um MongoDB local (banco separado) e termina com código 1 se alguma
+consulta cair em COLLSCAN.
+
+Uso:
+    python -m benchmarks.explain_indices [--url mongodb://localhost:27017] [--banco facilitae_bench]
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
+from odmantic import AIOEngine
+
+from models import COLACAO_NOME, Despesa, DespesaArquivada, Grupo, Membro, RelatorioMensal, Usuario
+
+
+# (rota, coleção, filtro, ordenação, collation) — espelham as consultas de rotas/
+# (onde a rota usa uma expressão do ODMantic, o filtro é montado com a mesma expressão)
+def consultas(grupo_id: str, usuario_id: str):
+    depois_de = lambda campo, valor: {"$or": [{campo: {"$gt": valor}}, {campo: valor, "_id": {"$gt": ObjectId(usuario_id)}}]}
+    return [
+        ("listar_todas_despesas", "despesa", {}, {"data": 1, "_id": 1}, None),
+        ("listar_todas_despesas (cursor)", "despesa", depois_de("data", datetime(2024, 1, 2)), {"data": 1, "_id": 1}, None),
+        ("listar_despesas_por_grupo", "despesa", {"grupo_id": grupo_id}, None, None),
+        ("listar_total_despesas_por_grupo", "resumo_grupo", {"_id": grupo_id}, None, None),
+        ("listar_despesas_do_usuario", "despesa", dict(Despesa.usuarios_ids == usuario_id), None, None),
+        ("autoexcluir_usuario", "despesa", dict(Despesa.usuarios_ids == usuario_id), None, None),
+        ("autoexcluir_usuario (arquivo)", "despesa_arquivo", dict(DespesaArquivada.usuarios_ids == usuario_id), None, None),
+        ("listar_usuarios", "usuario", {}, {"nome": 1, "_id": 1}, COLACAO_NOME),
+        ("listar_usuarios (cursor)", "usuario", depois_de("nome", "Usuário 5"), {"nome": 1, "_id": 1}, COLACAO_NOME),
+        ("listar_grupos_ordenados", "grupo", {}, {"nome": 1}, COLACAO_NOME),
+        ("buscar_usuario_por_nome", "usuario", {"nome_normalizado": {"$regex": "^usuario 1"}}, {"nome_normalizado": 1}, None),
+        ("buscar_grupo_por_nome", "grupo", {"nome_normalizado": {"$regex": "^grupo"}}, {"nome_normalizado": 1}, None),
+        ("listar_usuarios_do_grupo", "membro", {"grupo_id": grupo_id, "usuario_id": {"$gt": ""}}, {"usuario_id": 1}, None),
+        ("relatorio_do_grupo", "relatorio_mensal", {"escopo": "grupo", "dono_id": grupo_id, "mes": {"$gte": "2024-01"}}, {"mes": 1}, None),
+        ("relatorio_do_usuario (agregação)", "despesa", {"usuarios_ids": usuario_id, "data": {"$gte": datetime(2024, 1, 2)}}, None, None),
+        ("listar_grupos_do_usuario", "membro", {"usuario_id": usuario_id, "grupo_id": {"$gt": ""}}, {"grupo_id": 1}, None),
+    ]
+
+
+def estagios(plano):
+    """Percorre o plano vencedor e devolve todos os nomes de estágio."""
+    if isinstance(plano, dict):
+        if "stage" in plano:
+            yield plano["stage"]
+        for valor in plano.values():
+            yield from estagios(valor)
+    elif isinstance(plano, list):
+        for item in plano:
+            yield from estagios(item)
+
+
+async def popular(engine: AIOEngine, quantidade: int = 200):
+    """Insere alguns documentos para o planner ter estatísticas reais."""
+    grupo = Grupo(nome="Grupo Explain")
+    usuarios = [Usuario(nome=f"Usuário {i}", email=f"u{i}@exemplo.com") for i in range(20)]
+    await engine.save(grupo)
+    await engine.save_all(usuarios)
+    inicio = datetime(2024, 1, 1)
+    despesas = [
+        Despesa(
+            titulo=f"Despesa {i}",
+            valor=float(i),
+            data=inicio + timedelta(hours=i),
+            grupo_id=str(grupo.id),
+            usuarios_ids=[str(usuarios[i % 20].id), str(usuarios[(i + 1) % 20].id)],
+        )
+        for i in range(quantidade)
+    ]
+    await engine.save_all(despesas)
+    await engine.save_all([Membro(grupo_id=str(grupo.id), usuario_id=str(u.id)) for u in usuarios])
+    return str(grupo.id), str(usuarios[0].id)
+
+
+async def verificar(url: str, nome_banco: str) -> int:
+    client = AsyncIOMotorClient(url)
+    engine = AIOEngine(client=client, database=nome_banco)
+    await client.drop_database(nome_banco)
+    await engine.configure_database([Grupo, Usuario, Despesa, DespesaArquivada, Membro, RelatorioMensal])
+    grupo_id, usuario_id = await popular(engine)
+
+    falhas = 0
+    for rota, colecao, filtro, ordem, colacao in consultas(grupo_id, usuario_id):
+        comando = {"find": colecao, "filter": filtro}
+        if ordem:
+            comando["sort"] = ordem
+        if colacao:
+            comando["collation"] = colacao.document
+        explicacao = await engine.database.command({"explain": comando, "verbosity": "queryPlanner"})
+        nomes = list(estagios(explicacao["queryPlanner"]["winningPlan"]))
+        situacao = "COLLSCAN" if "COLLSCAN" in nomes else "ok"
+        if situacao != "ok":
+            falhas += 1
+        print(f"{rota:<35} {situacao:<9} {' > '.join(nomes)}")
+
+    await client.drop_database(nome_banco)
+    client.close()
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="mongodb://localhost:27017")
+    parser.add_argument("--banco", default="facilitae_bench")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(verificar(args.url, args.banco)))
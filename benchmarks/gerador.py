@@ -0,0 +1,122 @@
+"""Gerador determinístico (por semente) de grupos, usuários e despesas para benchmarks.
+
+Os grupos têm tamanhos variados, a maior parte das despesas cai em poucos grupos
+"quentes" e cada despesa envolve de 1 a 6 membros do grupo.
+
+Uso:
+    python -m benchmarks.gerador [--url mongodb://localhost:27017] [--banco facilitae_bench]
+                                 [--grupos 100] [--usuarios 2000] [--despesas 100000] [--semente 42]
+"""
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from odmantic import AIOEngine
+
+from models import MODELOS_COM_INDICES, Despesa, Grupo, Membro, Usuario
+from relatorios import marcar_cobertura
+from resumos import registrar_despesas
+
+PRIMEIROS = ["Ana", "João", "José", "Maria", "Cleuvya", "Vitória", "Paulo", "Luíza", "Érica", "Otávio", "Beatriz", "Caio"]
+SOBRENOMES = ["Silva", "Souza", "Conceição", "Araújo", "Lima", "Gonçalves", "Pereira", "Ribeiro", "Câmara", "Nóbrega"]
+TITULOS = ["Mercado", "Aluguel", "Luz", "Internet", "Jantar", "Uber", "Farmácia", "Cinema", "Gasolina", "Padaria"]
+
+TAMANHO_LOTE = 5000
+DATA_INICIAL = datetime(2023, 1, 1)
+
+
+async def _inserir(colecao, docs: List[dict]) -> None:
+    for inicio in range(0, len(docs), TAMANHO_LOTE):
+        await colecao.insert_many(docs[inicio:inicio + TAMANHO_LOTE], ordered=False)
+
+
+async def gerar_dados(
+    engine: AIOEngine, grupos: int, usuarios: int, despesas: int, semente: int = 42
+) -> Dict[str, List[str]]:
+    """Recria o banco do zero e o repopula; devolve os IDs gerados (como string) por tipo."""
+    aleatorio = random.Random(semente)
+    # Todas as coleções (arquivo, limites, versões, cobertura...) saem junto com o banco
+    await engine.client.drop_database(engine.database_name)
+    await engine.configure_database(MODELOS_COM_INDICES, update_existing_indexes=True)
+
+    lista_usuarios = [
+        Usuario(nome=f"{aleatorio.choice(PRIMEIROS)} {aleatorio.choice(SOBRENOMES)} {i}", email=f"usuario{i}@exemplo.com")
+        for i in range(usuarios)
+    ]
+    ids_usuarios = [str(u.id) for u in lista_usuarios]
+
+    # Tamanho dos grupos: maioria pequena, alguns grandes
+    lista_grupos = []
+    membros_por_grupo = {}
+    for i in range(grupos):
+        tamanho = min(usuarios, max(2, int(aleatorio.paretovariate(1.2) * 3)))
+        grupo = Grupo(nome=f"Grupo {i}")
+        lista_grupos.append(grupo)
+        membros_por_grupo[grupo.id] = aleatorio.sample(ids_usuarios, tamanho)
+    por_id = {str(u.id): u for u in lista_usuarios}
+    lista_membros = []
+    for grupo in lista_grupos:
+        for usuario_id in membros_por_grupo[grupo.id]:
+            lista_membros.append(Membro(grupo_id=str(grupo.id), usuario_id=usuario_id, data_entrada=grupo.data_criacao))
+            if por_id[usuario_id].grupo_id is None:
+                por_id[usuario_id].grupo_id = str(grupo.id)
+
+    await _inserir(engine.get_collection(Usuario), [u.model_dump_doc() for u in lista_usuarios])
+    await _inserir(engine.get_collection(Grupo), [g.model_dump_doc() for g in lista_grupos])
+    await _inserir(engine.get_collection(Membro), [m.model_dump_doc() for m in lista_membros])
+
+    # Poucos grupos concentram a maior parte das despesas (pesos tipo Zipf)
+    pesos = [1 / (posicao + 1) for posicao in range(grupos)]
+    lote = []
+    ids_despesas = []
+    for i in range(despesas):
+        grupo = aleatorio.choices(lista_grupos, weights=pesos)[0]
+        membros = membros_por_grupo[grupo.id]
+        envolvidos = aleatorio.sample(membros, min(len(membros), aleatorio.randint(1, 6)))
+        despesa = Despesa(
+            titulo=f"{aleatorio.choice(TITULOS)} {i}",
+            valor=round(aleatorio.lognormvariate(3.5, 1.0), 2),
+            data=DATA_INICIAL + timedelta(minutes=aleatorio.randrange(2 * 365 * 24 * 60)),
+            grupo_id=str(grupo.id),
+            usuarios_ids=envolvidos,
+            pagador_id=aleatorio.choice(envolvidos),
+        )
+        lote.append(despesa.model_dump_doc())
+        ids_despesas.append(str(despesa.id))
+        if len(lote) == TAMANHO_LOTE:
+            await _inserir(engine.get_collection(Despesa), lote)
+            await registrar_despesas(engine, lote)
+            lote = []
+    if lote:
+        await _inserir(engine.get_collection(Despesa), lote)
+        await registrar_despesas(engine, lote)
+    # Todas as despesas passaram por registrar_despesas: os relatórios cobrem todo o histórico
+    await marcar_cobertura(engine, None)
+
+    return {
+        "grupos": [str(g.id) for g in lista_grupos],
+        "usuarios": ids_usuarios,
+        "despesas": ids_despesas,
+    }
+
+
+async def _main(args) -> None:
+    client = AsyncIOMotorClient(args.url)
+    engine = AIOEngine(client=client, database=args.banco)
+    ids = await gerar_dados(engine, args.grupos, args.usuarios, args.despesas, args.semente)
+    print({tipo: len(valores) for tipo, valores in ids.items()})
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="mongodb://localhost:27017")
+    parser.add_argument("--banco", default="facilitae_bench")
+    parser.add_argument("--grupos", type=int, default=100)
+    parser.add_argument("--usuarios", type=int, default=2000)
+    parser.add_argument("--despesas", type=int, default=100000)
+    parser.add_argument("--semente", type=int, default=42)
+    asyncio.run(_main(parser.parse_args()))
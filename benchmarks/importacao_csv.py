@@ -0,0 +1,63 @@
+"""Confere a leitura de CSV em streaming da importação contra o `csv` lendo o arquivo inteiro.
+
+O corpo é entregue em pedaços cortados em todas as posições possíveis (inclusive
+no meio de um campo entre aspas com quebra de linha, de um "\\r\\n" e de um
+caractere UTF-8 de vários bytes). Não precisa de MongoDB; termina com código 1
+se alguma divisão produzir linhas diferentes.
+
+Uso:
+    python -m benchmarks.importacao_csv
+"""
+import asyncio
+import csv
+import io
+import sys
+
+from importacao import _converter_linha_csv, _linhas_csv
+
+CSV = (
+    "\ufefftitulo,valor,data,grupo_id,usuarios_ids\r\n"
+    '"Jantar, com ""vinho""",120.5,2024-01-02T20:00:00,g1,u1;u2\r\n'
+    '"Mercado\nlista:\r\n- pão\n- café",45,2024-01-03T10:00:00,g1,u1\n'
+    "\n"
+    "Açaí,12,2024-01-04T15:00:00,g2,u3\n"
+    '"Hotel\n\n2 diárias",800,2024-01-05T12:00:00,g2,"u2;u3"'
+)
+
+
+class _Requisicao:
+    def __init__(self, pedacos):
+        self.pedacos = pedacos
+
+    async def stream(self):
+        for pedaco in self.pedacos:
+            yield pedaco
+
+
+async def ler(pedacos):
+    return [linha async for linha in _linhas_csv(_Requisicao(pedacos))]
+
+
+def esperado():
+    leitor = csv.reader(io.StringIO(CSV.lstrip("\ufeff"), newline=""))
+    cabecalho = next(leitor)
+    return [_converter_linha_csv(cabecalho, valores) for valores in leitor if valores]
+
+
+async def executar() -> int:
+    corpo = CSV.encode("utf-8")
+    referencia = esperado()
+    divisoes = [[corpo]] + [[corpo[:i], corpo[i:]] for i in range(1, len(corpo))] + [[bytes([b]) for b in corpo]]
+    falhas = 0
+    for pedacos in divisoes:
+        linhas = await ler(pedacos)
+        if linhas != referencia:
+            falhas += 1
+            if falhas <= 3:
+                print(f"divisão em {[len(p) for p in pedacos][:3]}...: {linhas!r}")
+    print(f"{len(divisoes)} divisões do corpo, {len(referencia)} linhas esperadas: {falhas} com diferença")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(executar()))
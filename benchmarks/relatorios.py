@@ -0,0 +1,88 @@
+"""Compara o relatório mensal pré-agregado com a agregação direta para grupos de tamanhos diferentes.
+
+O tempo do relatório pré-agregado deve ficar estável com o número de despesas;
+o da agregação cresce junto.
+
+Uso:
+    python -m benchmarks.relatorios [--url mongodb://localhost:27017] [--despesas 10000 100000 1000000]
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from odmantic import AIOEngine
+
+from models import Despesa, RelatorioMensal, ResumoGrupo
+from relatorios import COLECAO_COBERTURA, gerar_relatorio, marcar_cobertura
+from resumos import registrar_despesas
+
+DATA_INICIAL = datetime(2023, 1, 1)
+DIAS = 2 * 365
+
+
+async def popular(engine: AIOEngine, grupo_id: str, quantidade: int, semente: int = 42):
+    aleatorio = random.Random(semente)
+    membros = [f"usuario-{i}" for i in range(20)]
+    lote = []
+    for i in range(quantidade):
+        envolvidos = aleatorio.sample(membros, aleatorio.randint(1, 6))
+        lote.append(Despesa(
+            titulo=f"Despesa {i}",
+            valor=round(aleatorio.uniform(1, 500), 2),
+            data=DATA_INICIAL + timedelta(minutes=aleatorio.randrange(DIAS * 24 * 60)),
+            grupo_id=grupo_id,
+            usuarios_ids=envolvidos,
+        ).model_dump_doc())
+        if len(lote) == 5000:
+            await engine.get_collection(Despesa).insert_many(lote, ordered=False)
+            await registrar_despesas(engine, lote)
+            lote = []
+    if lote:
+        await engine.get_collection(Despesa).insert_many(lote, ordered=False)
+        await registrar_despesas(engine, lote)
+
+
+async def mediana_ms(engine: AIOEngine, grupo_id: str, repeticoes: int) -> float:
+    de, ate = datetime(2023, 3, 15), datetime(2024, 9, 15)
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        await gerar_relatorio(engine, "grupo", grupo_id, de, ate, "mes")
+        tempos.append(time.perf_counter() - inicio)
+    return sorted(tempos)[repeticoes // 2] * 1000
+
+
+async def executar(url: str, nome_banco: str, tamanhos: list, repeticoes: int):
+    client = AsyncIOMotorClient(url)
+    engine = AIOEngine(client=client, database=nome_banco)
+    await client.drop_database(nome_banco)
+    await engine.configure_database([Despesa, RelatorioMensal])
+
+    print(f"{'despesas':>10} {'pré-agregado':>14} {'agregação':>12}")
+    for quantidade in tamanhos:
+        grupo_id = f"grupo-{quantidade}"
+        for modelo in (Despesa, RelatorioMensal, ResumoGrupo):
+            await engine.get_collection(modelo).delete_many({})
+        await popular(engine, grupo_id, quantidade)
+
+        await marcar_cobertura(engine, None)
+        pre_agregado = await mediana_ms(engine, grupo_id, repeticoes)
+        await engine.database[COLECAO_COBERTURA].delete_many({})  # sem cobertura: tudo pela agregação
+        agregacao = await mediana_ms(engine, grupo_id, repeticoes)
+        print(f"{quantidade:>10} {pre_agregado:>11.1f} ms {agregacao:>9.1f} ms")
+
+    await client.drop_database(nome_banco)
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="mongodb://localhost:27017")
+    parser.add_argument("--banco", default="facilitae_bench")
+    parser.add_argument("--despesas", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeticoes", type=int, default=7)
+    args = parser.parse_args()
+    asyncio.run(executar(args.url, args.banco, args.despesas, args.repeticoes))
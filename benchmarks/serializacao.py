@@ -0,0 +1,111 @@
+"""Tempo de CPU por 1.000 despesas: caminho antigo (modelos + response_model) x documentos brutos.
+
+Não precisa de MongoDB: os documentos são codificados em BSON e decodificados
+como o driver faria, então o custo de decodificação entra nos dois lados.
+"Com campos" simula a projeção (o servidor só manda titulo, valor e data).
+
+- antes: `Despesa.model_validate_doc` em cada documento e a serialização do
+  FastAPI para `response_model=List[Despesa]` (dump, validação, dump em modo
+  json e `json.dumps` do JSONResponse);
+- depois: `serializacao.converter_documentos` + `codificar_json` (orjson se
+  instalado; rode também sem ele para ver o ganho só do caminho bruto).
+
+Uso:
+    python -m benchmarks.serializacao [--documentos 1000] [--repeticoes 20]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+import bson
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+import serializacao
+from models import Despesa
+
+CAMPOS = ["titulo", "valor", "data"]
+
+
+def gerar_bson(quantidade: int, semente: int = 42) -> List[bytes]:
+    aleatorio = random.Random(semente)
+    usuarios = [str(bson.ObjectId()) for _ in range(20)]
+    grupo_id = str(bson.ObjectId())
+    docs = []
+    for i in range(quantidade):
+        envolvidos = aleatorio.sample(usuarios, aleatorio.randint(1, 6))
+        docs.append(Despesa(
+            titulo=f"Despesa {i}",
+            valor=round(aleatorio.uniform(1, 500), 2),
+            data=datetime(2024, 1, 1) + timedelta(minutes=aleatorio.randrange(365 * 24 * 60)),
+            grupo_id=grupo_id,
+            usuarios_ids=envolvidos,
+            pagador_id=envolvidos[0],
+        ).model_dump_doc())
+        if i % 10 == 0:
+            docs[-1]["valor"] = int(docs[-1]["valor"])  # documentos antigos com `valor` inteiro
+    return [bson.encode(doc) for doc in docs]
+
+
+def projetar(dados: List[bytes], campos: List[str]) -> List[bytes]:
+    projetados = []
+    for bruto in dados:
+        doc = bson.decode(bruto)
+        projetados.append(bson.encode({"_id": doc["_id"], **{campo: doc[campo] for campo in campos}}))
+    return projetados
+
+
+def antes(dados: List[bytes], campo_resposta) -> bytes:
+    despesas = [Despesa.model_validate_doc(bson.decode(bruto)) for bruto in dados]
+    conteudo = asyncio.run(serialize_response(field=campo_resposta, response_content=despesas))
+    # Mesmo render do JSONResponse do Starlette
+    return json.dumps(conteudo, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode()
+
+
+def depois(dados: List[bytes], campos=None) -> bytes:
+    docs = [bson.decode(bruto) for bruto in dados]
+    return serializacao.codificar_json(serializacao.converter_documentos(Despesa, docs, campos))
+
+
+def cpu_por_mil(funcao, documentos: int, repeticoes: int) -> float:
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.process_time()
+        funcao()
+        tempos.append(time.process_time() - inicio)
+    return sorted(tempos)[repeticoes // 2] * 1000 * 1000 / documentos
+
+
+def executar(documentos: int, repeticoes: int):
+    dados = gerar_bson(documentos)
+    projetados = projetar(dados, CAMPOS)
+    campo_resposta = create_model_field("Response_listar", List[Despesa], mode="serialization")
+
+    # Os dois caminhos precisam produzir o mesmo JSON (10 e 10.0 contam como diferentes)
+    ler = lambda saida: json.loads(saida, parse_int=lambda texto: f"int:{texto}")
+    assert ler(antes(dados, campo_resposta)) == ler(depois(dados)), "saídas diferentes"
+
+    encoder = "orjson" if serializacao.orjson is not None else "json (stdlib)"
+    print(f"{documentos} documentos, mediana de {repeticoes} repetições, encoder: {encoder}")
+    linhas = [
+        ("antes (modelos + response_model)", lambda: antes(dados, campo_resposta)),
+        ("depois (documentos brutos)", lambda: depois(dados)),
+        (f"depois, campos={','.join(CAMPOS)}", lambda: depois(projetados, CAMPOS)),
+    ]
+    base = None
+    for nome, funcao in linhas:
+        ms = cpu_por_mil(funcao, documentos, repeticoes)
+        base = base or ms
+        print(f"  {nome:<40} {ms:8.2f} ms CPU / 1.000 docs  ({base / ms:4.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documentos", type=int, default=1000)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+    executar(args.documentos, args.repeticoes)
@@ -0,0 +1,80 @@
+"""Busca de grupos e usuários por nome.
+
+- modo "prefixo": casa o início de `nome_normalizado` (minúsculas, sem acentos) com
+  uma regex ancorada e escapada, servida pelo índice `nome_normalizado`;
+- modo "texto": busca por palavras no índice de texto de `nome`.
+
+Documentos antigos sem `nome_normalizado` podem ser preenchidos com:
+    python -m busca
+"""
+import asyncio
+import re
+from typing import List, Literal, Type, TypeVar
+
+from odmantic import AIOEngine, Model
+from pymongo import ASCENDING, UpdateOne
+
+from models import Grupo, Usuario, normalizar_nome
+
+ModelType = TypeVar("ModelType", bound=Model)
+
+ModoBusca = Literal["prefixo", "texto"]
+
+TAMANHO_LOTE_NORMALIZACAO = 1000
+
+
+async def buscar_por_nome(
+    engine: AIOEngine, modelo: Type[ModelType], termo: str, modo: ModoBusca = "prefixo", limite: int = 20
+) -> List[ModelType]:
+    colecao = engine.get_collection(modelo)
+    if modo == "texto":
+        cursor = colecao.find(
+            {"$text": {"$search": termo}},
+            {"score": {"$meta": "textScore"}},
+            sort=[("score", {"$meta": "textScore"})],
+            limit=limite,
+        )
+    else:
+        prefixo = normalizar_nome(termo)
+        if not prefixo:
+            return []
+        cursor = colecao.find(
+            # Regex ancorada e sem flags: o Mongo limita a varredura ao intervalo do índice
+            {"nome_normalizado": {"$regex": "^" + re.escape(prefixo)}},
+            sort=[("nome_normalizado", ASCENDING)],
+            limit=limite,
+        )
+
+    resultados = []
+    async for doc in cursor:
+        doc.pop("score", None)
+        resultados.append(modelo.model_validate_doc(doc))
+    return resultados
+
+
+# Preenche nome_normalizado nos documentos gravados antes da existência do campo
+async def preencher_nomes_normalizados(engine: AIOEngine, modelo: Type[Model]) -> int:
+    colecao = engine.get_collection(modelo)
+    atualizados = 0
+    operacoes = []
+    async for doc in colecao.find({"nome_normalizado": {"$exists": False}}, {"nome": 1}):
+        operacoes.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"nome_normalizado": normalizar_nome(doc.get("nome", ""))}}))
+        if len(operacoes) >= TAMANHO_LOTE_NORMALIZACAO:
+            atualizados += (await colecao.bulk_write(operacoes, ordered=False)).modified_count
+            operacoes = []
+    if operacoes:
+        atualizados += (await colecao.bulk_write(operacoes, ordered=False)).modified_count
+    return atualizados
+
+
+async def _main() -> None:
+    from database import conectar, desconectar
+
+    engine = await conectar()
+    for modelo in (Grupo, Usuario):
+        print(f"{modelo.__collection__}: {await preencher_nomes_normalizados(engine, modelo)} documentos atualizados")
+    await desconectar()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
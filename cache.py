@@ -0,0 +1,104 @@
+"""Cache em memória (por processo) das entidades buscadas por ID.
+
+Usado pelos helpers `get_*_or_404` nas rotas de leitura: guarda o documento bruto
+por (coleção, ObjectId) com limite de tamanho (LRU), TTL e cache negativo para IDs
+inexistentes. As rotas de escrita chamam `invalidar` para as entidades que alteram,
+mas a invalidação vale só para o processo atual: com vários workers uma entrada
+pode ter até o TTL de idade. Por isso as rotas de escrita leem com
+`usar_cache=False` e nunca partem de uma cópia antiga.
+
+Configuração (variáveis de ambiente):
+    CACHE_ENTIDADES_ATIVO   "0" desliga o cache (padrão "1")
+    CACHE_ENTIDADES_TAMANHO número máximo de entradas (padrão 10000)
+    CACHE_ENTIDADES_TTL     segundos de validade de cada entrada (padrão 5)
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Type, TypeVar
+
+from bson import ObjectId
+from odmantic import AIOEngine, Model
+
+ModelType = TypeVar("ModelType", bound=Model)
+
+_AUSENTE = object()
+
+
+class CacheEntidades:
+    def __init__(self, tamanho_maximo: int = 10000, ttl: float = 5.0, ativo: bool = True):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self.ativo = ativo
+        self._entradas: "OrderedDict[tuple, tuple]" = OrderedDict()  # chave -> (expira_em, doc ou None)
+        self.acertos = 0
+        self.falhas = 0
+        self.despejos = 0
+
+    @staticmethod
+    def _chave(modelo: Type[Model], _id) -> tuple:
+        return (modelo.__collection__, _id)
+
+    def _ler(self, chave):
+        entrada = self._entradas.get(chave)
+        if entrada is None:
+            return _AUSENTE
+        expira_em, doc = entrada
+        if expira_em < time.monotonic():
+            del self._entradas[chave]
+            return _AUSENTE
+        self._entradas.move_to_end(chave)
+        return doc
+
+    def _gravar(self, chave, doc: Optional[dict]) -> None:
+        self._entradas[chave] = (time.monotonic() + self.ttl, doc)
+        self._entradas.move_to_end(chave)
+        while len(self._entradas) > self.tamanho_maximo:
+            self._entradas.popitem(last=False)
+            self.despejos += 1
+
+    async def obter(
+        self, engine: AIOEngine, modelo: Type[ModelType], _id: ObjectId, usar_cache: bool = True
+    ) -> Optional[ModelType]:
+        """Busca pelo `_id`, passando pelo cache (exceto com `usar_cache=False`). Retorna None se não existir."""
+        if not self.ativo or not usar_cache:
+            return await engine.find_one(modelo, modelo.id == _id)
+
+        chave = self._chave(modelo, _id)
+        doc = self._ler(chave)
+        if doc is _AUSENTE:
+            self.falhas += 1
+            doc = await engine.get_collection(modelo).find_one({"_id": _id})
+            self._gravar(chave, doc)
+        else:
+            self.acertos += 1
+
+        if doc is None:
+            return None
+        # Cada chamada recebe uma instância nova: as rotas podem alterá-la sem afetar o cache
+        instancia = modelo.model_validate_doc(doc)
+        object.__setattr__(instancia, "__fields_modified__", set())  # como o engine faz no find
+        return instancia
+
+    def invalidar(self, modelo: Type[Model], *ids) -> None:
+        for _id in ids:
+            self._entradas.pop(self._chave(modelo, ObjectId(_id) if isinstance(_id, str) else _id), None)
+
+    def limpar(self) -> None:
+        self._entradas.clear()
+
+    def estatisticas(self) -> dict:
+        return {
+            "ativo": self.ativo,
+            "entradas": len(self._entradas),
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "despejos": self.despejos,
+        }
+
+
+cache_entidades = CacheEntidades(
+    tamanho_maximo=int(os.getenv("CACHE_ENTIDADES_TAMANHO", "10000")),
+    ttl=float(os.getenv("CACHE_ENTIDADES_TTL", "5")),
+    ativo=os.getenv("CACHE_ENTIDADES_ATIVO", "1") != "0",
+)
@@ -0,0 +1,111 @@
+"""Coalescência (single-flight) de leituras idênticas e simultâneas.
+
+Quando muitas requisições pedem a mesma coisa ao mesmo tempo (ex.: o painel de
+um grupo popular abrindo em vários celulares), só a primeira vai ao MongoDB; as
+outras aguardam a mesma consulta em andamento. A chave é a forma da consulta:
+coleção, operação, filtro e opções (projeção, ordenação, limite...).
+
+Opcionalmente o resultado fica disponível por uma janela curta (dezenas de ms)
+depois de pronto, para absorver rajadas que chegam logo em seguida. As rotas de
+escrita descartam tudo (`invalidar`, chamado por versoes.incrementar), então
+uma leitura feita depois de uma escrita no mesmo processo não recebe dados de
+antes dela. Entre processos vale o mesmo que para o cache de entidades.
+
+Os resultados são compartilhados entre as requisições: quem recebe não deve
+alterá-los (as rotas só leem os documentos ou os convertem em novos objetos).
+
+Configuração (variáveis de ambiente):
+    COALESCENCIA_ATIVA      "0" desliga (padrão "1")
+    COALESCENCIA_JANELA_MS  milissegundos em que um resultado pronto ainda é reaproveitado (padrão 20; 0 desliga)
+    COALESCENCIA_TAMANHO    máximo de resultados guardados na janela (padrão 1000)
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import bson
+
+
+class Coalescedor:
+    def __init__(self, janela: float = 0.02, tamanho_maximo: int = 1000, ativo: bool = True):
+        self.janela = janela
+        self.tamanho_maximo = tamanho_maximo
+        self.ativo = ativo
+        self._em_andamento: Dict[tuple, asyncio.Future] = {}
+        self._recentes: "OrderedDict[tuple, tuple]" = OrderedDict()  # chave -> (expira_em, resultado)
+        self.executadas = 0  # consultas que de fato foram ao MongoDB
+        self.coalescidas = 0  # requisições que aguardaram uma consulta em andamento
+        self.na_janela = 0  # requisições atendidas por um resultado recente
+
+    async def executar(self, chave: tuple, consulta: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.ativo:
+            return await consulta()
+
+        entrada = self._recentes.get(chave)
+        if entrada is not None:
+            if entrada[0] >= time.monotonic():
+                self.na_janela += 1
+                return entrada[1]
+            del self._recentes[chave]
+
+        tarefa = self._em_andamento.get(chave)
+        if tarefa is None:
+            self.executadas += 1
+            # Tarefa própria: se a requisição que iniciou a consulta for cancelada, as outras seguem
+            tarefa = self._em_andamento[chave] = asyncio.ensure_future(consulta())
+            tarefa.add_done_callback(lambda t: self._concluir(chave, t))
+        else:
+            self.coalescidas += 1
+        return await asyncio.shield(tarefa)
+
+    def _concluir(self, chave: tuple, tarefa: asyncio.Future) -> None:
+        if self._em_andamento.get(chave) is not tarefa:
+            return  # descartada por invalidar() enquanto rodava
+        del self._em_andamento[chave]
+        if self.janela <= 0 or tarefa.cancelled() or tarefa.exception() is not None:
+            return
+        self._recentes[chave] = (time.monotonic() + self.janela, tarefa.result())
+        self._recentes.move_to_end(chave)
+        while len(self._recentes) > self.tamanho_maximo:
+            self._recentes.popitem(last=False)
+
+    def invalidar(self) -> None:
+        """Esquece consultas em andamento e resultados recentes (as próximas leituras vão ao banco)."""
+        self._em_andamento.clear()
+        self._recentes.clear()
+
+    def estatisticas(self) -> dict:
+        return {
+            "ativo": self.ativo,
+            "em_andamento": len(self._em_andamento),
+            "executadas": self.executadas,
+            "coalescidas": self.coalescidas,
+            "na_janela": self.na_janela,
+        }
+
+
+coalescedor = Coalescedor(
+    janela=float(os.getenv("COALESCENCIA_JANELA_MS", "20")) / 1000,
+    tamanho_maximo=int(os.getenv("COALESCENCIA_TAMANHO", "1000")),
+    ativo=os.getenv("COALESCENCIA_ATIVA", "1") != "0",
+)
+
+
+# Chave pela forma da consulta; o BSON preserva tipos (ObjectId, datetime) e a ordem dos campos
+def chave_consulta(colecao, operacao: str, filtro: dict, **opcoes) -> tuple:
+    opcoes = {nome: getattr(valor, "document", valor) for nome, valor in opcoes.items() if valor is not None}
+    return (colecao.name, operacao, bson.encode(filtro), bson.encode(opcoes))
+
+
+async def buscar_documentos(colecao, filtro: dict, projecao: Optional[dict] = None, **opcoes) -> list:
+    """`find(...).to_list()` coalescido; `opcoes` são repassadas ao find (sort, skip, limit, collation)."""
+    chave = chave_consulta(colecao, "find", filtro, projection=projecao, **opcoes)
+    return await coalescedor.executar(
+        chave, lambda: colecao.find(filtro, projecao, **opcoes).to_list(length=opcoes.get("limit") or None)
+    )
+
+
+async def buscar_um(colecao, filtro: dict) -> Optional[dict]:
+    return await coalescedor.executar(chave_consulta(colecao, "find_one", filtro), lambda: colecao.find_one(filtro))
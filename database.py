@@ -1,7 +1,18 @@
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
 from odmantic import AIOEngine
+from odmantic.index import ODMBaseIndex
+from pymongo.errors import OperationFailure
+from typing import Optional
+import asyncio
+import logging
 import os
+import time
+
+from models import MODELOS_COM_INDICES
+from metricas import listeners_mongo, monitor_pool
+
+logger = logging.getLogger(__name__)
 
 # Carregar variáveis do arquivo .env
 load_dotenv()
@@ -9,19 +20,147 @@ load_dotenv()
 # URL do MongoDB do arquivo .env
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Nome do banco (benchmarks usam um banco separado)
+DATABASE_NAME = os.getenv("DATABASE_NAME", "facilitae")
+
 # Valida se a URL foi carregada corretamente
 if not DATABASE_URL:
     raise ValueError("A variável de ambiente DATABASE_URL não foi definida.")
 
-# Criar o cliente do MongoDB
-client = AsyncIOMotorClient(DATABASE_URL)
+# Ajustes do pool de conexões (por processo), configuráveis por deploy
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")  # ex.: "zstd,snappy,zlib"
+
+# Cliente e engine são criados no lifespan da aplicação (ver conectar)
+client: Optional[AsyncIOMotorClient] = None
+_engine: Optional[AIOEngine] = None
+
+
+class _EngineAtual:
+    """Repassa as chamadas para o AIOEngine criado em `conectar`.
+
+    Os routers guardam `engine = get_engine()` na importação, antes de existir
+    conexão; este objeto resolve o engine real a cada uso.
+    """
+
+    def __getattr__(self, nome):
+        if _engine is None:
+            raise RuntimeError("Banco de dados não conectado: chame conectar() no startup da aplicação.")
+        return getattr(_engine, nome)
 
-# Definir o banco de dados a ser usado
-db = client.get_database("facilitae")
 
-# Criar uma instância do AIOEngine do ODMantic
-engine = AIOEngine(client=client, database="facilitae")
+engine = _EngineAtual()
+
 
 # Função para retornar a instância do AIOEngine
 def get_engine() -> AIOEngine:
-    return engine
\ No newline at end of file
+    return engine
+
+
+def opcoes_cliente() -> dict:
+    opcoes = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "event_listeners": listeners_mongo(),  # métricas: ver metricas.py
+    }
+    if MONGO_COMPRESSORS:
+        opcoes["compressors"] = MONGO_COMPRESSORS
+    return opcoes
+
+
+# Cria o cliente, confirma o acesso ao servidor e abre o pool mínimo antes de receber tráfego
+async def conectar() -> AIOEngine:
+    global client, _engine
+    client = AsyncIOMotorClient(DATABASE_URL, **opcoes_cliente())
+    _engine = AIOEngine(client=client, database=DATABASE_NAME)
+
+    banco = client.get_database(DATABASE_NAME)
+    await banco.command("ping")
+    # Pings simultâneos forçam a abertura de MONGO_MIN_POOL_SIZE conexões agora,
+    # e não nas primeiras requisições dos usuários
+    await asyncio.gather(*(banco.command("ping") for _ in range(MONGO_MIN_POOL_SIZE)))
+    return _engine
+
+
+async def desconectar() -> None:
+    global client, _engine
+    if client is not None:
+        client.close()
+    client, _engine = None, None
+
+
+# Mede o round-trip até o MongoDB e a ocupação do pool (usado em /health/ready)
+async def verificar_prontidao() -> dict:
+    if client is None:
+        return {"pronto": False, "erro": "sem conexão"}
+    inicio = time.perf_counter()
+    try:
+        await client.get_database(DATABASE_NAME).command("ping")
+    except Exception as exc:
+        return {"pronto": False, "erro": str(exc)}
+    latencia_ms = (time.perf_counter() - inicio) * 1000
+    em_uso = monitor_pool.em_uso()  # no servidor mais ocupado
+    return {
+        "pronto": True,
+        "latencia_ms": round(latencia_ms, 2),
+        "pool": {
+            "abertas": monitor_pool.abertas(),
+            "em_uso": em_uso,
+            "maximo": MONGO_MAX_POOL_SIZE,
+            "saturacao": round(em_uso / MONGO_MAX_POOL_SIZE, 3) if MONGO_MAX_POOL_SIZE else None,
+        },
+    }
+
+
+# Códigos do MongoDB para "já existe um índice com esse nome/chaves e outra definição"
+CONFLITOS_DE_INDICE = (85, 86)  # IndexOptionsConflict, IndexKeySpecsConflict
+
+
+# Cria os índices declarados em models.py que ainda não existem. Roda no startup de
+# cada worker, então nunca apaga índices: um índice cuja definição mudou fica como
+# está (com um aviso no log) até a migração avulsa `python -m database --migrar-indices`
+async def criar_indices() -> None:
+    for modelo in MODELOS_COM_INDICES:
+        colecao = engine.get_collection(modelo)
+        for indice in modelo.__indexes__():
+            indice = indice.get_pymongo_index() if isinstance(indice, ODMBaseIndex) else indice
+            try:
+                await colecao.create_indexes([indice])
+            except OperationFailure as exc:
+                if exc.code not in CONFLITOS_DE_INDICE:
+                    raise
+                logger.warning(
+                    "índice %s.%s difere de models.py; rode python -m database --migrar-indices",
+                    colecao.name, indice.document["name"],
+                )
+
+
+# Migração avulsa (um único processo, fora do startup): apaga e recria os índices cuja definição mudou
+async def migrar_indices() -> None:
+    await engine.configure_database(MODELOS_COM_INDICES, update_existing_indexes=True)
+
+
+async def _main(migrar: bool) -> None:
+    await conectar()
+    await (migrar_indices() if migrar else criar_indices())
+    await desconectar()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cria os índices declarados em models.py")
+    parser.add_argument(
+        "--migrar-indices", action="store_true",
+        help="apaga e recria os índices cuja definição mudou (não rode com a API subindo)",
+    )
+    asyncio.run(_main(parser.parse_args().migrar_indices))
@@ -0,0 +1,238 @@
+"""Eventos de um grupo (despesas e membros) entregues por Server-Sent Events.
+
+`HubEventos` faz o fan-out em memória, por processo: cada conexão aberta em
+GET /grupos/{grupo_id}/eventos tem uma fila limitada. Se o cliente não consome
+rápido o bastante e a fila enche, a conexão é encerrada (em vez de acumular
+memória ou atrasar quem publica); o cliente reconecta com `Last-Event-ID` e
+recebe o que perdeu a partir do histórico recente do grupo. Quando não dá para
+retomar (histórico já descartado ou ID de outro processo), o primeiro evento é
+`reset`: o cliente deve recarregar o estado pelas rotas REST.
+
+Fontes dos eventos:
+- "local" (padrão): as rotas de escrita chamam `publicar`;
+- "change_stream": uma tarefa iniciada no lifespan acompanha os change streams
+  das coleções despesa, membro (só entradas e saídas) e grupo (só exclusões),
+  então escritas feitas por outros processos também chegam. Exige replica set
+  (um nó local basta: `mongod --replSet rs0` e `rs.initiate()`); remoções de
+  despesas e membros só têm o grupo se as pre-images estiverem ativas nas
+  coleções (`collMod` com `changeStreamPreAndPostImages`). Nesse modo
+  `publicar` não faz nada, então os eventos que só existem nas rotas não
+  chegam: o arquivamento aparece como `despesa.removida` de cada despesa (e não
+  `despesa.arquivada`) e a importação em lote como um `despesa.criada` por linha
+  (e não `despesa.importadas`).
+
+Configuração (variáveis de ambiente):
+    EVENTOS_FONTE        "local" (padrão) ou "change_stream"
+    EVENTOS_FILA_MAXIMA  eventos pendentes por conexão antes de encerrá-la (padrão 100)
+    EVENTOS_HISTORICO    eventos guardados por grupo para retomada (padrão 500)
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Set
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from odmantic import AIOEngine
+
+from models import Despesa, Grupo, Membro
+
+logger = logging.getLogger(__name__)
+
+FONTE_EVENTOS = os.getenv("EVENTOS_FONTE", "local")
+INTERVALO_PING = 15  # segundos sem eventos até mandar um comentário (mantém proxies abertos)
+RECONEXAO_MS = 3000  # sugestão de espera para o EventSource reconectar
+
+
+class Assinatura:
+    def __init__(self, fila_maxima: int):
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=fila_maxima)
+        self.atrasada = False  # marcada quando a fila enche: a conexão deve ser encerrada
+
+
+class HubEventos:
+    def __init__(self, fila_maxima: int = 100, historico: int = 500, grupos_no_historico: int = 10000):
+        self.fila_maxima = fila_maxima
+        self.tamanho_historico = historico
+        self.grupos_no_historico = grupos_no_historico
+        # IDs "instancia-sequencia": um ID de outro processo (ou de antes de um restart) não é retomável
+        self.instancia = uuid.uuid4().hex[:8]
+        self._sequencia = 0
+        self._assinaturas: Dict[str, Set[Assinatura]] = {}
+        # grupo -> [eventos recentes, maior sequência já descartada do histórico]
+        self._historico: "OrderedDict[str, list]" = OrderedDict()
+        self._descartado_global = 0  # maior sequência perdida ao esquecer o histórico de um grupo
+        self.publicados = 0
+        self.encerradas = 0
+
+    def publicar(self, grupo_id: str, tipo: str, dados: dict) -> str:
+        self._sequencia += 1
+        evento_id = f"{self.instancia}-{self._sequencia}"
+        evento = (self._sequencia, evento_id, tipo, json.dumps(jsonable_encoder(dados)))
+
+        entrada = self._historico.get(grupo_id)
+        if entrada is None:
+            entrada = self._historico[grupo_id] = [deque(maxlen=self.tamanho_historico), self._descartado_global]
+            if len(self._historico) > self.grupos_no_historico:
+                _, (antigos, _) = self._historico.popitem(last=False)
+                if antigos:
+                    self._descartado_global = max(self._descartado_global, antigos[-1][0])
+        self._historico.move_to_end(grupo_id)
+        eventos = entrada[0]
+        if len(eventos) == eventos.maxlen:
+            entrada[1] = eventos[0][0]
+        eventos.append(evento)
+        self.publicados += 1
+
+        for assinatura in list(self._assinaturas.get(grupo_id, ())):
+            try:
+                assinatura.fila.put_nowait(evento)
+            except asyncio.QueueFull:
+                # Consumidor lento: encerra a conexão; ele retoma com Last-Event-ID
+                assinatura.atrasada = True
+                self._assinaturas[grupo_id].discard(assinatura)
+                self.encerradas += 1
+        return evento_id
+
+    def assinar(self, grupo_id: str) -> Assinatura:
+        assinatura = Assinatura(self.fila_maxima)
+        self._assinaturas.setdefault(grupo_id, set()).add(assinatura)
+        return assinatura
+
+    def cancelar(self, grupo_id: str, assinatura: Assinatura) -> None:
+        assinaturas = self._assinaturas.get(grupo_id)
+        if assinaturas is not None:
+            assinaturas.discard(assinatura)
+            if not assinaturas:
+                del self._assinaturas[grupo_id]
+
+    def pendentes(self, grupo_id: str, ultimo_id: Optional[str]) -> Optional[list]:
+        """Eventos do grupo depois de `ultimo_id`; None se não for possível retomar."""
+        if not ultimo_id:
+            return []
+        instancia, _, sequencia = ultimo_id.partition("-")
+        if instancia != self.instancia or not sequencia.isdigit() or int(sequencia) > self._sequencia:
+            return None
+        sequencia = int(sequencia)
+        entrada = self._historico.get(grupo_id)
+        descartado = entrada[1] if entrada else self._descartado_global
+        if sequencia < descartado:
+            return None
+        return [evento for evento in (entrada[0] if entrada else ()) if evento[0] > sequencia]
+
+    def assinantes(self) -> int:
+        return sum(len(assinaturas) for assinaturas in self._assinaturas.values())
+
+
+hub_eventos = HubEventos(
+    fila_maxima=int(os.getenv("EVENTOS_FILA_MAXIMA", "100")),
+    historico=int(os.getenv("EVENTOS_HISTORICO", "500")),
+)
+
+
+# Usado pelas rotas de escrita; com change streams, quem publica é a tarefa de acompanhamento
+def publicar(grupo_id: str, tipo: str, dados: dict) -> None:
+    if FONTE_EVENTOS == "local":
+        hub_eventos.publicar(grupo_id, tipo, dados)
+
+
+def _formatar(evento_id: Optional[str], tipo: str, dados: str) -> str:
+    linhas = [f"id: {evento_id}"] if evento_id else []
+    linhas += [f"event: {tipo}", f"data: {dados}"]
+    return "\n".join(linhas) + "\n\n"
+
+
+async def transmitir(request: Request, grupo_id: str, ultimo_id: Optional[str]):
+    """Gerador do corpo text/event-stream de uma conexão."""
+    # Assinar e ler o histórico sem await no meio: nenhum evento fica entre os dois
+    assinatura = hub_eventos.assinar(grupo_id)
+    pendentes = hub_eventos.pendentes(grupo_id, ultimo_id)
+    try:
+        yield f"retry: {RECONEXAO_MS}\n\n"
+        if pendentes is None:
+            yield _formatar(None, "reset", json.dumps({"grupo_id": grupo_id}))
+        else:
+            for _, evento_id, tipo, dados in pendentes:
+                yield _formatar(evento_id, tipo, dados)
+
+        while not assinatura.atrasada:
+            try:
+                _, evento_id, tipo, dados = await asyncio.wait_for(assinatura.fila.get(), timeout=INTERVALO_PING)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": ping\n\n"
+                continue
+            yield _formatar(evento_id, tipo, dados)
+    finally:
+        hub_eventos.cancelar(grupo_id, assinatura)
+
+
+# Traduz uma mudança do change stream no evento equivalente ao publicado pelas rotas
+def _publicar_mudanca(colecao: str, mudanca: dict) -> None:
+    operacao = mudanca["operationType"]
+    atual = mudanca.get("fullDocument")
+    anterior = mudanca.get("fullDocumentBeforeChange")
+
+    if colecao == Despesa.__collection__:
+        if operacao == "delete":
+            if anterior:
+                hub_eventos.publicar(anterior["grupo_id"], "despesa.removida", {"id": str(mudanca["documentKey"]["_id"])})
+            return
+        if not atual:
+            return  # documento já removido quando o updateLookup rodou
+        despesa = Despesa.model_validate_doc(atual)
+        tipo = "despesa.criada" if operacao == "insert" else "despesa.atualizada"
+        hub_eventos.publicar(despesa.grupo_id, tipo, despesa)
+        if anterior and anterior["grupo_id"] != despesa.grupo_id:
+            hub_eventos.publicar(anterior["grupo_id"], "despesa.removida", {"id": str(despesa.id)})
+    elif colecao == Membro.__collection__:
+        # Só insert/delete são acompanhados: a participação não é atualizada no lugar
+        documento = atual if operacao == "insert" else anterior
+        if documento:
+            tipo = "membro.adicionado" if operacao == "insert" else "membro.removido"
+            hub_eventos.publicar(documento["grupo_id"], tipo, {"usuarios_ids": [documento["usuario_id"]]})
+    elif operacao == "delete":
+        # O _id do grupo é o próprio canal: não depende de pre-image
+        grupo_id = str(mudanca["documentKey"]["_id"])
+        hub_eventos.publicar(grupo_id, "grupo.removido", {"id": grupo_id})
+
+
+# Operações acompanhadas em cada coleção
+OPERACOES_ACOMPANHADAS = {
+    Despesa: ["insert", "update", "replace", "delete"],
+    Membro: ["insert", "delete"],
+    Grupo: ["delete"],
+}
+
+
+async def _acompanhar(engine: AIOEngine, modelo) -> None:
+    colecao = engine.get_collection(modelo)
+    pipeline = [{"$match": {"operationType": {"$in": OPERACOES_ACOMPANHADAS[modelo]}}}]
+    retomar_de = None
+    while True:
+        try:
+            async with colecao.watch(
+                pipeline,
+                full_document="updateLookup",
+                full_document_before_change="whenAvailable",
+                resume_after=retomar_de,
+            ) as stream:
+                async for mudanca in stream:
+                    retomar_de = stream.resume_token
+                    _publicar_mudanca(modelo.__collection__, mudanca)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("change stream de %s interrompido; reabrindo", modelo.__collection__)
+            await asyncio.sleep(1)
+
+
+# Tarefas de acompanhamento (EVENTOS_FONTE=change_stream), iniciadas e canceladas no lifespan
+def iniciar_change_streams(engine: AIOEngine) -> List[asyncio.Task]:
+    if FONTE_EVENTOS != "change_stream":
+        return []
+    return [asyncio.create_task(_acompanhar(engine, modelo)) for modelo in OPERACOES_ACOMPANHADAS]
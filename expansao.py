@@ -0,0 +1,75 @@
+from typing import Dict, Iterable, List, Optional, Set
+
+from bson import ObjectId
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from odmantic import AIOEngine
+
+from models import Despesa, Grupo, Usuario
+
+# Relações que podem ser embutidas nas listagens de despesas (?expand=usuarios,grupo)
+CAMPOS_EXPANSIVEIS = {"usuarios", "grupo"}
+
+
+# Lê o parâmetro expand ("usuarios,grupo"); campos desconhecidos viram erro 400
+def ler_expand(expand: Optional[str]) -> Set[str]:
+    if not expand:
+        return set()
+    campos = {campo.strip() for campo in expand.split(",") if campo.strip()}
+    invalidos = campos - CAMPOS_EXPANSIVEIS
+    if invalidos:
+        raise HTTPException(
+            status_code=400,
+            detail=f"expand inválido: {', '.join(sorted(invalidos))} (use {', '.join(sorted(CAMPOS_EXPANSIVEIS))})",
+        )
+    return campos
+
+
+def _object_ids(ids: Iterable[str]) -> List[ObjectId]:
+    return [ObjectId(_id) for _id in set(ids) if ObjectId.is_valid(_id)]
+
+
+# Uma única consulta $in por tipo de entidade, qualquer que seja o tamanho da página
+async def _carregar(engine: AIOEngine, modelo, ids: Iterable[str]) -> Dict[str, dict]:
+    object_ids = _object_ids(ids)
+    if not object_ids:
+        return {}
+    instancias = await engine.find(modelo, modelo.id.in_(object_ids))
+    return {str(instancia.id): instancia.model_dump(mode="json") for instancia in instancias}
+
+
+async def expandir_despesas(
+    engine: AIOEngine,
+    despesas: List[Despesa],
+    campos: Set[str],
+    grupos_conhecidos: Iterable[Grupo] = (),
+) -> List[dict]:
+    """Embute os usuários e/ou o grupo de cada despesa usando buscas em lote."""
+    usuarios = {}
+    if "usuarios" in campos:
+        usuarios = await _carregar(engine, Usuario, (u for d in despesas for u in d.usuarios_ids))
+
+    grupos = {}
+    if "grupo" in campos:
+        grupos = {str(grupo.id): grupo.model_dump(mode="json") for grupo in grupos_conhecidos}
+        faltantes = {d.grupo_id for d in despesas} - set(grupos)
+        grupos.update(await _carregar(engine, Grupo, faltantes))
+
+    resultado = []
+    for despesa in despesas:
+        item = despesa.model_dump(mode="json")
+        if "usuarios" in campos:
+            item["usuarios"] = [usuarios[u] for u in despesa.usuarios_ids if u in usuarios]
+        if "grupo" in campos:
+            item["grupo"] = grupos.get(despesa.grupo_id)
+        resultado.append(item)
+    return resultado
+
+
+# Resposta das listagens com expand (o response_model de Despesa não tem os campos embutidos)
+async def responder_expandido(engine: AIOEngine, despesas: List[Despesa], campos: Set[str], response=None, **kwargs):
+    conteudo = await expandir_despesas(engine, despesas, campos, **kwargs)
+    cabecalhos = dict(response.headers) if response is not None else None
+    if cabecalhos:
+        cabecalhos.pop("content-length", None)
+    return JSONResponse(conteudo, headers=cabecalhos)
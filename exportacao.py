@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator
+
+from fastapi.responses import StreamingResponse
+
+# Quantos documentos o cursor do Motor traz por vez (a memória fica limitada a um lote)
+TAMANHO_LOTE_EXPORTACAO = 1000
+
+COLUNAS_DESPESA = ["id", "titulo", "valor", "data", "grupo_id", "usuarios_ids", "pagador_id"]
+
+TIPOS_CONTEUDO = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+# Converte o documento bruto do Mongo em valores simples (sem validar como Despesa)
+def _linha_despesa(doc: dict) -> dict:
+    data = doc.get("data")
+    return {
+        "id": str(doc["_id"]),
+        "titulo": doc.get("titulo"),
+        "valor": doc.get("valor"),
+        "data": data.isoformat() if isinstance(data, datetime) else data,
+        "grupo_id": doc.get("grupo_id"),
+        "usuarios_ids": doc.get("usuarios_ids", []),
+        "pagador_id": doc.get("pagador_id"),
+    }
+
+
+async def _ndjson(cursor) -> AsyncIterator[str]:
+    async for doc in cursor:
+        yield json.dumps(_linha_despesa(doc), ensure_ascii=False) + "\n"
+
+
+async def _csv(cursor) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUNAS_DESPESA)
+    linhas = 0
+    async for doc in cursor:
+        linha = _linha_despesa(doc)
+        linha["usuarios_ids"] = ";".join(linha["usuarios_ids"])
+        escritor.writerow([linha[coluna] for coluna in COLUNAS_DESPESA])
+        linhas += 1
+        # Envia um bloco a cada lote para não acumular o arquivo inteiro em memória
+        if linhas % TAMANHO_LOTE_EXPORTACAO == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+# Documentos da coleção ativa e depois os do arquivo (se houver), descartando os que
+# foram arquivados durante a exportação e já saíram entre os ativos
+async def _documentos(colecao, filtro: dict, sort, arquivo) -> AsyncIterator[dict]:
+    vistos = set()
+    async for doc in colecao.find(filtro, sort=sort, batch_size=TAMANHO_LOTE_EXPORTACAO):
+        if arquivo is not None:
+            vistos.add(doc["_id"])
+        yield doc
+    if arquivo is None:
+        return
+    async for doc in arquivo.find(filtro, sort=sort, batch_size=TAMANHO_LOTE_EXPORTACAO):
+        if doc["_id"] not in vistos:
+            yield doc
+
+
+# Monta a resposta em streaming a partir de uma consulta na coleção de despesas
+# (e na de despesas arquivadas, quando `arquivo` é informado)
+def exportar_despesas(colecao, filtro: dict, formato: str, nome_arquivo: str, sort=None, arquivo=None) -> StreamingResponse:
+    documentos = _documentos(colecao, filtro, sort, arquivo)
+    gerador = _csv(documentos) if formato == "csv" else _ndjson(documentos)
+    return StreamingResponse(
+        gerador,
+        media_type=TIPOS_CONTEUDO[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}.{formato}"'},
+    )
@@ -0,0 +1,154 @@
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Set, Type
+
+from fastapi import HTTPException, Request
+from odmantic import Model
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+# Tamanho padrão do lote enviado em cada insert_many
+TAMANHO_LOTE_IMPORTACAO = 1000
+TAMANHO_LOTE_MAXIMO = 10000
+
+# Campos de lista que chegam no CSV separados por ';' (mesmo formato da exportação)
+CAMPOS_LISTA_CSV = {"usuarios_ids"}
+
+
+# Lê o corpo JSON (uma lista de objetos) e entrega linha a linha
+async def _linhas_json(request: Request) -> AsyncIterator[dict]:
+    try:
+        corpo = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="JSON inválido")
+    if not isinstance(corpo, list):
+        raise HTTPException(status_code=400, detail="O corpo deve ser uma lista de objetos")
+    for linha in corpo:
+        yield linha
+
+
+# Registros do CSV conforme os bytes chegam, sem carregar o arquivo inteiro. Um campo entre
+# aspas pode conter quebras de linha: as linhas ficam guardadas (com o terminador) até as
+# aspas fecharem, mesmo que o registro chegue dividido em vários pedaços do corpo
+async def _registros_csv(request: Request) -> AsyncIterator[List[str]]:
+    decodificador = codecs.getincrementaldecoder("utf-8-sig")()
+    resto = ""
+    registro: List[str] = []  # linhas físicas do registro atual
+    aspas = 0
+    async for pedaco in request.stream():
+        *completas, resto = (resto + decodificador.decode(pedaco)).split("\n")
+        for linha in completas:
+            registro.append(linha + "\n")
+            aspas += linha.count('"')
+            if aspas % 2 == 0:  # aspas escapadas ("") contam duas vezes
+                yield next(csv.reader(registro), [])
+                registro, aspas = [], 0
+    resto += decodificador.decode(b"", final=True)
+    if resto:
+        registro.append(resto)
+    if registro:
+        yield next(csv.reader(registro), [])
+
+
+async def _linhas_csv(request: Request) -> AsyncIterator[dict]:
+    cabecalho = None
+    async for valores in _registros_csv(request):
+        if cabecalho is None:
+            cabecalho = valores
+        elif valores:
+            yield _converter_linha_csv(cabecalho, valores)
+
+
+def _converter_linha_csv(cabecalho: List[str], valores: List[str]) -> dict:
+    linha = {}
+    for coluna, valor in zip(cabecalho, valores):
+        if valor == "":
+            continue  # deixa o modelo aplicar o valor padrão
+        linha[coluna] = valor.split(";") if coluna in CAMPOS_LISTA_CSV else valor
+    return linha
+
+
+# Escolhe o leitor pelo Content-Type: text/csv ou JSON (padrão)
+def ler_linhas(request: Request) -> AsyncIterator[dict]:
+    tipo = request.headers.get("content-type", "")
+    if tipo.startswith("text/csv"):
+        return _linhas_csv(request)
+    return _linhas_json(request)
+
+
+# Grava um lote e devolve os documentos que de fato entraram
+async def _gravar_lote(colecao, docs: List[dict], numeros: List[int], erros: List[dict]) -> List[dict]:
+    try:
+        await colecao.insert_many(docs, ordered=False)
+        return docs
+    except BulkWriteError as exc:
+        # Com ordered=False o Mongo grava o resto do lote e devolve só as falhas
+        falhas = {falha["index"] for falha in exc.details.get("writeErrors", [])}
+        for falha in exc.details.get("writeErrors", []):
+            erros.append({"linha": numeros[falha["index"]], "erro": falha.get("errmsg")})
+        return [doc for indice, doc in enumerate(docs) if indice not in falhas]
+
+
+# Linhas cujo id enviado pelo cliente já está em uso fora da coleção (ex.: no arquivo) viram erro
+async def _descartar_ids_em_uso(docs, numeros, informados, ids_em_uso, erros):
+    em_uso = await ids_em_uso(informados)
+    if not em_uso:
+        return docs, numeros
+    mantidos, numeros_mantidos = [], []
+    for doc, numero in zip(docs, numeros):
+        if doc["_id"] in em_uso:
+            erros.append({"linha": numero, "erro": "Já existe um documento com esse id"})
+        else:
+            mantidos.append(doc)
+            numeros_mantidos.append(numero)
+    return mantidos, numeros_mantidos
+
+
+async def _concluir_lote(colecao, docs, numeros, erros, ao_inserir, informados, ids_em_uso) -> int:
+    if ids_em_uso and informados:
+        docs, numeros = await _descartar_ids_em_uso(docs, numeros, informados, ids_em_uso, erros)
+    if not docs:
+        return 0
+    gravados = await _gravar_lote(colecao, docs, numeros, erros)
+    if ao_inserir and gravados:
+        await ao_inserir(gravados)
+    return len(gravados)
+
+
+# Valida e grava as linhas em lotes; erros de uma linha não interrompem as demais
+async def inserir_em_lotes(
+    colecao,
+    modelo: Type[Model],
+    linhas: AsyncIterator[dict],
+    tamanho_lote: int = TAMANHO_LOTE_IMPORTACAO,
+    ao_inserir: Optional[Callable[[List[dict]], Awaitable[None]]] = None,
+    ids_em_uso: Optional[Callable[[List], Awaitable[Set]]] = None,
+) -> dict:
+    """`ids_em_uso` recebe os ids enviados pelas linhas do lote e devolve os que não podem ser usados."""
+    inseridos = 0
+    erros: List[dict] = []
+    docs: List[dict] = []
+    numeros: List[int] = []
+    informados: List = []
+    numero = 0
+
+    async for linha in linhas:
+        numero += 1
+        try:
+            instancia = modelo.model_validate(linha)
+        except ValidationError as exc:
+            erros.append({"linha": numero, "erro": exc.errors(include_url=False, include_context=False)})
+            continue
+        docs.append(instancia.model_dump_doc())
+        numeros.append(numero)
+        if "id" in instancia.model_fields_set:
+            informados.append(instancia.id)
+        if len(docs) >= tamanho_lote:
+            inseridos += await _concluir_lote(colecao, docs, numeros, erros, ao_inserir, informados, ids_em_uso)
+            docs, numeros, informados = [], [], []
+
+    if docs:
+        inseridos += await _concluir_lote(colecao, docs, numeros, erros, ao_inserir, informados, ids_em_uso)
+
+    return {"recebidos": numero, "inseridos": inseridos, "erros": erros}
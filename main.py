@@ -1,7 +1,52 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from rotas import grupos, despesas, usuarios
+from fastapi.responses import PlainTextResponse
+from rotas import grupos, despesas, usuarios, saude
+from database import conectar, criar_indices, desconectar
+from cache import cache_entidades
+from coalescencia import coalescedor
+from eventos import hub_eventos, iniciar_change_streams
+from arquivamento import iniciar_arquivamento
+from relatorios import preparar_cobertura
+from metricas import MiddlewareMetricas, MetricaCalculada, registro
+from serializacao import CompressaoGZip, GZIP_NIVEL, GZIP_TAMANHO_MINIMO
+
+# Conecta ao MongoDB (pool aquecido) e garante os índices antes de atender requisições
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    engine = await conectar()
+    await criar_indices()
+    await preparar_cobertura(engine)  # relatórios: ver relatorios.py
+    tarefas = iniciar_change_streams(engine)  # só com EVENTOS_FONTE=change_stream
+    tarefas += iniciar_arquivamento(engine)  # só com ARQUIVO_IDADE_DIAS > 0
+    yield
+    for tarefa in tarefas:
+        tarefa.cancel()
+    await desconectar()
+
+
+app = FastAPI(title="API de Compartilhamento de Despesas", lifespan=lifespan)
+app.add_middleware(MiddlewareMetricas)
+# gzip só quando o cliente aceita e a resposta passa do tamanho mínimo (streams SSE ficam de fora)
+app.add_middleware(CompressaoGZip, minimum_size=GZIP_TAMANHO_MINIMO, compresslevel=GZIP_NIVEL)
+
+# Contadores do cache de entidades (cache.py) também saem em /metrics
+registro.registrar(MetricaCalculada("cache_entidades_acertos_total", "Buscas atendidas pelo cache", lambda: cache_entidades.acertos, "counter"))
+registro.registrar(MetricaCalculada("cache_entidades_falhas_total", "Buscas que foram ao MongoDB", lambda: cache_entidades.falhas, "counter"))
+registro.registrar(MetricaCalculada("cache_entidades_despejos_total", "Entradas removidas pelo limite de tamanho", lambda: cache_entidades.despejos, "counter"))
+registro.registrar(MetricaCalculada("cache_entidades_entradas", "Entradas no cache", lambda: cache_entidades.estatisticas()["entradas"]))
+
+# Fan-out de eventos SSE (eventos.py)
+registro.registrar(MetricaCalculada("eventos_publicados_total", "Eventos publicados no hub", lambda: hub_eventos.publicados, "counter"))
+registro.registrar(MetricaCalculada("eventos_conexoes_encerradas_total", "Conexões SSE encerradas por fila cheia", lambda: hub_eventos.encerradas, "counter"))
+registro.registrar(MetricaCalculada("eventos_assinantes", "Conexões SSE abertas", hub_eventos.assinantes))
+
+# Leituras coalescidas (coalescencia.py)
+registro.registrar(MetricaCalculada("coalescencia_executadas_total", "Consultas que foram ao MongoDB", lambda: coalescedor.executadas, "counter"))
+registro.registrar(MetricaCalculada("coalescencia_coalescidas_total", "Requisições que aguardaram uma consulta igual em andamento", lambda: coalescedor.coalescidas, "counter"))
+registro.registrar(MetricaCalculada("coalescencia_janela_total", "Requisições atendidas por um resultado recente", lambda: coalescedor.na_janela, "counter"))
 
-app = FastAPI(title="API de Compartilhamento de Despesas")
 
 @app.get("/")
 def root():
@@ -9,4 +54,11 @@ def root():
 
 app.include_router(grupos.router)
 app.include_router(usuarios.router)
-app.include_router(despesas.router)
\ No newline at end of file
+app.include_router(despesas.router)
+app.include_router(saude.router)
+
+
+# Métricas no formato texto do Prometheus
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(registro.exportar(), media_type="text/plain; version=0.0.4")
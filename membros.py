@@ -0,0 +1,182 @@
+"""Participação de usuários em grupos, guardada na coleção `membro`.
+
+Cada par (grupo, usuário) é um documento; o índice único (grupo_id, usuario_id)
+torna a entrada idempotente e atômica (upsert), sem reescrever o grupo, e os
+dois índices compostos servem tanto "membros do grupo" quanto "grupos do usuário"
+com paginação. `Usuario.grupo_id` aponta para o último grupo em que o usuário
+entrou e volta a None quando ele sai desse grupo.
+
+Grupos antigos com o array embutido `usuarios` são migrados com:
+    python -m membros
+"""
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+
+from bson import ObjectId
+from odmantic import AIOEngine
+from pymongo import ASCENDING, UpdateOne
+
+from cache import cache_entidades
+from models import Grupo, Membro, Usuario
+
+TAMANHO_LOTE_MIGRACAO = 1000
+
+
+def _upsert(grupo_id: str, usuario_id: str, data_entrada: datetime) -> UpdateOne:
+    return UpdateOne(
+        {"grupo_id": grupo_id, "usuario_id": usuario_id},
+        {"$setOnInsert": {"data_entrada": data_entrada}},
+        upsert=True,
+    )
+
+
+# Separa os IDs válidos que existem na coleção de usuários (uma consulta $in)
+async def usuarios_existentes(engine: AIOEngine, usuarios_ids: List[str]) -> List[str]:
+    validos = list({ObjectId(u) for u in usuarios_ids if ObjectId.is_valid(u)})
+    if not validos:
+        return []
+    cursor = engine.get_collection(Usuario).find({"_id": {"$in": validos}}, {"_id": 1})
+    return [str(doc["_id"]) async for doc in cursor]
+
+
+async def adicionar_membros(engine: AIOEngine, grupo_id: str, usuarios_ids: List[str]) -> List[str]:
+    """Adiciona os usuários ao grupo; retorna os que ainda não eram membros."""
+    if not usuarios_ids:
+        return []
+    agora = datetime.utcnow()
+    resultado = await engine.get_collection(Membro).bulk_write(
+        [_upsert(grupo_id, u, agora) for u in usuarios_ids], ordered=False
+    )
+    # Só quem entrou agora muda: quem já era membro fica como estava
+    novos = [usuarios_ids[indice] for indice in resultado.upserted_ids]
+    if novos:
+        await engine.get_collection(Usuario).update_many(
+            {"_id": {"$in": [ObjectId(u) for u in novos]}},
+            {"$set": {"grupo_id": grupo_id}},
+        )
+        cache_entidades.invalidar(Usuario, *novos)
+    return novos
+
+
+async def remover_membros(engine: AIOEngine, grupo_id: str, usuarios_ids: List[str]) -> List[str]:
+    """Remove os usuários do grupo; retorna os que de fato eram membros."""
+    usuarios_ids = list(dict.fromkeys(usuarios_ids))
+    if not usuarios_ids:
+        return []
+    colecao = engine.get_collection(Membro)
+    # Duas idas ao banco para qualquer tamanho de lista: resolve as participações pelo índice
+    # (grupo_id, usuario_id) e apaga pelos _id encontrados
+    cursor = colecao.find({"grupo_id": grupo_id, "usuario_id": {"$in": usuarios_ids}}, {"usuario_id": 1})
+    encontrados = {doc["_id"]: doc["usuario_id"] async for doc in cursor}
+    if not encontrados:
+        return []
+    await colecao.delete_many({"_id": {"$in": list(encontrados)}})
+    saindo = set(encontrados.values())
+    removidos = [u for u in usuarios_ids if u in saindo]
+    validos = [ObjectId(u) for u in removidos if ObjectId.is_valid(u)]
+    if validos:
+        await engine.get_collection(Usuario).update_many(
+            {"_id": {"$in": validos}, "grupo_id": grupo_id},
+            {"$set": {"grupo_id": None}},
+        )
+        cache_entidades.invalidar(Usuario, *validos)
+    return removidos
+
+
+# Ao excluir um grupo ou um usuário, apaga as participações correspondentes
+async def excluir_membros_do_grupo(engine: AIOEngine, grupo_id: str) -> List[str]:
+    """Apaga as participações do grupo; retorna os usuários cujo `grupo_id` foi limpo."""
+    await engine.get_collection(Membro).delete_many({"grupo_id": grupo_id})
+    colecao_usuarios = engine.get_collection(Usuario)
+    afetados = [doc["_id"] async for doc in colecao_usuarios.find({"grupo_id": grupo_id}, {"_id": 1})]
+    if afetados:
+        await colecao_usuarios.update_many({"_id": {"$in": afetados}}, {"$set": {"grupo_id": None}})
+        cache_entidades.invalidar(Usuario, *afetados)
+    return [str(_id) for _id in afetados]
+
+
+async def excluir_membros_do_usuario(engine: AIOEngine, usuario_id: str) -> None:
+    await engine.get_collection(Membro).delete_many({"usuario_id": usuario_id})
+
+
+# IDs dos grupos de um usuário (índice usuario_id_grupo_id)
+async def ids_dos_grupos(engine: AIOEngine, usuario_id: str) -> List[str]:
+    cursor = engine.get_collection(Membro).find({"usuario_id": usuario_id}, {"_id": 0, "grupo_id": 1})
+    return [doc["grupo_id"] async for doc in cursor]
+
+
+async def eh_membro(engine: AIOEngine, grupo_id: str, usuario_id: str) -> bool:
+    doc = await engine.get_collection(Membro).find_one(
+        {"grupo_id": grupo_id, "usuario_id": usuario_id}, {"_id": 1}
+    )
+    return doc is not None
+
+
+# IDs de todos os membros (só o índice grupo_id_usuario_id é lido: consulta coberta)
+async def ids_dos_membros(engine: AIOEngine, grupo_id: str) -> List[str]:
+    cursor = engine.get_collection(Membro).find(
+        {"grupo_id": grupo_id}, {"_id": 0, "usuario_id": 1}, sort=[("usuario_id", ASCENDING)]
+    )
+    return [doc["usuario_id"] async for doc in cursor]
+
+
+# Uma página de participações, ordenada pela chave do índice; `depois_de` é o último id da página anterior
+async def pagina_de_membros(
+    engine: AIOEngine, campo: str, valor: str, depois_de: Optional[str], limite: int
+) -> List[Membro]:
+    outro = "usuario_id" if campo == "grupo_id" else "grupo_id"
+    filtro = {campo: valor}
+    if depois_de is not None:
+        filtro[outro] = {"$gt": depois_de}
+    cursor = engine.get_collection(Membro).find(filtro, sort=[(outro, ASCENDING)], limit=limite)
+    return [Membro.model_validate_doc(doc) async for doc in cursor]
+
+
+# Carrega os documentos pelos ids, na mesma ordem da página de participações
+async def carregar_na_ordem(engine: AIOEngine, modelo, ids: List[str]) -> list:
+    validos = [ObjectId(i) for i in ids if ObjectId.is_valid(i)]
+    cursor = engine.get_collection(modelo).find({"_id": {"$in": validos}})
+    por_id = {str(doc["_id"]): doc async for doc in cursor}
+    return [modelo.model_validate_doc(por_id[i]) for i in ids if i in por_id]
+
+
+# Move os arrays `usuarios` embutidos nos grupos para a coleção membro e remove o campo
+async def migrar_membros(engine: AIOEngine) -> int:
+    colecao_grupos = engine.get_collection(Grupo)
+    colecao_membros = engine.get_collection(Membro)
+    migrados = 0
+    operacoes = []
+    grupos_migrados = []
+
+    async def gravar():
+        nonlocal migrados, operacoes, grupos_migrados
+        if operacoes:
+            migrados += (await colecao_membros.bulk_write(operacoes, ordered=False)).upserted_count
+        if grupos_migrados:
+            await colecao_grupos.update_many({"_id": {"$in": grupos_migrados}}, {"$unset": {"usuarios": ""}})
+        operacoes, grupos_migrados = [], []
+
+    cursor = colecao_grupos.find({"usuarios": {"$exists": True}}, {"usuarios": 1, "data_criacao": 1})
+    async for doc in cursor:
+        data_entrada = doc.get("data_criacao") or datetime.utcnow()
+        for usuario_id in set(doc.get("usuarios") or []):
+            operacoes.append(_upsert(str(doc["_id"]), str(usuario_id), data_entrada))
+        grupos_migrados.append(doc["_id"])
+        if len(operacoes) >= TAMANHO_LOTE_MIGRACAO:
+            await gravar()
+    await gravar()
+    return migrados
+
+
+async def _main() -> None:
+    from database import conectar, criar_indices, desconectar
+
+    engine = await conectar()
+    await criar_indices()
+    print(f"membro: {await migrar_membros(engine)} participações migradas")
+    await desconectar()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
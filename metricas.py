@@ -0,0 +1,230 @@
+"""Métricas no formato texto do Prometheus, expostas em GET /metrics.
+
+- `MiddlewareMetricas` (ASGI): latência por rota (histograma) e contagem por status;
+- `MonitorComandosMongo` (pymongo CommandListener): tempo de cada comando por coleção e operação;
+- `MonitorPoolMongo` (pymongo ConnectionPoolListener): conexões abertas, em uso e falhas de checkout.
+
+Tudo fica em memória, por processo, com custo de algumas operações de dicionário por evento.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from pymongo import monitoring
+
+BUCKETS_PADRAO = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _formatar_rotulos(nomes: Tuple[str, ...], valores: tuple, **extras) -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    pares.extend(f'{nome}="{valor}"' for nome, valor in extras.items())
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Iterable[str] = ()):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self._valores: Dict[tuple, float] = {}
+        self._trava = threading.Lock()
+
+    def inc(self, *valores, quantidade: float = 1) -> None:
+        with self._trava:
+            self._valores[valores] = self._valores.get(valores, 0) + quantidade
+
+    def linhas(self) -> List[str]:
+        return [f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {valor}" for chave, valor in list(self._valores.items())]
+
+
+class Medidor(Contador):
+    tipo = "gauge"
+
+    def definir(self, *valores, valor: float) -> None:
+        with self._trava:
+            self._valores[valores] = valor
+
+
+class MetricaCalculada:
+    """Valor lido na hora da coleta (ex.: contadores do cache de entidades)."""
+
+    def __init__(self, nome: str, ajuda: str, funcao: Callable[[], float], tipo: str = "gauge"):
+        self.nome, self.ajuda, self.funcao, self.tipo = nome, ajuda, funcao, tipo
+
+    def linhas(self) -> List[str]:
+        return [f"{self.nome} {self.funcao()}"]
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Iterable[str] = (), buckets=BUCKETS_PADRAO):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}  # rótulos -> [contagens por bucket..., soma, total]
+        self._trava = threading.Lock()
+
+    def observar(self, valor: float, *valores) -> None:
+        indice = bisect_left(self.buckets, valor)
+        with self._trava:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [0] * (len(self.buckets) + 2)
+            if indice < len(self.buckets):
+                serie[indice] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def linhas(self) -> List[str]:
+        linhas = []
+        for chave, serie in list(self._series.items()):
+            acumulado = 0
+            for limite, contagem in zip(self.buckets, serie):
+                acumulado += contagem
+                linhas.append(f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, chave, le=limite)} {acumulado}")
+            linhas.append(f"{self.nome}_bucket{_formatar_rotulos(self.rotulos, chave, le='+Inf')} {serie[-1]}")
+            linhas.append(f"{self.nome}_sum{_formatar_rotulos(self.rotulos, chave)} {serie[-2]}")
+            linhas.append(f"{self.nome}_count{_formatar_rotulos(self.rotulos, chave)} {serie[-1]}")
+        return linhas
+
+
+class Registro:
+    def __init__(self):
+        self._metricas = []
+
+    def registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def exportar(self) -> str:
+        saida = []
+        for metrica in self._metricas:
+            saida.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            saida.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            saida.extend(metrica.linhas())
+        return "\n".join(saida) + "\n"
+
+
+registro = Registro()
+
+latencia_requisicoes = registro.registrar(Histograma(
+    "http_requisicao_duracao_segundos", "Latência das requisições HTTP por rota", ("metodo", "rota")))
+requisicoes = registro.registrar(Contador(
+    "http_requisicoes_total", "Requisições HTTP por rota e status", ("metodo", "rota", "status")))
+latencia_mongo = registro.registrar(Histograma(
+    "mongo_comando_duracao_segundos", "Duração dos comandos do MongoDB", ("colecao", "comando")))
+falhas_mongo = registro.registrar(Contador(
+    "mongo_comandos_falhos_total", "Comandos do MongoDB que falharam", ("colecao", "comando")))
+conexoes_abertas = registro.registrar(Medidor(
+    "mongo_pool_conexoes_abertas", "Conexões abertas no pool por servidor", ("servidor",)))
+conexoes_em_uso = registro.registrar(Medidor(
+    "mongo_pool_conexoes_em_uso", "Conexões emprestadas do pool por servidor", ("servidor",)))
+falhas_checkout = registro.registrar(Contador(
+    "mongo_pool_checkout_falhas_total", "Falhas ao obter conexão do pool", ("servidor", "motivo")))
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI: mede cada requisição HTTP pela rota (template), não pela URL."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = {"codigo": 500}
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                status["codigo"] = mensagem["status"]
+            await send(mensagem)
+
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            rota = getattr(scope.get("route"), "path", "desconhecida")
+            metodo = scope["method"]
+            latencia_requisicoes.observar(time.perf_counter() - inicio, metodo, rota)
+            requisicoes.inc(metodo, rota, str(status["codigo"]))
+
+
+class MonitorComandosMongo(monitoring.CommandListener):
+    """Mede cada comando usando a duração informada pelo próprio driver."""
+
+    def __init__(self):
+        self._colecoes: Dict[int, str] = {}
+
+    def started(self, event):
+        colecao = event.command.get(event.command_name)
+        self._colecoes[event.request_id] = colecao if isinstance(colecao, str) else "-"
+
+    def succeeded(self, event):
+        colecao = self._colecoes.pop(event.request_id, "-")
+        latencia_mongo.observar(event.duration_micros / 1e6, colecao, event.command_name)
+
+    def failed(self, event):
+        colecao = self._colecoes.pop(event.request_id, "-")
+        latencia_mongo.observar(event.duration_micros / 1e6, colecao, event.command_name)
+        falhas_mongo.inc(colecao, event.command_name)
+
+
+class MonitorPoolMongo(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._abertas: Dict[str, int] = {}
+        self._em_uso: Dict[str, int] = {}
+        self._trava = threading.Lock()
+
+    def _ajustar(self, contagens: Dict[str, int], medidor: Medidor, endereco, delta: int) -> None:
+        servidor = f"{endereco[0]}:{endereco[1]}"
+        with self._trava:
+            contagens[servidor] = max(contagens.get(servidor, 0) + delta, 0)
+            medidor.definir(servidor, valor=contagens[servidor])
+
+    def abertas(self) -> int:
+        return sum(self._abertas.values())
+
+    # Conexões em uso no servidor mais ocupado (maxPoolSize vale por servidor)
+    def em_uso(self) -> int:
+        return max(self._em_uso.values(), default=0)
+
+    def connection_created(self, event):
+        self._ajustar(self._abertas, conexoes_abertas, event.address, 1)
+
+    def connection_closed(self, event):
+        self._ajustar(self._abertas, conexoes_abertas, event.address, -1)
+
+    def connection_checked_out(self, event):
+        self._ajustar(self._em_uso, conexoes_em_uso, event.address, 1)
+
+    def connection_checked_in(self, event):
+        self._ajustar(self._em_uso, conexoes_em_uso, event.address, -1)
+
+    def connection_check_out_failed(self, event):
+        falhas_checkout.inc(f"{event.address[0]}:{event.address[1]}", str(event.reason))
+
+    def pool_cleared(self, event):
+        with self._trava:
+            self._em_uso.pop(f"{event.address[0]}:{event.address[1]}", None)
+            conexoes_em_uso.definir(f"{event.address[0]}:{event.address[1]}", valor=0)
+
+    # Eventos sem métrica própria
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
+
+
+monitor_pool = MonitorPoolMongo()
+
+
+# Listeners que devem ser passados ao AsyncIOMotorClient (ver database.py)
+def listeners_mongo() -> list:
+    return [MonitorComandosMongo(), monitor_pool]
@@ -1,21 +1,179 @@
-from odmantic import Model, Field
+from odmantic import EmbeddedModel, Model, Field, Index
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
+import unicodedata
+
+from pydantic import model_serializer, model_validator
+from pydantic.json_schema import SkipJsonSchema
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.collation import Collation
+
+# Collation usada para ordenar/buscar nomes (pt, sem diferenciar maiúsculas/minúsculas).
+# As consultas que ordenam por 'nome' precisam usar a MESMA collation para aproveitar o índice.
+COLACAO_NOME = Collation(locale="pt", strength=2)
+
+
+# Campos mantidos pela própria API (não fazem parte das respostas nem dos corpos das requisições)
+CAMPOS_INTERNOS = {"nome_normalizado"}
+
+
+# Forma do nome usada na busca por prefixo: minúsculas, sem acentos e espaços repetidos
+def normalizar_nome(nome: str) -> str:
+    decomposto = unicodedata.normalize("NFKD", nome.casefold())
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(sem_acentos.split())
+
+
+# Recalcula nome_normalizado sempre que o modelo é criado a partir de 'nome'
+def preencher_nome_normalizado(dados):
+    if isinstance(dados, dict) and isinstance(dados.get("nome"), str):
+        dados = {**dados, "nome_normalizado": normalizar_nome(dados["nome"])}
+    return dados
+
+
+# Nas saídas JSON (respostas, eventos, expand) os campos internos somem; model_dump_doc usa o
+# modo python e continua gravando-os no MongoDB
+def sem_campos_internos(dados: dict) -> dict:
+    for nome in CAMPOS_INTERNOS:
+        dados.pop(nome, None)
+    return dados
+
 
 class Grupo(Model):
      # não é necessário definir id manualmente, ele já existe em Model.
     nome: str
-    usuarios: List[str] = []  # Lista de IDs dos usuários do grupo
     data_criacao: datetime = datetime.utcnow()  # Data automática de criação
+    # Mantido a partir de 'nome' (ver normalizar_nome); fora dos schemas e das respostas da API
+    nome_normalizado: SkipJsonSchema[str] = ""
+
+    model_config = {
+        "indexes": lambda: [
+            IndexModel([("nome", ASCENDING)], name="nome_colacao", collation=COLACAO_NOME),
+            IndexModel([("nome_normalizado", ASCENDING)], name="nome_normalizado"),  # busca por prefixo
+            IndexModel([("nome", TEXT)], name="nome_texto", default_language="portuguese"),  # busca por palavras
+        ]
+    }
+
+    @model_validator(mode="before")
+    @classmethod
+    def normalizar(cls, dados):
+        return preencher_nome_normalizado(dados)
+
+    @model_serializer(mode="wrap", when_used="json")
+    def ocultar_campos_internos(self, serializar):
+        return sem_campos_internos(serializar(self))
 
 class Usuario(Model):
     nome: str
     email: str
     grupo_id: Optional[str] = None  # O usuário pode ou não estar em um grupo
+    # Mantido a partir de 'nome' (ver normalizar_nome); fora dos schemas e das respostas da API
+    nome_normalizado: SkipJsonSchema[str] = ""
+
+    model_config = {
+        "indexes": lambda: [
+            # (nome, _id): ordenação e paginação por cursor de listar_usuarios
+            IndexModel([("nome", ASCENDING), ("_id", ASCENDING)], name="nome_colacao", collation=COLACAO_NOME),
+            IndexModel([("nome_normalizado", ASCENDING)], name="nome_normalizado"),  # busca por prefixo
+            IndexModel([("nome", TEXT)], name="nome_texto", default_language="portuguese"),  # busca por palavras
+        ]
+    }
+
+    @model_validator(mode="before")
+    @classmethod
+    def normalizar(cls, dados):
+        return preencher_nome_normalizado(dados)
+
+    @model_serializer(mode="wrap", when_used="json")
+    def ocultar_campos_internos(self, serializar):
+        return sem_campos_internos(serializar(self))
+
+# Participação de um usuário em um grupo (um documento por par, em vez de um array no grupo)
+class Membro(Model):
+    grupo_id: str
+    usuario_id: str
+    data_entrada: datetime = Field(default_factory=datetime.utcnow)
+
+    model_config = {
+        "collection": "membro",
+        "indexes": lambda: [
+            # Único: impede entrada duplicada; também ordena/pagina os membros de um grupo
+            Index(Membro.grupo_id, Membro.usuario_id, name="grupo_id_usuario_id", unique=True),
+            Index(Membro.usuario_id, Membro.grupo_id, name="usuario_id_grupo_id"),  # grupos de um usuário
+        ],
+    }
 
 class Despesa(Model):
     titulo: str
     valor: float
     data: datetime = datetime.utcnow()  # Data automática da despesa
     grupo_id: str  # Referência ao grupo
-    usuarios_ids: List[str]  = Field(default_factory=list)  # IDs dos usuários associados #= []  # Lista de IDs dos usuários envolvidos
\ No newline at end of file
+    usuarios_ids: List[str]  = Field(default_factory=list)  # IDs dos usuários associados #= []  # Lista de IDs dos usuários envolvidos
+    pagador_id: Optional[str] = None  # Quem pagou; se vazio, o primeiro de usuarios_ids
+
+    model_config = {
+        "indexes": lambda: [
+            Index(Despesa.data, Despesa.id, name="data"),  # listagem geral ordenada por data (cursor)
+            Index(Despesa.grupo_id, Despesa.data, name="grupo_id_data"),  # despesas de um grupo
+            # multikey: despesas de um usuário (e faixa de datas nos relatórios)
+            Index(Despesa.usuarios_ids, Despesa.data, name="usuarios_ids"),
+        ]
+    }
+
+
+# Despesa movida para o arquivo (antiga ou já acertada; ver arquivamento.py): mesmos campos de Despesa
+class DespesaArquivada(Model):
+    titulo: str
+    valor: float
+    data: datetime
+    grupo_id: str
+    usuarios_ids: List[str] = Field(default_factory=list)
+    pagador_id: Optional[str] = None
+    arquivada_em: datetime = Field(default_factory=datetime.utcnow)
+
+    model_config = {
+        "collection": "despesa_arquivo",
+        "indexes": lambda: [
+            # Só as leituras que chegam ao arquivo: faixas de datas geral, por grupo e por usuário
+            Index(DespesaArquivada.data, DespesaArquivada.id, name="data"),
+            Index(DespesaArquivada.grupo_id, DespesaArquivada.data, name="grupo_id_data"),
+            Index(DespesaArquivada.usuarios_ids, DespesaArquivada.data, name="usuarios_ids"),
+        ]
+    }
+
+
+class ResumoMes(EmbeddedModel):
+    total: float = 0
+    quantidade: int = 0
+
+
+# Resumo materializado das despesas de um grupo, mantido pelas rotas de escrita (ver resumos.py)
+class ResumoGrupo(Model):
+    grupo_id: str = Field(primary_field=True)
+    total: float = 0
+    quantidade: int = 0
+    ultima_data: Optional[datetime] = None
+    meses: Dict[str, ResumoMes] = Field(default_factory=dict)  # chave "AAAA-MM"
+
+    model_config = {"collection": "resumo_grupo"}
+
+
+# Totais de um mês de um grupo ou de um usuário, com buckets diários (ver relatorios.py)
+class RelatorioMensal(Model):
+    escopo: str  # "grupo" ou "usuario"
+    dono_id: str  # ID do grupo ou do usuário
+    mes: str  # "AAAA-MM"
+    total: float = 0
+    quantidade: int = 0
+    dias: Dict[str, ResumoMes] = Field(default_factory=dict)  # chave "DD"
+
+    model_config = {
+        "collection": "relatorio_mensal",
+        "indexes": lambda: [
+            Index(RelatorioMensal.escopo, RelatorioMensal.dono_id, RelatorioMensal.mes, name="escopo_dono_mes", unique=True),
+        ],
+    }
+
+
+# Modelos com índices declarados (criados no startup, ver database.criar_indices)
+MODELOS_COM_INDICES = [Grupo, Usuario, Despesa, DespesaArquivada, Membro, RelatorioMensal]
@@ -0,0 +1,54 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, Response
+
+# Cabeçalhos usados pela paginação por cursor (o corpo continua sendo a lista de itens)
+HEADER_PROXIMO_CURSOR = "X-Next-Cursor"
+HEADER_TOTAL = "X-Total-Count"
+
+
+# Gera um cursor opaco a partir da chave de ordenação do último item da página
+def codificar_cursor(valor: Any, _id: ObjectId) -> str:
+    if isinstance(valor, datetime):
+        chave = {"t": "dt", "v": valor.isoformat()}
+    else:
+        chave = {"t": "str", "v": valor}
+    chave["id"] = str(_id)
+    bruto = json.dumps(chave, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+
+# Lê um cursor gerado por codificar_cursor; cursor inválido vira erro 400
+def decodificar_cursor(cursor: str) -> Tuple[Any, ObjectId]:
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        chave = json.loads(bruto)
+        valor = datetime.fromisoformat(chave["v"]) if chave["t"] == "dt" else chave["v"]
+        return valor, ObjectId(chave["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginação inválido")
+
+
+# Preenche o cabeçalho do próximo cursor (só quando a página veio cheia).
+# Os itens podem ser modelos ou documentos brutos do MongoDB (dicts com "_id")
+def definir_proximo_cursor(response: Response, itens: list, limit: int, campo: str) -> Optional[str]:
+    if not itens or len(itens) < limit:
+        return None
+    ultimo = itens[-1]
+    if isinstance(ultimo, dict):
+        proximo = codificar_cursor(ultimo[campo], ultimo["_id"])
+    else:
+        proximo = codificar_cursor(getattr(ultimo, campo), ultimo.id)
+    response.headers[HEADER_PROXIMO_CURSOR] = proximo
+    return proximo
+
+
+# Contagem barata: sem filtro usa os metadados da coleção (estimated_document_count)
+async def contar_total(colecao, filtro: Optional[dict] = None) -> int:
+    if not filtro:
+        return await colecao.estimated_document_count()
+    return await colecao.count_documents(filtro)
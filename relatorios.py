@@ -0,0 +1,286 @@
+"""Relatórios de gastos por dia/mês de um grupo ou de um usuário.
+
+Os totais ficam pré-agregados em `relatorio_mensal`: um documento por
+(escopo, dono, mês) com buckets diários, mantido com `$inc` pelas mesmas
+escritas que atualizam o resumo do grupo (ver resumos.py). O gasto de um
+usuário é a sua parte de cada despesa (valor dividido entre `usuarios_ids`,
+como em acertos.py). Datas são agrupadas em UTC.
+
+Só os períodos a partir da data de cobertura (gravada pela reconstrução abaixo)
+são lidos dos documentos pré-agregados; o que vier antes é calculado com uma
+agregação `$dateTrunc` sobre os índices (grupo_id, data) / (usuarios_ids, data).
+Assim o custo do relatório depende do número de meses, não de despesas.
+Arquivar despesas (arquivamento.py) não muda os pré-agregados; a agregação
+inclui o arquivo só quando a faixa começa antes do limite arquivado.
+
+Um banco sem despesas é marcado como coberto no startup (`preparar_cobertura`).
+Em um banco que já tem despesas, a cobertura só existe depois da reconstrução:
+até lá, todo relatório é calculado por agregação. Rode-a uma vez ao implantar
+(apaga e recalcula a partir de `--desde`, e marca a cobertura; com as escritas paradas):
+    python -m relatorios [--desde AAAA-MM]
+"""
+import argparse
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Literal, Optional, Tuple
+
+from fastapi import HTTPException
+from odmantic import AIOEngine
+from pymongo import ASCENDING, UpdateOne
+
+from arquivamento import limite_do_arquivo, unir_arquivo
+from models import Despesa, DespesaArquivada, RelatorioMensal
+
+logger = logging.getLogger(__name__)
+
+Escopo = Literal["grupo", "usuario"]
+Granularidade = Literal["dia", "mes"]
+
+COLECAO_COBERTURA = "relatorio_cobertura"
+TAMANHO_LOTE_RECONSTRUCAO = 1000
+
+# Cabeçalho que indica de onde vieram os números ("pre-agregado", "agregacao" ou ambos)
+HEADER_FONTE = "X-Relatorio-Fonte"
+
+
+# Parte de cada dono numa despesa: o grupo leva o valor inteiro, cada envolvido a sua cota
+def _partes(doc: dict) -> List[Tuple[str, str, float]]:
+    partes = [("grupo", doc["grupo_id"], doc["valor"])]
+    usuarios_ids = doc.get("usuarios_ids") or []
+    partes += [("usuario", usuario_id, doc["valor"] / len(usuarios_ids)) for usuario_id in usuarios_ids]
+    return partes
+
+
+def _mes(data: datetime) -> str:
+    return f"{data.year:04d}-{data.month:02d}"  # strftime não completa anos < 1000 com zeros
+
+
+def _operacoes(incrementos: dict) -> List[UpdateOne]:
+    return [
+        UpdateOne({"escopo": escopo, "dono_id": dono_id, "mes": mes}, {"$inc": dict(inc)}, upsert=True)
+        for (escopo, dono_id, mes), inc in incrementos.items()
+    ]
+
+
+def _incrementar(incrementos: dict, escopo: str, dono_id: str, data: datetime, total: float, quantidade: int):
+    inc = incrementos[(escopo, dono_id, _mes(data))]
+    dia = data.strftime("%d")
+    inc["total"] += total
+    inc["quantidade"] += quantidade
+    inc[f"dias.{dia}.total"] += total
+    inc[f"dias.{dia}.quantidade"] += quantidade
+
+
+# Chamado por resumos.registrar_despesas / remover_despesas (sinal -1 para remoção)
+async def atualizar_relatorios(engine: AIOEngine, docs: Iterable[dict], sinal: int) -> None:
+    incrementos = defaultdict(lambda: defaultdict(int))
+    for doc in docs:
+        for escopo, dono_id, valor in _partes(doc):
+            _incrementar(incrementos, escopo, dono_id, doc["data"], sinal * valor, sinal)
+    operacoes = _operacoes(incrementos)
+    if operacoes:
+        await engine.get_collection(RelatorioMensal).bulk_write(operacoes, ordered=False)
+
+
+# Início do período coberto pelos documentos pré-agregados (None: nada coberto ainda)
+async def inicio_da_cobertura(engine: AIOEngine) -> Optional[datetime]:
+    doc = await engine.database[COLECAO_COBERTURA].find_one({"_id": "mensal"})
+    if doc is None:
+        return None
+    return doc["desde"] or datetime.min
+
+
+# Registra que os documentos mensais estão completos a partir de `desde` (None: todo o histórico)
+async def marcar_cobertura(engine: AIOEngine, desde: Optional[datetime]) -> None:
+    await engine.database[COLECAO_COBERTURA].update_one({"_id": "mensal"}, {"$set": {"desde": desde}}, upsert=True)
+
+
+def _chave(data: datetime, granularidade: Granularidade) -> str:
+    return data.strftime("%Y-%m-%d" if granularidade == "dia" else "%Y-%m")
+
+
+def _somar(buckets: dict, chave: str, total: float, quantidade: int) -> None:
+    bucket = buckets.setdefault(chave, {"total": 0.0, "quantidade": 0})
+    bucket["total"] += total
+    bucket["quantidade"] += quantidade
+
+
+# Lê os buckets diários dos meses em [inicio, fim)
+async def _dos_documentos_mensais(
+    engine: AIOEngine, escopo: Escopo, dono_id: str, inicio: datetime, fim: Optional[datetime],
+    granularidade: Granularidade, buckets: dict,
+) -> None:
+    meses = {"$gte": _mes(inicio)}
+    if fim is not None:
+        meses["$lte"] = _mes(fim)
+    cursor = engine.get_collection(RelatorioMensal).find(
+        {"escopo": escopo, "dono_id": dono_id, "mes": meses}, sort=[("mes", ASCENDING)]
+    )
+    async for doc in cursor:
+        ano, mes = map(int, doc["mes"].split("-"))
+        for dia, valores in doc.get("dias", {}).items():
+            data = datetime(ano, mes, int(dia))
+            if not valores.get("quantidade") or data < inicio or (fim is not None and data >= fim):
+                continue
+            _somar(buckets, _chave(data, granularidade), valores["total"], valores["quantidade"])
+
+
+# Fallback: agrega as despesas da faixa [inicio, fim) direto da coleção
+async def _da_agregacao(
+    engine: AIOEngine, escopo: Escopo, dono_id: str, inicio: Optional[datetime], fim: Optional[datetime],
+    granularidade: Granularidade, buckets: dict,
+) -> None:
+    filtro = {"grupo_id": dono_id} if escopo == "grupo" else {"usuarios_ids": dono_id}
+    filtro.update(filtro_de_datas(inicio, fim))
+    valor = "$valor" if escopo == "grupo" else {"$divide": ["$valor", {"$size": "$usuarios_ids"}]}
+    unidade = "day" if granularidade == "dia" else "month"
+    pipeline = [{"$match": filtro}]
+    # Despesas arquivadas só entram se a faixa começar antes do limite do arquivo
+    limite = await limite_do_arquivo(engine, dono_id if escopo == "grupo" else None)
+    if limite is not None and (inicio is None or inicio < limite):
+        pipeline.append(unir_arquivo(filtro))
+    pipeline += [
+        {"$group": {
+            "_id": {"$dateTrunc": {"date": "$data", "unit": unidade}},
+            "total": {"$sum": valor},
+            "quantidade": {"$sum": 1},
+        }},
+    ]
+    async for linha in engine.get_collection(Despesa).aggregate(pipeline, allowDiskUse=True):
+        _somar(buckets, _chave(linha["_id"], granularidade), linha["total"], linha["quantidade"])
+
+
+# Condição sobre `data` para a faixa [inicio, fim) (vazia se não houver limites)
+def filtro_de_datas(inicio: Optional[datetime], fim: Optional[datetime]) -> dict:
+    faixa = {}
+    if inicio is not None:
+        faixa["$gte"] = inicio
+    if fim is not None:
+        faixa["$lt"] = fim
+    return {"data": faixa} if faixa else {}
+
+
+# Converte os filtros `de`/`ate` (dias inclusivos) na faixa [de, ate) usada nas consultas
+def faixa_de_datas(de: Optional[date], ate: Optional[date]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    if de is not None and ate is not None and de > ate:
+        raise HTTPException(status_code=400, detail="'de' deve ser anterior ou igual a 'ate'")
+    inicio = datetime.combine(de, time.min) if de is not None else None
+    fim = datetime.combine(ate + timedelta(days=1), time.min) if ate is not None else None
+    return inicio, fim
+
+
+async def gerar_relatorio(
+    engine: AIOEngine, escopo: Escopo, dono_id: str, de: Optional[datetime], ate: Optional[datetime],
+    granularidade: Granularidade = "mes",
+) -> Tuple[dict, str]:
+    """Totais por período em [de, ate); devolve o relatório e a fonte usada."""
+    cobertura = await inicio_da_cobertura(engine)
+    buckets = {}
+    fontes = []
+
+    if cobertura is None or cobertura > (de or datetime.min):
+        fim = ate if cobertura is None or (ate is not None and ate <= cobertura) else cobertura
+        await _da_agregacao(engine, escopo, dono_id, de, fim, granularidade, buckets)
+        fontes.append("agregacao")
+    if cobertura is not None and (ate is None or ate > cobertura):
+        inicio = max(de, cobertura) if de is not None else cobertura
+        await _dos_documentos_mensais(engine, escopo, dono_id, inicio, ate, granularidade, buckets)
+        fontes.append("pre-agregado")
+
+    periodos = [
+        {"periodo": chave, "total": round(v["total"], 2), "quantidade": v["quantidade"]}
+        for chave, v in sorted(buckets.items()) if v["quantidade"]
+    ]
+    relatorio = {
+        "granularidade": granularidade,
+        "total": round(sum(p["total"] for p in periodos), 2),
+        "quantidade": sum(p["quantidade"] for p in periodos),
+        "periodos": periodos,
+    }
+    return relatorio, "+".join(fontes)
+
+
+# Grava os totais diários de uma agregação ordenada por (dono, dia), um documento mensal por vez
+async def _gravar_agregacao(engine: AIOEngine, escopo: Escopo, pipeline: list) -> int:
+    colecao = engine.get_collection(RelatorioMensal)
+    incrementos = defaultdict(lambda: defaultdict(int))  # só o (dono, mês) atual
+    atual = None
+    lote: List[UpdateOne] = []
+    gravados = 0
+    async for linha in engine.get_collection(Despesa).aggregate(pipeline, allowDiskUse=True):
+        dono_id, dia = linha["_id"]["dono"], linha["_id"]["dia"]
+        if (dono_id, _mes(dia)) != atual:
+            lote += _operacoes(incrementos)
+            incrementos.clear()
+            atual = (dono_id, _mes(dia))
+            if len(lote) >= TAMANHO_LOTE_RECONSTRUCAO:
+                await colecao.bulk_write(lote, ordered=False)
+                gravados, lote = gravados + len(lote), []
+        _incrementar(incrementos, escopo, dono_id, dia, linha["total"], linha["quantidade"])
+    lote += _operacoes(incrementos)
+    if lote:
+        await colecao.bulk_write(lote, ordered=False)
+    return gravados + len(lote)
+
+
+# Recalcula os documentos mensais a partir de `desde` (None: todo o histórico) e marca a cobertura.
+# Uma agregação por escopo, lida em streaming: o resultado não precisa caber num único documento
+async def reconstruir(engine: AIOEngine, desde: Optional[datetime] = None) -> int:
+    await engine.get_collection(RelatorioMensal).delete_many({"mes": {"$gte": _mes(desde)}} if desde else {})
+
+    filtro = {"data": {"$gte": desde}} if desde else {}
+    dia = {"$dateTrunc": {"date": "$data", "unit": "day"}}
+    inicio = [
+        {"$match": filtro},
+        unir_arquivo(filtro),  # os relatórios contam também as despesas arquivadas
+    ]
+    por_dia = {"total": {"$sum": "$valor"}, "quantidade": {"$sum": 1}}
+    ordem = {"$sort": {"_id.dono": 1, "_id.dia": 1}}  # agrupa os dias de cada documento mensal
+    grupos = inicio + [
+        {"$group": {"_id": {"dono": "$grupo_id", "dia": dia}, **por_dia}},
+        ordem,
+    ]
+    usuarios = inicio + [
+        {"$match": {"usuarios_ids.0": {"$exists": True}}},
+        {"$project": {"data": 1, "usuarios_ids": 1, "valor": {"$divide": ["$valor", {"$size": "$usuarios_ids"}]}}},
+        {"$unwind": "$usuarios_ids"},
+        {"$group": {"_id": {"dono": "$usuarios_ids", "dia": dia}, **por_dia}},
+        ordem,
+    ]
+    gravados = await _gravar_agregacao(engine, "grupo", grupos)
+    gravados += await _gravar_agregacao(engine, "usuario", usuarios)
+
+    await marcar_cobertura(engine, desde)
+    return gravados
+
+
+# No startup: um banco sem despesas já nasce coberto (as escritas mantêm os documentos
+# mensais desde a primeira); com despesas e sem cobertura, avisa que falta a reconstrução
+async def preparar_cobertura(engine: AIOEngine) -> None:
+    if await inicio_da_cobertura(engine) is not None:
+        return
+    for modelo in (Despesa, DespesaArquivada):
+        if await engine.get_collection(modelo).find_one({}, {"_id": 1}) is not None:
+            logger.warning(
+                "relatórios sem cobertura: todos os períodos usam agregação até rodar python -m relatorios"
+            )
+            return
+    await marcar_cobertura(engine, None)
+
+
+async def _main(desde: Optional[str]) -> None:
+    from database import conectar, criar_indices, desconectar
+
+    engine = await conectar()
+    await criar_indices()
+    inicio = datetime.strptime(desde, "%Y-%m") if desde else None
+    print(f"relatorio_mensal: {await reconstruir(engine, inicio)} documentos mensais gravados")
+    await desconectar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstrói os relatórios mensais pré-agregados")
+    parser.add_argument("--desde", help="primeiro mês a reconstruir (AAAA-MM); padrão: todo o histórico")
+    asyncio.run(_main(parser.parse_args().desde))
@@ -0,0 +1,212 @@
+"""Resumo materializado por grupo (total, quantidade, última data e buckets mensais).
+
+As rotas de escrita de despesas chamam `registrar_despesas` / `remover_despesas`,
+que aplicam `$inc` atômicos no documento do grupo em `resumo_grupo` (e nos
+relatórios mensais, ver relatorios.py). A leitura do total vira uma busca pelo `_id`.
+
+Reconciliação (recalcula a partir da coleção de despesas e mostra divergências):
+    python -m resumos [--corrigir]
+"""
+import argparse
+import asyncio
+from collections import defaultdict
+from typing import Iterable, List, Optional
+
+from odmantic import AIOEngine
+from pymongo import DESCENDING, UpdateOne
+
+from arquivamento import unir_arquivo
+from coalescencia import buscar_um
+from models import Despesa, DespesaArquivada, ResumoGrupo
+from relatorios import atualizar_relatorios
+
+# Diferença aceitável entre somas de ponto flutuante
+TOLERANCIA = 1e-6
+TENTATIVAS_ULTIMA_DATA = 5  # recálculos da última data quando o resumo muda no meio tempo
+
+
+def chave_mes(data) -> str:
+    return data.strftime("%Y-%m")
+
+
+def _como_doc(despesa) -> dict:
+    return despesa.model_dump_doc() if isinstance(despesa, Despesa) else despesa
+
+
+# Monta um $inc por grupo somando todas as despesas (sinal -1 para remoção)
+def _operacoes(docs: Iterable[dict], sinal: int) -> List[UpdateOne]:
+    incrementos = defaultdict(lambda: defaultdict(int))
+    ultimas = {}
+    for doc in docs:
+        grupo_id, valor, data = doc["grupo_id"], doc["valor"], doc["data"]
+        inc = incrementos[grupo_id]
+        inc["total"] += sinal * valor
+        inc["quantidade"] += sinal
+        inc[f"meses.{chave_mes(data)}.total"] += sinal * valor
+        inc[f"meses.{chave_mes(data)}.quantidade"] += sinal
+        if sinal > 0 and (grupo_id not in ultimas or data > ultimas[grupo_id]):
+            ultimas[grupo_id] = data
+
+    operacoes = []
+    for grupo_id, inc in incrementos.items():
+        atualizacao = {"$inc": dict(inc)}
+        if grupo_id in ultimas:
+            atualizacao["$max"] = {"ultima_data": ultimas[grupo_id]}
+        operacoes.append(UpdateOne({"_id": grupo_id}, atualizacao, upsert=True))
+    return operacoes
+
+
+async def registrar_despesas(engine: AIOEngine, despesas: Iterable) -> None:
+    docs = [_como_doc(despesa) for despesa in despesas]
+    operacoes = _operacoes(docs, 1)
+    if operacoes:
+        await engine.get_collection(ResumoGrupo).bulk_write(operacoes, ordered=False)
+        await atualizar_relatorios(engine, docs, 1)
+
+
+async def remover_despesas(engine: AIOEngine, despesas: Iterable) -> None:
+    docs = [_como_doc(despesa) for despesa in despesas]
+    operacoes = _operacoes(docs, -1)
+    if not operacoes:
+        return
+    await engine.get_collection(ResumoGrupo).bulk_write(operacoes, ordered=False)
+    await atualizar_relatorios(engine, docs, -1)
+    # $max não "volta atrás": recalcula a última data pelo índice (grupo_id, data)
+    for grupo_id in {doc["grupo_id"] for doc in docs}:
+        await _recalcular_ultima_data(engine, grupo_id)
+
+
+# Atualização de despesa: tira os valores antigos e aplica os novos (inclusive troca de grupo)
+async def mover_despesa(engine: AIOEngine, antiga: dict, nova: Despesa) -> None:
+    await remover_despesas(engine, [antiga])
+    await registrar_despesas(engine, [nova])
+
+
+# Exclusão de grupo: apaga as despesas (ativas e arquivadas) e tira as cotas dos relatórios dos usuários.
+# Uma por vez com find_one_and_delete: só quem apagou a despesa desconta os valores, então uma exclusão
+# concorrente da mesma despesa não desconta duas vezes. O resumo e os relatórios do grupo ficam com quem
+# chama, que os apaga inteiros depois.
+async def excluir_despesas_do_grupo(engine: AIOEngine, grupo_id: str, tamanho_lote: int = 500) -> List:
+    excluidas = []
+    for modelo in (Despesa, DespesaArquivada):
+        colecao = engine.get_collection(modelo)
+        lote = []
+        while True:
+            doc = await colecao.find_one_and_delete({"grupo_id": grupo_id})
+            if doc is not None:
+                lote.append(doc)
+            if lote and (doc is None or len(lote) >= tamanho_lote):
+                await atualizar_relatorios(engine, lote, -1)
+                excluidas.extend(d["_id"] for d in lote)
+                lote = []
+            if doc is None:
+                break
+    return excluidas
+
+
+# Mesma definição da reconciliação: a despesa mais recente do grupo, ativa ou arquivada.
+# A escrita só vale se o resumo ainda tem a data lida antes do recálculo: um $max de uma despesa
+# registrada no meio tempo não é sobrescrito, e o recálculo roda de novo (já vendo essa despesa)
+async def _recalcular_ultima_data(engine: AIOEngine, grupo_id: str) -> None:
+    resumos = engine.get_collection(ResumoGrupo)
+    for _ in range(TENTATIVAS_ULTIMA_DATA):
+        atual = await resumos.find_one({"_id": grupo_id}, {"ultima_data": 1})
+        if atual is None:
+            return
+        datas = []
+        for modelo in (Despesa, DespesaArquivada):
+            ultima = await engine.get_collection(modelo).find_one(
+                {"grupo_id": grupo_id}, {"data": 1}, sort=[("grupo_id", DESCENDING), ("data", DESCENDING)]
+            )
+            if ultima:
+                datas.append(ultima["data"])
+        resultado = await resumos.update_one(
+            {"_id": grupo_id, "ultima_data": atual.get("ultima_data")},
+            {"$set": {"ultima_data": max(datas, default=None)}},
+        )
+        if resultado.matched_count:
+            return
+    # Escritas concorrentes em todas as tentativas: a reconciliação (python -m resumos) corrige
+
+
+async def obter_resumo(engine: AIOEngine, grupo_id: str) -> Optional[ResumoGrupo]:
+    # Coalescida: o painel de um grupo popular dispara várias leituras iguais ao mesmo tempo
+    doc = await buscar_um(engine.get_collection(ResumoGrupo), {"_id": grupo_id})
+    return ResumoGrupo.model_validate_doc(doc) if doc else None
+
+
+# Recalcula os resumos direto da coleção de despesas
+async def _resumos_recalculados(engine: AIOEngine) -> dict:
+    pipeline = [
+        unir_arquivo({}),  # arquivar não muda o resumo: as despesas arquivadas também contam
+        {"$group": {
+            "_id": {"grupo_id": "$grupo_id", "mes": {"$dateToString": {"format": "%Y-%m", "date": "$data"}}},
+            "total": {"$sum": "$valor"},
+            "quantidade": {"$sum": 1},
+            "ultima_data": {"$max": "$data"},
+        }},
+    ]
+    resumos = {}
+    async for linha in engine.get_collection(Despesa).aggregate(pipeline, allowDiskUse=True):
+        grupo_id, mes = linha["_id"]["grupo_id"], linha["_id"]["mes"]
+        resumo = resumos.setdefault(grupo_id, {"_id": grupo_id, "total": 0.0, "quantidade": 0, "ultima_data": None, "meses": {}})
+        resumo["total"] += linha["total"]
+        resumo["quantidade"] += linha["quantidade"]
+        if resumo["ultima_data"] is None or linha["ultima_data"] > resumo["ultima_data"]:
+            resumo["ultima_data"] = linha["ultima_data"]
+        resumo["meses"][mes] = {"total": linha["total"], "quantidade": linha["quantidade"]}
+    return resumos
+
+
+def _divergencias(esperado: dict, atual: Optional[dict]) -> List[str]:
+    atual = atual or {"total": 0, "quantidade": 0, "ultima_data": None, "meses": {}}
+    problemas = []
+    if abs(esperado["total"] - atual.get("total", 0)) > TOLERANCIA:
+        problemas.append(f"total {atual.get('total', 0)} != {esperado['total']}")
+    if esperado["quantidade"] != atual.get("quantidade", 0):
+        problemas.append(f"quantidade {atual.get('quantidade', 0)} != {esperado['quantidade']}")
+    if esperado["ultima_data"] != atual.get("ultima_data"):
+        problemas.append(f"ultima_data {atual.get('ultima_data')} != {esperado['ultima_data']}")
+    meses_atuais = {mes: v for mes, v in atual.get("meses", {}).items() if v.get("quantidade")}
+    if set(meses_atuais) != set(esperado["meses"]) or any(
+        abs(meses_atuais[mes]["total"] - v["total"]) > TOLERANCIA or meses_atuais[mes]["quantidade"] != v["quantidade"]
+        for mes, v in esperado["meses"].items()
+    ):
+        problemas.append("buckets mensais divergentes")
+    return problemas
+
+
+async def reconciliar(engine: AIOEngine, corrigir: bool = False) -> dict:
+    """Compara os resumos com as despesas; com `corrigir`, regrava os que divergem."""
+    colecao = engine.get_collection(ResumoGrupo)
+    esperados = await _resumos_recalculados(engine)
+    atuais = {doc["_id"]: doc async for doc in colecao.find({})}
+
+    divergentes = {}
+    for grupo_id in set(esperados) | set(atuais):
+        esperado = esperados.get(grupo_id, {"_id": grupo_id, "total": 0.0, "quantidade": 0, "ultima_data": None, "meses": {}})
+        problemas = _divergencias(esperado, atuais.get(grupo_id))
+        if problemas:
+            divergentes[grupo_id] = problemas
+            if corrigir:
+                await colecao.replace_one({"_id": grupo_id}, esperado, upsert=True)
+
+    return {"grupos": len(esperados), "divergentes": divergentes, "corrigidos": corrigir}
+
+
+async def _main(corrigir: bool) -> None:
+    from database import conectar, desconectar
+
+    engine = await conectar()
+    relatorio = await reconciliar(engine, corrigir=corrigir)
+    await desconectar()
+    for grupo_id, problemas in relatorio["divergentes"].items():
+        print(f"{grupo_id}: {'; '.join(problemas)}")
+    acao = "corrigidos" if corrigir else "encontrados (use --corrigir para regravar)"
+    print(f"{relatorio['grupos']} grupos verificados, {len(relatorio['divergentes'])} divergentes {acao}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconcilia os resumos de despesas por grupo")
+    parser.add_argument("--corrigir", action="store_true", help="regrava os resumos divergentes")
+    asyncio.run(_main(parser.parse_args().corrigir))
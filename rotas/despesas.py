@@ -1,13 +1,27 @@
-from fastapi import APIRouter, HTTPException, Query # paginação teve o query
+from fastapi import APIRouter, HTTPException, Query, Request, Response # paginação teve o query
 from database import get_engine
-from models import Despesa, Grupo, Usuario
+from models import Despesa, DespesaArquivada, Grupo, Usuario
+from resumos import registrar_despesas, remover_despesas, mover_despesa, obter_resumo
+from relatorios import faixa_de_datas, filtro_de_datas, gerar_relatorio, Granularidade, HEADER_FONTE
+from cache import cache_entidades
+from eventos import publicar
+from versoes import incrementar, responder_se_nao_modificado, chave_despesa, chave_despesas_do_grupo, chave_grupo, USUARIOS
+from expansao import ler_expand, responder_expandido
+from arquivamento import buscar_despesas, buscar_pagina, contar_despesas, limite_do_arquivo
+from serializacao import ler_campos, projecao, responder_documentos, DESCRICAO_CAMPOS
 from odmantic import ObjectId
+from paginacao import decodificar_cursor, definir_proximo_cursor, HEADER_TOTAL
+from exportacao import exportar_despesas
+from importacao import inserir_em_lotes, ler_linhas, TAMANHO_LOTE_IMPORTACAO, TAMANHO_LOTE_MAXIMO
 
 from starlette import status
-from typing import List
+from collections import defaultdict
+from typing import List, Literal, Optional
+from datetime import date
 
 from bson import ObjectId
-from pymongo import ASCENDING
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 
 router = APIRouter(
@@ -19,8 +33,8 @@ engine = get_engine()
 
 
 # 📌 Função auxiliar para buscar uma despesa ou retornar erro 404
-async def get_despesa_or_404(despesa_id: str) -> Despesa:
-    despesa = await engine.find_one(Despesa, Despesa.id == ObjectId(despesa_id))
+async def get_despesa_or_404(despesa_id: str, usar_cache: bool = True) -> Despesa:
+    despesa = await cache_entidades.obter(engine, Despesa, ObjectId(despesa_id), usar_cache)
     if not despesa:
         raise HTTPException(status_code=404, detail="Despesa não encontrada")
     return despesa
@@ -29,30 +43,89 @@ async def get_despesa_or_404(despesa_id: str) -> Despesa:
 # Criar uma despesa
 @router.post("/", response_model=Despesa)
 async def criar_despesa(despesa: Despesa):
-    await engine.save(despesa)
+    # insert, não save (upsert): um id enviado pelo cliente não sobrescreve nem recria uma despesa
+    if "id" in despesa.model_fields_set and await engine.get_collection(DespesaArquivada).find_one(
+        {"_id": despesa.id}, {"_id": 1}
+    ):
+        raise HTTPException(status_code=409, detail="Já existe uma despesa com esse id")
+    try:
+        await engine.get_collection(Despesa).insert_one(despesa.model_dump_doc())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="Já existe uma despesa com esse id")
+    cache_entidades.invalidar(Despesa, despesa.id)
+    await registrar_despesas(engine, [despesa])
+    await incrementar(engine, chave_despesas_do_grupo(despesa.grupo_id))
+    publicar(despesa.grupo_id, "despesa.criada", despesa)
     return despesa
 
 
+# Criar várias despesas de uma vez (lista JSON ou CSV enviado com Content-Type: text/csv)
+@router.post("/bulk")
+async def criar_despesas_em_lote(
+    request: Request,
+    tamanho_lote: int = Query(default=TAMANHO_LOTE_IMPORTACAO, ge=1, le=TAMANHO_LOTE_MAXIMO),
+):
+    async def ao_inserir(docs):
+        cache_entidades.invalidar(Despesa, *(doc["_id"] for doc in docs))
+        await registrar_despesas(engine, docs)
+        await incrementar(engine, *{chave_despesas_do_grupo(doc["grupo_id"]) for doc in docs})
+        # Um evento por grupo e por lote (só os ids): um evento por linha encheria as filas
+        # dos assinantes e o histórico de retomada; o cliente recarrega pela rota REST
+        por_grupo = defaultdict(list)
+        for doc in docs:
+            por_grupo[doc["grupo_id"]].append(str(doc["_id"]))
+        for grupo_id, ids in por_grupo.items():
+            publicar(grupo_id, "despesa.importadas", {"ids": ids})
+
+    # Como em criar_despesa: um id enviado não pode reaparecer se a despesa já foi arquivada
+    async def ids_arquivados(ids):
+        cursor = engine.get_collection(DespesaArquivada).find({"_id": {"$in": ids}}, {"_id": 1})
+        return {doc["_id"] async for doc in cursor}
+
+    return await inserir_em_lotes(
+        engine.get_collection(Despesa), Despesa, ler_linhas(request), tamanho_lote,
+        ao_inserir=ao_inserir, ids_em_uso=ids_arquivados,
+    )
+
+
 # Atualizar uma despesa
 @router.put("/{despesa_id}", response_model=Despesa)
 async def atualizar_despesa(despesa_id: str, despesa_atualizada: Despesa):
-    despesa = await get_despesa_or_404(despesa_id)
-
-    despesa.titulo = despesa_atualizada.titulo
-    despesa.valor = despesa_atualizada.valor
-    despesa.data = despesa_atualizada.data
-    despesa.grupo_id = despesa_atualizada.grupo_id
-    despesa.usuarios_ids = despesa_atualizada.usuarios_ids
+    novo = despesa_atualizada.model_dump_doc()
+    del novo["_id"]
+    # Os valores antigos para ajustar o resumo do grupo vêm da própria troca (sem leitura separada).
+    # Sem upsert: uma despesa arquivada (ou excluída) no meio tempo dá 404 em vez de voltar
+    # para a coleção ativa e ser contada duas vezes (ativa + arquivo)
+    anterior = await engine.get_collection(Despesa).find_one_and_replace(
+        {"_id": ObjectId(despesa_id)}, novo, upsert=False, return_document=ReturnDocument.BEFORE
+    )
+    if anterior is None:
+        raise HTTPException(status_code=404, detail="Despesa não encontrada")
+    despesa = Despesa.model_validate_doc({**novo, "_id": anterior["_id"]})
 
-    await engine.save(despesa)
+    cache_entidades.invalidar(Despesa, despesa.id)
+    await mover_despesa(engine, anterior, despesa)
+    await incrementar(
+        engine, chave_despesa(despesa.id),
+        chave_despesas_do_grupo(anterior["grupo_id"]), chave_despesas_do_grupo(despesa.grupo_id),
+    )
+    publicar(despesa.grupo_id, "despesa.atualizada", despesa)
+    if anterior["grupo_id"] != despesa.grupo_id:
+        publicar(anterior["grupo_id"], "despesa.removida", {"id": str(despesa.id)})
     return despesa
 
 
 # Excluir uma despesa
 @router.delete("/{despesa_id}")
 async def excluir_despesa(despesa_id: str):
-    despesa = await get_despesa_or_404(despesa_id)
-    await engine.delete(despesa)
+    # O documento removido (e não uma leitura anterior) define o que sai do resumo
+    despesa = await engine.get_collection(Despesa).find_one_and_delete({"_id": ObjectId(despesa_id)})
+    if despesa is None:
+        raise HTTPException(status_code=404, detail="Despesa não encontrada")
+    cache_entidades.invalidar(Despesa, despesa["_id"])
+    await remover_despesas(engine, [despesa])
+    await incrementar(engine, chave_despesa(despesa["_id"]), chave_despesas_do_grupo(despesa["grupo_id"]))
+    publicar(despesa["grupo_id"], "despesa.removida", {"id": str(despesa["_id"])})
     return {"message": "Despesa deletada com sucesso!"}
 
 
@@ -67,92 +140,285 @@ async def excluir_despesa(despesa_id: str):
     status_code=status.HTTP_200_OK
 )
 async def listar_todas_despesas(
+    response: Response,
     skip: int = Query(default=0, ge=0),
-    limit: int = Query(default=5, le=100)
+    limit: int = Query(default=5, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="Cursor opaco retornado em X-Next-Cursor"),
+    contar: bool = Query(default=False, description="Inclui em X-Total-Count o total da faixa (estimado sem de/ate)"),
+    expand: Optional[str] = Query(default=None, description="Relações a embutir: usuarios,grupo"),
+    campos: Optional[str] = Query(default=None, description=DESCRICAO_CAMPOS),
+    de: Optional[date] = Query(default=None, description="Primeiro dia (AAAA-MM-DD); antes do limite do arquivo, inclui as arquivadas"),
+    ate: Optional[date] = Query(default=None, description="Último dia (AAAA-MM-DD), inclusive"),
 ) -> List[Despesa]:
     """
     Retorna uma lista de despesas com paginação, sempre ordenando por 'data'.
-    """
 
-    engine = get_engine()  # Sem 'await', pois get_engine() não é assíncrono
+    Com `cursor`, a página começa logo após o último item da página anterior
+    (chave `(data, _id)`), sem percorrer os documentos já vistos; `skip` é ignorado.
+    O cursor da próxima página vem no cabeçalho `X-Next-Cursor`.
+    Com `expand`, cada despesa traz os objetos de `usuarios` e/ou `grupo` embutidos.
+    Com `campos`, só os campos pedidos (e `data`, usada no cursor) são lidos do MongoDB.
+    Sem `de`, só as despesas ativas; com `de` anterior ao limite do arquivo, as
+    arquivadas da faixa entram na mesma ordem.
+    """
 
-    despesas = await engine.find(
-        Despesa,
-        sort=Despesa.data,  # Ordenação padrão por 'data'
-        skip=skip,
-        limit=limit
+    relacoes = ler_expand(expand)
+    inicio, fim = faixa_de_datas(de, ate)
+    selecionados = ler_campos(campos, Despesa, obrigatorios=["data"])
+    if relacoes and selecionados:
+        raise HTTPException(status_code=400, detail="Use 'campos' ou 'expand', não os dois")
+
+    filtro = filtro_de_datas(inicio, fim)
+    filtro_total = dict(filtro)  # o total cobre a faixa inteira, não só o que vem depois do cursor
+    if cursor:
+        data, ultimo_id = decodificar_cursor(cursor)
+        filtro["$or"] = [{"data": {"$gt": data}}, {"data": data, "_id": {"$gt": ultimo_id}}]
+        skip = 0
+
+    docs = await buscar_pagina(
+        engine,
+        filtro,
+        projecao(selecionados),
+        inicio,
+        [("data", ASCENDING), ("_id", ASCENDING)],  # Ordenação padrão por 'data' (desempate pelo id)
+        skip,
+        limit,
     )
 
-    return despesas
+    definir_proximo_cursor(response, docs, limit, "data")
+    if contar:
+        response.headers[HEADER_TOTAL] = str(await contar_despesas(engine, filtro_total, inicio))
+
+    if relacoes:
+        despesas = [Despesa.model_validate_doc(doc) for doc in docs]
+        return await responder_expandido(engine, despesas, relacoes, response)
+    return responder_documentos(Despesa, docs, selecionados, response)
 
 
 # Buscar despesa pelo ID
 @router.get("/{despesa_id}", response_model=Despesa)
-async def pegar_despesa_por_id(despesa_id: str):
-    return await get_despesa_or_404(despesa_id)
+async def pegar_despesa_por_id(despesa_id: str, request: Request, response: Response):
+    nao_modificado = await responder_se_nao_modificado(engine, request, response, [chave_despesa(despesa_id)])
+    if nao_modificado:
+        return nao_modificado
+    # A ETag vem do contador compartilhado: o corpo também vem do banco, não do cache do processo
+    despesa = await cache_entidades.obter(engine, Despesa, ObjectId(despesa_id), usar_cache=False)
+    if despesa:
+        return despesa
+    # Despesas arquivadas continuam acessíveis pelo ID (só leitura)
+    arquivada = await engine.get_collection(DespesaArquivada).find_one({"_id": ObjectId(despesa_id)})
+    if not arquivada:
+        raise HTTPException(status_code=404, detail="Despesa não encontrada")
+    return Despesa.model_validate_doc(arquivada)
 
 
 # Listar despesas por grupo
 @router.get("/grupo/{grupo_id}", response_model=list[Despesa])
-async def listar_despesas_por_grupo(grupo_id: str):
-    grupo = await engine.find_one(Grupo, Grupo.id == ObjectId(grupo_id))
+async def listar_despesas_por_grupo(
+    grupo_id: str,
+    request: Request,
+    response: Response,
+    expand: Optional[str] = Query(default=None, description="Relações a embutir: usuarios,grupo"),
+    campos: Optional[str] = Query(default=None, description=DESCRICAO_CAMPOS),
+    de: Optional[date] = Query(default=None, description="Primeiro dia (AAAA-MM-DD); antes do limite do arquivo, inclui as arquivadas"),
+    ate: Optional[date] = Query(default=None, description="Último dia (AAAA-MM-DD), inclusive"),
+):
+    relacoes = ler_expand(expand)
+    inicio, fim = faixa_de_datas(de, ate)
+    selecionados = ler_campos(campos, Despesa)
+    if relacoes and selecionados:
+        raise HTTPException(status_code=400, detail="Use 'campos' ou 'expand', não os dois")
+
+    # Se nada mudou desde a ETag do cliente, responde 304 sem consultar as despesas
+    chaves = [chave_grupo(grupo_id), chave_despesas_do_grupo(grupo_id)]
+    if "usuarios" in relacoes:
+        chaves.append(USUARIOS)
+    nao_modificado = await responder_se_nao_modificado(engine, request, response, chaves)
+    if nao_modificado:
+        return nao_modificado
+
+    grupo = await cache_entidades.obter(engine, Grupo, ObjectId(grupo_id))
 
     if not grupo:
         raise HTTPException(status_code=404, detail="Grupo não encontrado")
 
     #despesas = await engine.find(Despesa, Despesa.grupo_id == grupo.id)
-    despesas = await engine.find(Despesa, Despesa.grupo_id == str(grupo.id))
-    return despesas
+    # Requisições simultâneas iguais compartilham a mesma consulta (ver coalescencia.py);
+    # sem `de`, só as despesas ativas (o arquivo fica de fora, ver arquivamento.py)
+    filtro = {"grupo_id": str(grupo.id), **filtro_de_datas(inicio, fim)}
+    docs = await buscar_despesas(engine, filtro, projecao(selecionados), inicio, grupo_id=str(grupo.id))
+    if relacoes:
+        # O grupo já foi carregado: só os usuários precisam de consulta
+        despesas = [Despesa.model_validate_doc(doc) for doc in docs]
+        return await responder_expandido(engine, despesas, relacoes, response, grupos_conhecidos=[grupo])
+    return responder_documentos(Despesa, docs, selecionados, response)
+
+# Coleção de despesas arquivadas, se houver algo arquivado no escopo (exportações)
+async def _arquivo_se_houver(grupo_id: Optional[str] = None):
+    if await limite_do_arquivo(engine, grupo_id) is None:
+        return None
+    return engine.get_collection(DespesaArquivada)
+
+
+# Exportar as despesas de um grupo em streaming (NDJSON ou CSV)
+@router.get("/grupo/{grupo_id}/export")
+async def exportar_despesas_do_grupo(
+    grupo_id: str,
+    formato: Literal["ndjson", "csv"] = Query(default="ndjson", alias="format"),
+):
+    if not ObjectId.is_valid(grupo_id):
+        raise HTTPException(status_code=400, detail="ID do grupo inválido")
+
+    grupo = await cache_entidades.obter(engine, Grupo, ObjectId(grupo_id))
+    if not grupo:
+        raise HTTPException(status_code=404, detail="Grupo não encontrado")
+
+    # Lê direto do cursor do Motor (índice grupo_id+data), sem montar a lista inteira;
+    # a exportação é o histórico completo, então as arquivadas vêm depois das ativas
+    return exportar_despesas(
+        engine.get_collection(Despesa),
+        {"grupo_id": str(grupo.id)},
+        formato,
+        f"despesas-grupo-{grupo.id}",
+        sort=[("grupo_id", ASCENDING), ("data", ASCENDING)],
+        arquivo=await _arquivo_se_houver(str(grupo.id)),
+    )
 
 # pra ver o valor e quantas despesas o grupo tem
 @router.get("/grupo/{grupo_id}/despesas", response_model=dict)
-async def listar_total_despesas_por_grupo(grupo_id: str):
+async def listar_total_despesas_por_grupo(
+    grupo_id: str,
+    request: Request,
+    response: Response,
+    por_mes: bool = Query(default=False, description="Inclui os totais por mês (AAAA-MM)"),
+):
     if not ObjectId.is_valid(grupo_id):
         raise HTTPException(status_code=400, detail="ID do grupo inválido")
 
-    grupo = await engine.find_one(Grupo, Grupo.id == ObjectId(grupo_id))
+    nao_modificado = await responder_se_nao_modificado(
+        engine, request, response, [chave_grupo(grupo_id), chave_despesas_do_grupo(grupo_id)]
+    )
+    if nao_modificado:
+        return nao_modificado
+
+    grupo = await cache_entidades.obter(engine, Grupo, ObjectId(grupo_id))
     if not grupo:
         raise HTTPException(status_code=404, detail="Grupo não encontrado")
 
-    pipeline = [
-        {"$match": {"grupo_id": str(grupo.id)}},  # Filtra pelo grupo
-        {
-            "$group": {
-                "_id": None,  # Agrupa todas as despesas do grupo
-                "total": {"$sum": "$valor"},  # Soma os valores das despesas
-                "quantidade": {"$sum": 1}  # Conta o número de despesas no grupo
-            }
-        }
-    ]
-
-    despesas_agrupadas = await engine.database["despesa"].aggregate(pipeline).to_list(length=1)
+    # Leitura pontual do resumo mantido pelas rotas de escrita (ver resumos.py)
+    resumo = await obter_resumo(engine, str(grupo.id))
 
-    if not despesas_agrupadas:
+    if not resumo:
         return {
             "grupo": grupo.nome,  # Nome do grupo
             "total": 0,  # Se não houver despesas, total é 0
-            "quantidade": 0  # Quantidade também é 0
+            "quantidade": 0,  # Quantidade também é 0
+            "ultima_data": None,
         }
 
-    resultado = despesas_agrupadas[0]
-    return {
+    resposta = {
         "grupo": grupo.nome,  # Nome do grupo
-        "total": resultado["total"],
-        "quantidade": resultado["quantidade"]
+        "total": resumo.total,
+        "quantidade": resumo.quantidade,
+        "ultima_data": resumo.ultima_data,
     }
+    if por_mes:
+        resposta["meses"] = {mes: v for mes, v in sorted(resumo.meses.items()) if v.quantidade}
+    return resposta
+
+
+# Quanto o grupo gastou por mês (ou dia) no período, a partir dos totais pré-agregados
+@router.get("/grupo/{grupo_id}/relatorio", response_model=dict)
+async def relatorio_do_grupo(
+    grupo_id: str,
+    response: Response,
+    de: Optional[date] = Query(default=None, description="Primeiro dia (AAAA-MM-DD), inclusive"),
+    ate: Optional[date] = Query(default=None, description="Último dia (AAAA-MM-DD), inclusive"),
+    granularidade: Granularidade = Query(default="mes"),
+):
+    if not ObjectId.is_valid(grupo_id):
+        raise HTTPException(status_code=400, detail="ID do grupo inválido")
 
+    grupo = await cache_entidades.obter(engine, Grupo, ObjectId(grupo_id))
+    if not grupo:
+        raise HTTPException(status_code=404, detail="Grupo não encontrado")
+
+    inicio, fim = faixa_de_datas(de, ate)
+    relatorio, fonte = await gerar_relatorio(engine, "grupo", str(grupo.id), inicio, fim, granularidade)
+    response.headers[HEADER_FONTE] = fonte
+    return {"grupo": grupo.nome, "de": de, "ate": ate, **relatorio}
 
 
 # Listar todas as despesas de um usuário
 @router.get("/usuario/{usuario_id}", response_model=list[Despesa])
-async def listar_despesas_por_usuario(usuario_id: str):
-    # Encontra o usuário usando o ID como string
-    usuario = await engine.find_one(Usuario, Usuario.id == usuario_id)
+async def listar_despesas_por_usuario(
+    usuario_id: str,
+    expand: Optional[str] = Query(default=None, description="Relações a embutir: usuarios,grupo"),
+    campos: Optional[str] = Query(default=None, description=DESCRICAO_CAMPOS),
+    de: Optional[date] = Query(default=None, description="Primeiro dia (AAAA-MM-DD); antes do limite do arquivo, inclui as arquivadas"),
+    ate: Optional[date] = Query(default=None, description="Último dia (AAAA-MM-DD), inclusive"),
+):
+    relacoes = ler_expand(expand)
+    inicio, fim = faixa_de_datas(de, ate)
+    selecionados = ler_campos(campos, Despesa)
+    if relacoes and selecionados:
+        raise HTTPException(status_code=400, detail="Use 'campos' ou 'expand', não os dois")
+    # Encontra o usuário pelo ObjectId
+    usuario = await cache_entidades.obter(engine, Usuario, ObjectId(usuario_id))
+
+    if not usuario:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+
+    # Busca despesas onde o id do usuário (guardado como string) está em usuarios_ids
+    filtro = {"usuarios_ids": str(usuario.id), **filtro_de_datas(inicio, fim)}
+    docs = await buscar_despesas(engine, filtro, projecao(selecionados), inicio)
+
+    if relacoes:
+        despesas = [Despesa.model_validate_doc(doc) for doc in docs]
+        return await responder_expandido(engine, despesas, relacoes)
+    return responder_documentos(Despesa, docs, selecionados)
+
+
+# Exportar as despesas de um usuário em streaming (NDJSON ou CSV)
+@router.get("/usuario/{usuario_id}/export")
+async def exportar_despesas_do_usuario(
+    usuario_id: str,
+    formato: Literal["ndjson", "csv"] = Query(default="ndjson", alias="format"),
+):
+    if not ObjectId.is_valid(usuario_id):
+        raise HTTPException(status_code=400, detail="ID do usuário inválido")
+
+    usuario = await cache_entidades.obter(engine, Usuario, ObjectId(usuario_id))
+    if not usuario:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado")
+
+    # usuarios_ids guarda os IDs como string (índice multikey); arquivadas depois das ativas
+    return exportar_despesas(
+        engine.get_collection(Despesa),
+        {"usuarios_ids": str(usuario.id)},
+        formato,
+        f"despesas-usuario-{usuario.id}",
+        arquivo=await _arquivo_se_houver(),
+    )
+
+
+# Quanto o usuário gastou (sua parte de cada despesa) por mês ou dia no período
+@router.get("/usuario/{usuario_id}/relatorio", response_model=dict)
+async def relatorio_do_usuario(
+    usuario_id: str,
+    response: Response,
+    de: Optional[date] = Query(default=None, description="Primeiro dia (AAAA-MM-DD), inclusive"),
+    ate: Optional[date] = Query(default=None, description="Último dia (AAAA-MM-DD), inclusive"),
+    granularidade: Granularidade = Query(default="mes"),
+):
+    if not ObjectId.is_valid(usuario_id):
+        raise HTTPException(status_code=400, detail="ID do usuário inválido")
 
+    usuario = await cache_entidades.obter(engine, Usuario, ObjectId(usuario_id))
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
-    # Busca despesas onde o id do usuário está contido na lista de usuarios_ids
-    despesas = await engine.find(Despesa, Despesa.usuarios_ids == usuario.id)
-    
-    return despesas
\ No newline at end of file
+    inicio, fim = faixa_de_datas(de, ate)
+    relatorio, fonte = await gerar_relatorio(engine, "usuario", str(usuario.id), inicio, fim, granularidade)
+    response.headers[HEADER_FONTE] = fonte
+    return {"usuario": usuario.nome, "de": de, "ate": ate, **relatorio}
@@ -1,8 +1,28 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Body, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from database import get_engine
-from models import Grupo, Usuario, Despesa
+from models import Grupo, Usuario, Despesa, Membro, ResumoGrupo, RelatorioMensal, COLACAO_NOME
 from odmantic import ObjectId
-import re
+from acertos import calcular_saldos, plano_de_acertos
+from arquivamento import arquivar_do_grupo
+from relatorios import faixa_de_datas
+from resumos import excluir_despesas_do_grupo, mover_despesa
+from cache import cache_entidades
+from busca import buscar_por_nome, ModoBusca
+from membros import (
+    adicionar_membros, remover_membros, usuarios_existentes, excluir_membros_do_grupo,
+    ids_dos_membros, pagina_de_membros, carregar_na_ordem,
+)
+from eventos import publicar, transmitir
+from versoes import (
+    incrementar, responder_se_nao_modificado, chave_grupo, chave_despesas_do_grupo,
+    chave_membros_do_grupo, chave_usuario, chave_despesa,
+)
+from serializacao import ler_campos, projecao, responder_documentos, DESCRICAO_CAMPOS
+from paginacao import decodificar_cursor, definir_proximo_cursor, contar_total, HEADER_TOTAL
+from typing import List, Optional
+from datetime import date
+from pymongo import ASCENDING, ReturnDocument
 
 router = APIRouter(
     prefix="/grupos",
@@ -13,8 +33,8 @@ engine = get_engine()
 
 
 #Função auxiliar para buscar um grupo ou retornar erro 404
-async def get_grupo_or_404(grupo_id: str) -> Grupo:
-    grupo = await engine.find_one(Grupo, Grupo.id == ObjectId(grupo_id))
+async def get_grupo_or_404(grupo_id: str, usar_cache: bool = True) -> Grupo:
+    grupo = await cache_entidades.obter(engine, Grupo, ObjectId(grupo_id), usar_cache)
     if not grupo:
         raise HTTPException(status_code=404, detail="Grupo não encontrado")
     return grupo
@@ -24,129 +44,263 @@ async def get_grupo_or_404(grupo_id: str) -> Grupo:
 @router.post("/", response_model=Grupo)
 async def criar_grupo(grupo: Grupo):
     await engine.save(grupo)
+    cache_entidades.invalidar(Grupo, grupo.id)
     return grupo
 
 
 # Atualizar um grupo (todos os dados)
 @router.put("/{grupo_id}", response_model=Grupo)
 async def atualizar_grupo(grupo_id: str, grupo_atualizado: Grupo):
-    grupo = await get_grupo_or_404(grupo_id)
+    grupo = await get_grupo_or_404(grupo_id, usar_cache=False)
     grupo.nome = grupo_atualizado.nome
-    grupo.usuarios = grupo_atualizado.usuarios
+    grupo.nome_normalizado = grupo_atualizado.nome_normalizado
     await engine.save(grupo)
+    cache_entidades.invalidar(Grupo, grupo.id)
+    await incrementar(engine, chave_grupo(grupo.id))
     return grupo
 
 
 @router.delete("/{grupo_id}")
 async def excluir_grupo(grupo_id: str):
-    grupo = await get_grupo_or_404(grupo_id)
+    grupo = await get_grupo_or_404(grupo_id, usar_cache=False)
     await engine.delete(grupo)
+    cache_entidades.invalidar(Grupo, grupo.id)
+    # As despesas saem junto com o grupo; só depois o resumo e os relatórios do grupo são apagados
+    despesas = await excluir_despesas_do_grupo(engine, str(grupo.id))
+    cache_entidades.invalidar(Despesa, *despesas)
+    await engine.get_collection(ResumoGrupo).delete_one({"_id": str(grupo.id)})
+    await engine.get_collection(RelatorioMensal).delete_many({"escopo": "grupo", "dono_id": str(grupo.id)})
+    afetados = await excluir_membros_do_grupo(engine, str(grupo.id))
+    await incrementar(
+        engine, chave_grupo(grupo.id), chave_despesas_do_grupo(grupo.id), chave_membros_do_grupo(grupo.id),
+        *map(chave_usuario, afetados), *map(chave_despesa, despesas),
+    )
+    publicar(str(grupo.id), "grupo.removido", {"id": str(grupo.id)})
     return {"message": "Grupo deletado com sucesso!"}
 
 
 # Adicionar usuário ao grupo
 @router.post("/{grupo_id}/usuarios/{usuario_id}")
 async def adicionar_usuario_ao_grupo(grupo_id: str, usuario_id: str):
-    grupo = await get_grupo_or_404(grupo_id)
-    usuario = await engine.find_one(Usuario, Usuario.id == ObjectId(usuario_id))
+    grupo = await get_grupo_or_404(grupo_id, usar_cache=False)
+    usuario = await cache_entidades.obter(engine, Usuario, ObjectId(usuario_id), usar_cache=False)
 
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
-    if usuario.id in grupo.usuarios:
+    # Upsert no índice único (grupo_id, usuario_id): entradas simultâneas não se perdem
+    if not await adicionar_membros(engine, str(grupo.id), [str(usuario.id)]):
         raise HTTPException(status_code=400, detail="Usuário já está no grupo")
-
-    grupo.usuarios.append(usuario.id)
-    await engine.save(grupo)
+    await incrementar(engine, chave_membros_do_grupo(grupo.id), chave_usuario(usuario.id))
+    publicar(str(grupo.id), "membro.adicionado", {"usuarios_ids": [str(usuario.id)]})
 
     return {"message": "Usuário adicionado ao grupo com sucesso!"}
 
 
+# Adicionar vários usuários ao grupo de uma vez (lista de IDs no corpo)
+@router.post("/{grupo_id}/usuarios")
+async def adicionar_usuarios_ao_grupo(grupo_id: str, usuarios_ids: List[str] = Body(...)):
+    grupo = await get_grupo_or_404(grupo_id, usar_cache=False)
+
+    existentes = await usuarios_existentes(engine, usuarios_ids)
+    novos = await adicionar_membros(engine, str(grupo.id), existentes)
+    if novos:
+        await incrementar(engine, chave_membros_do_grupo(grupo.id), *map(chave_usuario, novos))
+        publicar(str(grupo.id), "membro.adicionado", {"usuarios_ids": novos})
+
+    return {
+        "adicionados": novos,
+        "nao_encontrados": sorted(set(usuarios_ids) - set(existentes)),
+    }
+
+
 # Remover usuário do grupo
 @router.delete("/{grupo_id}/usuarios/{usuario_id}")
 async def remover_usuario_do_grupo(grupo_id: str, usuario_id: str):
-    grupo = await get_grupo_or_404(grupo_id)
+    grupo = await get_grupo_or_404(grupo_id, usar_cache=False)
 
-    if usuario_id not in grupo.usuarios:
+    # Se nada foi removido, o usuário não estava no grupo
+    if not await remover_membros(engine, str(grupo.id), [usuario_id]):
         raise HTTPException(status_code=404, detail="Usuário não encontrado no grupo")
-
-    grupo.usuarios.remove(usuario_id)
-    await engine.save(grupo)
+    await incrementar(engine, chave_membros_do_grupo(grupo.id), chave_usuario(usuario_id))
+    publicar(str(grupo.id), "membro.removido", {"usuarios_ids": [usuario_id]})
 
     return {"message": "Usuário removido do grupo com sucesso!"}
 
 
-# Ver todos os usuários de um grupo
+# Remover vários usuários do grupo de uma vez (lista de IDs no corpo)
+@router.delete("/{grupo_id}/usuarios")
+async def remover_usuarios_do_grupo(grupo_id: str, usuarios_ids: List[str] = Body(...)):
+    grupo = await get_grupo_or_404(grupo_id, usar_cache=False)
+
+    # Só quem de fato era membro entra na resposta, no evento e nas versões
+    removidos = await remover_membros(engine, str(grupo.id), usuarios_ids)
+    if removidos:
+        await incrementar(engine, chave_membros_do_grupo(grupo.id), *map(chave_usuario, removidos))
+        publicar(str(grupo.id), "membro.removido", {"usuarios_ids": removidos})
+
+    return {
+        "removidos": removidos,
+        "nao_encontrados": sorted(set(usuarios_ids) - set(removidos)),
+    }
+
+
+# Ver os usuários de um grupo, paginados pela coleção membro
 @router.get("/{grupo_id}/usuarios", response_model=list[Usuario])
-async def listar_usuarios_do_grupo(grupo_id: str):
+async def listar_usuarios_do_grupo(
+    grupo_id: str,
+    request: Request,
+    response: Response,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = Query(default=None, description="Cursor opaco retornado em X-Next-Cursor"),
+    contar: bool = Query(default=False, description="Inclui o total de membros em X-Total-Count"),
+):
+    # Os dados dos usuários também contam: atualizar um usuário incrementa os membros dos seus grupos
+    nao_modificado = await responder_se_nao_modificado(
+        engine, request, response, [chave_grupo(grupo_id), chave_membros_do_grupo(grupo_id)]
+    )
+    if nao_modificado:
+        return nao_modificado
+
     grupo = await get_grupo_or_404(grupo_id)
 
-    usuarios = await engine.find(Usuario, Usuario.id.in_(grupo.usuarios))
-    return usuarios
+    depois_de = decodificar_cursor(cursor)[0] if cursor else None
+    membros = await pagina_de_membros(engine, "grupo_id", str(grupo.id), depois_de, limit)
+    definir_proximo_cursor(response, membros, limit, "usuario_id")
+    if contar:
+        response.headers[HEADER_TOTAL] = str(
+            await contar_total(engine.get_collection(Membro), {"grupo_id": str(grupo.id)})
+        )
 
+    return await carregar_na_ordem(engine, Usuario, [m.usuario_id for m in membros])
 
-# Adicionar despesa ao grupo
+
+# Mover uma despesa para o grupo (a despesa guarda o grupo em `grupo_id`)
 @router.post("/{grupo_id}/despesas/{despesa_id}")
 async def adicionar_despesa_ao_grupo(grupo_id: str, despesa_id: str):
-    grupo = await get_grupo_or_404(grupo_id)
-    despesa = await engine.find_one(Despesa, Despesa.id == ObjectId(despesa_id))
-
-    if not despesa:
+    grupo = await get_grupo_or_404(grupo_id, usar_cache=False)
+
+    # Troca condicional: o documento anterior diz de onde sair no resumo (como em atualizar_despesa)
+    anterior = await engine.get_collection(Despesa).find_one_and_update(
+        {"_id": ObjectId(despesa_id), "grupo_id": {"$ne": str(grupo.id)}},
+        {"$set": {"grupo_id": str(grupo.id)}},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if anterior is None:
+        if await engine.get_collection(Despesa).find_one({"_id": ObjectId(despesa_id)}, {"_id": 1}):
+            raise HTTPException(status_code=400, detail="Despesa já adicionada ao grupo")
         raise HTTPException(status_code=404, detail="Despesa não encontrada")
+    despesa = Despesa.model_validate_doc({**anterior, "grupo_id": str(grupo.id)})
 
-    if despesa.id in grupo.despesas:
-        raise HTTPException(status_code=400, detail="Despesa já adicionada ao grupo")
-
-    grupo.despesas.append(despesa.id)
-    await engine.save(grupo)
+    cache_entidades.invalidar(Despesa, despesa.id)
+    await mover_despesa(engine, anterior, despesa)
+    await incrementar(
+        engine, chave_despesa(despesa.id),
+        chave_despesas_do_grupo(anterior["grupo_id"]), chave_despesas_do_grupo(grupo.id),
+    )
+    publicar(str(grupo.id), "despesa.atualizada", despesa)
+    publicar(anterior["grupo_id"], "despesa.removida", {"id": str(despesa.id)})
 
     return {"message": "Despesa adicionada ao grupo com sucesso!"}
 
 
-# Remover despesa do grupo
-@router.delete("/{grupo_id}/despesas/{despesa_id}")
-async def remover_despesa_do_grupo(grupo_id: str, despesa_id: str):
+# Ver as despesas de um grupo (consulta por grupo_id, paginada por cursor na ordem de data)
+@router.get("/{grupo_id}/despesas", response_model=list[Despesa])
+async def listar_despesas_do_grupo(
+    grupo_id: str,
+    response: Response,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = Query(default=None, description="Cursor opaco retornado em X-Next-Cursor"),
+):
     grupo = await get_grupo_or_404(grupo_id)
 
-    if despesa_id not in grupo.despesas:
-        raise HTTPException(status_code=404, detail="Despesa não encontrada no grupo")
+    filtro = {"grupo_id": str(grupo.id)}
+    if cursor:
+        data, ultimo_id = decodificar_cursor(cursor)
+        filtro["$or"] = [{"data": {"$gt": data}}, {"data": data, "_id": {"$gt": ultimo_id}}]
+    docs = await engine.get_collection(Despesa).find(
+        filtro, sort=[("data", ASCENDING), ("_id", ASCENDING)], limit=limit
+    ).to_list(length=limit)
+    definir_proximo_cursor(response, docs, limit, "data")
+    return responder_documentos(Despesa, docs, None, response)
+
+
+# Stream (Server-Sent Events) com as mudanças de despesas e membros do grupo, no lugar de polling
+@router.get("/{grupo_id}/eventos", response_class=StreamingResponse)
+async def acompanhar_eventos_do_grupo(
+    grupo_id: str,
+    request: Request,
+    last_event_id: Optional[str] = Header(default=None, description="Último evento recebido (retomada)"),
+):
+    grupo = await get_grupo_or_404(grupo_id)
+    return StreamingResponse(
+        transmitir(request, str(grupo.id), last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    grupo.despesas.remove(despesa_id)
-    await engine.save(grupo)
 
-    return {"message": "Despesa removida do grupo com sucesso!"}
+# Saldo de cada membro (pago - devido) calculado a partir das despesas do grupo
+@router.get("/{grupo_id}/saldos")
+async def listar_saldos_do_grupo(grupo_id: str):
+    grupo = await get_grupo_or_404(grupo_id)
+    saldos = await calcular_saldos(engine, str(grupo.id), await ids_dos_membros(engine, str(grupo.id)))
+    return {"grupo": grupo.nome, "saldos": saldos}
 
 
-# Ver todas as despesas de um grupo
-@router.get("/{grupo_id}/despesas", response_model=list[Despesa])
-async def listar_despesas_do_grupo(grupo_id: str):
+# Plano mínimo de transferências para zerar os saldos do grupo
+@router.get("/{grupo_id}/acertos")
+async def listar_acertos_do_grupo(grupo_id: str):
     grupo = await get_grupo_or_404(grupo_id)
+    saldos = await calcular_saldos(engine, str(grupo.id), await ids_dos_membros(engine, str(grupo.id)))
+    acertos = plano_de_acertos({s["usuario_id"]: s["saldo"] for s in saldos})
+    return {"grupo": grupo.nome, "acertos": acertos}
 
-    despesas = await engine.find(Despesa, Despesa.id.in_(grupo.despesas))
-    return despesas
+
+# Arquivar as despesas do grupo até uma data (ex.: depois de um acerto); saldos e totais não mudam
+@router.post("/{grupo_id}/arquivar")
+async def arquivar_despesas_do_grupo(
+    grupo_id: str,
+    ate: date = Query(..., description="Último dia (AAAA-MM-DD) a arquivar, inclusive"),
+):
+    grupo = await get_grupo_or_404(grupo_id, usar_cache=False)
+    _, fim = faixa_de_datas(None, ate)
+    return {"arquivadas": await arquivar_do_grupo(engine, str(grupo.id), fim)}
 
 
 # Ver todos os grupos
 @router.get("/", response_model=list[Grupo])
-async def listar_todos_grupos():
-    return await engine.find(Grupo)
-
-
-# Ver um grupo específico pelo ID
-@router.get("/{grupo_id}", response_model=Grupo)
-async def pegar_grupo_por_id(grupo_id: str):
-    return await get_grupo_or_404(grupo_id)
+async def listar_todos_grupos(campos: Optional[str] = Query(default=None, description=DESCRICAO_CAMPOS)):
+    selecionados = ler_campos(campos, Grupo)
+    docs = await engine.get_collection(Grupo).find({}, projecao(selecionados)).to_list(length=None)
+    return responder_documentos(Grupo, docs, selecionados)
 
 
-# Busca parcial nos nomes dos grupos
+# Busca nos nomes dos grupos (prefixo sem acentos/maiúsculas ou palavras inteiras)
 @router.get("/buscar", response_model=list[Grupo])
-async def buscar_grupo_por_nome(query: str = Query(..., description="Nome parcial do grupo para busca")):
-    regex = re.compile(query, re.IGNORECASE)
-    grupos = await engine.find(Grupo, Grupo.nome.match(regex))
-    return grupos
+async def buscar_grupo_por_nome(
+    query: str = Query(..., min_length=1, max_length=100, description="Início do nome (ou palavras, no modo texto)"),
+    modo: ModoBusca = Query(default="prefixo"),
+    limit: int = Query(default=20, ge=1, le=100),
+):
+    return await buscar_por_nome(engine, Grupo, query, modo, limit)
 
 
 # Ver todos os grupos em ordem alfabética
 @router.get("/ordenados", response_model=list[Grupo])
 async def listar_grupos_ordenados():
-    return await engine.find(Grupo, sort=Grupo.nome)
\ No newline at end of file
+    # Usa a collation do índice de 'nome' para ordenar sem sort em memória
+    cursor = engine.get_collection(Grupo).find(
+        {}, sort=[("nome", ASCENDING)], collation=COLACAO_NOME
+    )
+    return [Grupo.model_validate_doc(doc) async for doc in cursor]
+
+
+# Ver um grupo específico pelo ID
+@router.get("/{grupo_id}", response_model=Grupo)
+async def pegar_grupo_por_id(grupo_id: str, request: Request, response: Response):
+    nao_modificado = await responder_se_nao_modificado(engine, request, response, [chave_grupo(grupo_id)])
+    if nao_modificado:
+        return nao_modificado
+    # A ETag vem do contador compartilhado: o corpo também vem do banco, não do cache do processo
+    return await get_grupo_or_404(grupo_id, usar_cache=False)
@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from database import verificar_prontidao
+
+router = APIRouter(
+    prefix="/health",
+    tags=["saude"],
+)
+
+
+# O processo está no ar (não consulta o banco)
+@router.get("/live")
+async def vivo():
+    return {"status": "ok"}
+
+
+# Pronto para tráfego: banco respondendo, com latência do ping e ocupação do pool
+@router.get("/ready")
+async def pronto():
+    situacao = await verificar_prontidao()
+    return JSONResponse(situacao, status_code=200 if situacao["pronto"] else 503)
@@ -1,10 +1,20 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from database import get_engine
-from models import Usuario, Grupo, Despesa
+from models import Usuario, Grupo, Despesa, DespesaArquivada, COLACAO_NOME
+from paginacao import decodificar_cursor, definir_proximo_cursor, contar_total, HEADER_TOTAL
+from importacao import inserir_em_lotes, ler_linhas, TAMANHO_LOTE_IMPORTACAO, TAMANHO_LOTE_MAXIMO
+from cache import cache_entidades
+from busca import buscar_por_nome, ModoBusca
+from arquivamento import buscar_despesas
+from relatorios import faixa_de_datas, filtro_de_datas
+from membros import carregar_na_ordem, excluir_membros_do_usuario, ids_dos_grupos, pagina_de_membros
+from serializacao import ler_campos, projecao, responder_documentos, DESCRICAO_CAMPOS
+from versoes import incrementar, responder_se_nao_modificado, chave_membros_do_grupo, chave_usuario, USUARIOS
 from odmantic import ObjectId
-import re
 from starlette import status
-from typing import List
+from typing import List, Optional
+from datetime import date
+from pymongo import ASCENDING
 
 
 
@@ -17,37 +27,65 @@ engine = get_engine()
 
 
 # Função buscar um usuário ou retornar erro
-async def get_usuario_or_404(usuario_id: str) -> Usuario:
-    usuario = await engine.find_one(Usuario, Usuario.id == ObjectId(usuario_id))
+async def get_usuario_or_404(usuario_id: str, usar_cache: bool = True) -> Usuario:
+    usuario = await cache_entidades.obter(engine, Usuario, ObjectId(usuario_id), usar_cache)
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     return usuario
 
 
+# O usuário aparece na listagem de membros dos seus grupos e nas despesas expandidas
+async def incrementar_versoes_do_usuario(usuario_id: str, grupos_ids: List[str]) -> None:
+    await incrementar(engine, chave_usuario(usuario_id), USUARIOS, *map(chave_membros_do_grupo, grupos_ids))
+
+
 # Criar um usuário
 @router.post("/", response_model=Usuario)
 async def criar_usuario(usuario: Usuario):
     await engine.save(usuario)
+    cache_entidades.invalidar(Usuario, usuario.id)
     return usuario
 
 
+# Criar vários usuários de uma vez (lista JSON ou CSV enviado com Content-Type: text/csv)
+@router.post("/bulk")
+async def criar_usuarios_em_lote(
+    request: Request,
+    tamanho_lote: int = Query(default=TAMANHO_LOTE_IMPORTACAO, ge=1, le=TAMANHO_LOTE_MAXIMO),
+):
+    async def ao_inserir(docs):
+        cache_entidades.invalidar(Usuario, *(doc["_id"] for doc in docs))
+
+    return await inserir_em_lotes(
+        engine.get_collection(Usuario), Usuario, ler_linhas(request), tamanho_lote,
+        ao_inserir=ao_inserir,
+    )
+
+
 # Atualizar um usuário
 @router.put("/{usuario_id}", response_model=Usuario)
 async def atualizar_usuario(usuario_id: str, usuario_atualizado: Usuario):
-    usuario = await get_usuario_or_404(usuario_id)
+    usuario = await get_usuario_or_404(usuario_id, usar_cache=False)
 
     usuario.nome = usuario_atualizado.nome
+    usuario.nome_normalizado = usuario_atualizado.nome_normalizado
     usuario.email = usuario_atualizado.email
 
     await engine.save(usuario)
+    cache_entidades.invalidar(Usuario, usuario.id)
+    await incrementar_versoes_do_usuario(str(usuario.id), await ids_dos_grupos(engine, str(usuario.id)))
     return usuario
 
 
 # Excluir um usuário
 @router.delete("/{usuario_id}")
 async def excluir_usuario(usuario_id: str):
-    usuario = await get_usuario_or_404(usuario_id)
+    usuario = await get_usuario_or_404(usuario_id, usar_cache=False)
+    grupos_ids = await ids_dos_grupos(engine, str(usuario.id))
     await engine.delete(usuario)
+    cache_entidades.invalidar(Usuario, usuario.id)
+    await excluir_membros_do_usuario(engine, str(usuario.id))
+    await incrementar_versoes_do_usuario(str(usuario.id), grupos_ids)
     return {"message": "Usuário deletado com sucesso!"}
 
 
@@ -62,46 +100,82 @@ async def excluir_usuario(usuario_id: str):
     status_code=status.HTTP_200_OK
 )
 async def listar_usuarios(
+    response: Response,
     skip: int = Query(default=0, ge=0),
-    limit: int = Query(default=5, le=100)
+    limit: int = Query(default=5, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="Cursor opaco retornado em X-Next-Cursor"),
+    contar: bool = Query(default=False, description="Inclui o total estimado em X-Total-Count"),
+    campos: Optional[str] = Query(default=None, description=DESCRICAO_CAMPOS),
 ) -> List[Usuario]:
     """
     Retorna uma lista de usuários com paginação, sempre ordenando por 'nome'.
-    """
 
-    engine = get_engine()  # Removido 'await'
+    Com `cursor`, a página começa logo após o último item da página anterior
+    (chave `(nome, _id)`), sem percorrer os documentos já vistos; `skip` é ignorado.
+    O cursor da próxima página vem no cabeçalho `X-Next-Cursor`.
+    Com `campos`, só os campos pedidos (e `nome`, usado no cursor) são lidos do MongoDB.
+    """
 
-    usuarios = await engine.find(
-        Usuario,
-        sort=Usuario.nome,  # Sempre ordena por 'name'
+    selecionados = ler_campos(campos, Usuario, obrigatorios=["nome"])
+    filtro = {}
+    if cursor:
+        nome, ultimo_id = decodificar_cursor(cursor)
+        filtro = {"$or": [{"nome": {"$gt": nome}}, {"nome": nome, "_id": {"$gt": ultimo_id}}]}
+        skip = 0
+
+    # Consulta direta na coleção para usar a mesma collation do índice de 'nome'
+    colecao = engine.get_collection(Usuario)
+    docs = await colecao.find(
+        filtro,
+        projecao(selecionados),
+        sort=[("nome", ASCENDING), ("_id", ASCENDING)],  # Sempre ordena por 'nome'
         skip=skip,
-        limit=limit
-    )
+        limit=limit,
+        collation=COLACAO_NOME,
+    ).to_list(length=limit)
 
-    return usuarios
+    definir_proximo_cursor(response, docs, limit, "nome")
+    if contar:
+        response.headers[HEADER_TOTAL] = str(await contar_total(colecao))
 
-
-# Ver um usuário específico pelo ID
-@router.get("/{usuario_id}", response_model=Usuario)
-async def pegar_usuario_por_id(usuario_id: str):
-    return await get_usuario_or_404(usuario_id)
+    return responder_documentos(Usuario, docs, selecionados, response)
 
 
-# Busca parcial por nome do usuário
+# Busca por nome do usuário (prefixo sem acentos/maiúsculas ou palavras inteiras)
 @router.get("/buscar", response_model=list[Usuario])
-async def buscar_usuario_por_nome(query: str = Query(..., description="Nome parcial do usuário para busca")):
-    regex = re.compile(query, re.IGNORECASE)
-    usuarios = await engine.find(Usuario, Usuario.nome.match(regex))
-    return usuarios
+async def buscar_usuario_por_nome(
+    query: str = Query(..., min_length=1, max_length=100, description="Início do nome (ou palavras, no modo texto)"),
+    modo: ModoBusca = Query(default="prefixo"),
+    limit: int = Query(default=20, ge=1, le=100),
+):
+    return await buscar_por_nome(engine, Usuario, query, modo, limit)
+
+
+# Ver um usuário específico pelo ID
+@router.get("/{usuario_id}", response_model=Usuario)
+async def pegar_usuario_por_id(usuario_id: str, request: Request, response: Response):
+    nao_modificado = await responder_se_nao_modificado(engine, request, response, [chave_usuario(usuario_id)])
+    if nao_modificado:
+        return nao_modificado
+    # A ETag vem do contador compartilhado: o corpo também vem do banco, não do cache do processo
+    return await get_usuario_or_404(usuario_id, usar_cache=False)
 
 
-# Ver todos os grupos de um usuário
+# Ver os grupos de um usuário (índice usuario_id_grupo_id da coleção membro)
 @router.get("/{usuario_id}/grupos", response_model=list[Grupo])
-async def listar_grupos_do_usuario(usuario_id: str):
+async def listar_grupos_do_usuario(
+    usuario_id: str,
+    response: Response,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = Query(default=None, description="Cursor opaco retornado em X-Next-Cursor"),
+):
     usuario = await get_usuario_or_404(usuario_id)
 
-    grupos = await engine.find(Grupo, Grupo.membros.contains(usuario.id))
-    return grupos
+    depois_de = decodificar_cursor(cursor)[0] if cursor else None
+    membros = await pagina_de_membros(engine, "usuario_id", str(usuario.id), depois_de, limit)
+    definir_proximo_cursor(response, membros, limit, "grupo_id")
+
+    return await carregar_na_ordem(engine, Grupo, [m.grupo_id for m in membros])
 
 
 # Ver todas as despesas de um usuário
@@ -112,19 +186,21 @@ async def listar_grupos_do_usuario(usuario_id: str):
 #     despesas = await engine.find(Despesa, Despesa.usuarios_ids==usuario.id)
 #     return despesas
 @router.get("/{usuario_id}/despesas", response_model=list[Despesa])
-async def listar_despesas_do_usuario(usuario_id: str):
+async def listar_despesas_do_usuario(
+    usuario_id: str,
+    de: Optional[date] = Query(default=None, description="Primeiro dia (AAAA-MM-DD); antes do limite do arquivo, inclui as arquivadas"),
+    ate: Optional[date] = Query(default=None, description="Último dia (AAAA-MM-DD), inclusive"),
+):
+    inicio, fim = faixa_de_datas(de, ate)
     usuario = await get_usuario_or_404(usuario_id)
 
-    # Log para verificar o ID do usuário encontrado
-    print(f"Usuário encontrado: {usuario}")
-
     # Buscando despesas onde o ID do usuário está na lista de usuarios_ids
-    despesas = await engine.find(Despesa, Despesa.usuarios_ids == usuario.id)
-    
-    # Log para verificar as despesas encontradas
-    print(f"Despesas encontradas: {despesas}")
+    # (tempo da consulta aparece em /metrics, em mongo_comando_duracao_segundos)
+    # usuarios_ids guarda os ids como texto; sem `de`, só as ativas (ver arquivamento.py)
+    filtro = {"usuarios_ids": str(usuario.id), **filtro_de_datas(inicio, fim)}
+    docs = await buscar_despesas(engine, filtro, None, inicio)
 
-    return despesas
+    return [Despesa.model_validate_doc(doc) for doc in docs]
 
 
 # Excluir próprio usuário (somente se não houver despesas pendentes)
@@ -143,11 +219,18 @@ async def listar_despesas_do_usuario(usuario_id: str):
 async def autoexcluir_usuario(usuario_id: str):
     usuario = await get_usuario_or_404(usuario_id)
 
-    # Modifique a consulta para usar um operador de consulta apropriado
-    despesas_pendentes = await engine.find(Despesa, Despesa.usuarios_ids == usuario.id)
-    
-    if despesas_pendentes:
+    # Basta saber se existe ao menos uma despesa (usa o índice multikey de usuarios_ids).
+    # As arquivadas também contam: arquivar não acerta nada e os saldos continuam incluindo-as
+    despesa_pendente = await engine.find_one(Despesa, Despesa.usuarios_ids == str(usuario.id))
+    if not despesa_pendente:
+        despesa_pendente = await engine.find_one(DespesaArquivada, DespesaArquivada.usuarios_ids == str(usuario.id))
+
+    if despesa_pendente:
         raise HTTPException(status_code=400, detail="Não é possível excluir enquanto houver despesas pendentes")
 
+    grupos_ids = await ids_dos_grupos(engine, str(usuario.id))
     await engine.delete(usuario)
+    cache_entidades.invalidar(Usuario, usuario.id)
+    await excluir_membros_do_usuario(engine, str(usuario.id))
+    await incrementar_versoes_do_usuario(str(usuario.id), grupos_ids)
     return {"message": "Usuário excluído com sucesso!"}
\ No newline at end of file
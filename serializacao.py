@@ -0,0 +1,165 @@
+"""Respostas de listagem montadas direto dos documentos do MongoDB.
+
+- `ler_campos` valida o parâmetro `campos=` (sparse fieldset) e vira projeção no
+  `find`, então o MongoDB nem envia os outros campos;
+- `responder_documentos` converte os documentos brutos (já decodificados pelo
+  driver) em JSON sem instanciar modelos ODMantic nem passar pelo
+  `response_model` do FastAPI: a saída tem o mesmo formato (`id` como string,
+  padrões do modelo para campos ausentes, campos `float`/`int` convertidos como
+  o pydantic faria, campos desconhecidos e internos descartados). Os demais
+  valores saem como estão no banco, sem validação. Usa `orjson` quando instalado;
+- `CompressaoGZip` comprime respostas acima de um tamanho mínimo quando o
+  cliente aceita gzip.
+
+Configuração (variáveis de ambiente):
+    RESPOSTA_GZIP_MINIMO  bytes a partir dos quais a resposta é comprimida (padrão 1024)
+    RESPOSTA_GZIP_NIVEL   nível de compressão, 1 a 9 (padrão 5)
+"""
+import json
+import os
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Type, Union, get_args, get_origin
+
+from bson import ObjectId
+from fastapi import HTTPException, Response
+from odmantic import Model
+from pydantic_core import PydanticUndefined
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+
+from models import CAMPOS_INTERNOS
+
+try:
+    import orjson
+except ImportError:  # opcional: sem ele, usa o json da biblioteca padrão
+    orjson = None
+
+GZIP_TAMANHO_MINIMO = int(os.getenv("RESPOSTA_GZIP_MINIMO", "1024"))
+GZIP_NIVEL = int(os.getenv("RESPOSTA_GZIP_NIVEL", "5"))
+
+DESCRICAO_CAMPOS = "Campos a devolver, separados por vírgula (ex.: titulo,valor); o id sempre vem"
+
+
+def _padrao_json(valor):
+    if isinstance(valor, ObjectId):
+        return str(valor)
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def codificar_json(conteudo) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(conteudo, default=_padrao_json)
+    return json.dumps(conteudo, default=_padrao_json, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class RespostaJSONRapida(Response):
+    media_type = "application/json"
+
+    def render(self, conteudo) -> bytes:
+        return codificar_json(conteudo)
+
+
+# Campos públicos de cada modelo (sem o id e os internos) com seus valores padrão, calculados uma vez
+_PADROES: Dict[type, dict] = {}
+_CONVERSORES: Dict[type, dict] = {}
+
+
+def _padroes(modelo: Type[Model]) -> dict:
+    padroes = _PADROES.get(modelo)
+    if padroes is None:
+        padroes = {}
+        for nome, campo in modelo.model_fields.items():
+            if nome == "id" or nome in CAMPOS_INTERNOS:
+                continue
+            obrigatorio = campo.default is PydanticUndefined and campo.default_factory is None
+            padroes[nome] = None if obrigatorio else campo.get_default(call_default_factory=True)
+        padroes = _PADROES[modelo] = padroes
+    return padroes
+
+
+def _para_float(valor):
+    return float(valor) if isinstance(valor, int) and not isinstance(valor, bool) else valor
+
+
+def _para_int(valor):
+    return int(valor) if isinstance(valor, float) and valor.is_integer() else valor
+
+
+# Conversões numéricas que o modelo aplicaria (ex.: `valor` gravado como 10 sai como 10.0)
+def _conversores(modelo: Type[Model]) -> Dict[str, Callable]:
+    conversores = _CONVERSORES.get(modelo)
+    if conversores is None:
+        conversores = {}
+        for nome in _padroes(modelo):
+            tipo = modelo.model_fields[nome].annotation
+            argumentos = [arg for arg in get_args(tipo) if arg is not type(None)]
+            if get_origin(tipo) is Union and len(argumentos) == 1:
+                tipo = argumentos[0]  # Optional[float] -> float
+            if tipo is float:
+                conversores[nome] = _para_float
+            elif tipo is int:
+                conversores[nome] = _para_int
+        _CONVERSORES[modelo] = conversores
+    return conversores
+
+
+# Lê "campos=titulo,valor"; nomes desconhecidos viram erro 400. `obrigatorios` (ex.: a chave
+# de ordenação usada no cursor) sempre entram na projeção
+def ler_campos(campos: Optional[str], modelo: Type[Model], obrigatorios: Iterable[str] = ()) -> Optional[List[str]]:
+    if not campos:
+        return None
+    pedidos = [nome.strip() for nome in campos.split(",") if nome.strip() and nome.strip() != "id"]
+    desconhecidos = sorted(set(pedidos) - set(_padroes(modelo)))
+    if desconhecidos:
+        raise HTTPException(status_code=400, detail=f"Campos desconhecidos: {', '.join(desconhecidos)}")
+    return list(dict.fromkeys([*pedidos, *obrigatorios]))
+
+
+def projecao(campos: Optional[List[str]]) -> Optional[dict]:
+    return {nome: 1 for nome in campos} if campos else None
+
+
+def converter_documentos(modelo: Type[Model], docs: List[dict], campos: Optional[List[str]] = None) -> List[dict]:
+    padroes = _padroes(modelo)
+    nomes = campos or list(padroes)
+    conversores = [(nome, converter) for nome, converter in _conversores(modelo).items() if nome in nomes]
+    convertidos = []
+    for doc in docs:
+        linha = {nome: doc.get(nome, padroes[nome]) for nome in nomes}
+        for nome, converter in conversores:
+            linha[nome] = converter(linha[nome])
+        linha["id"] = doc["_id"]
+        convertidos.append(linha)
+    return convertidos
+
+
+def responder_documentos(
+    modelo: Type[Model], docs: List[dict], campos: Optional[List[str]] = None, response: Optional[Response] = None
+) -> RespostaJSONRapida:
+    """Resposta JSON dos documentos brutos, levando os cabeçalhos já definidos em `response`."""
+    cabecalhos = dict(response.headers) if response is not None else None
+    if cabecalhos:
+        cabecalhos.pop("content-length", None)
+    return RespostaJSONRapida(converter_documentos(modelo, docs, campos), headers=cabecalhos)
+
+
+class _RespostaGZip(GZipResponder):
+    async def send_with_gzip(self, message) -> None:
+        await super().send_with_gzip(message)
+        if message["type"] == "http.response.start":
+            # Streams SSE passam sem compressão: o GzipFile seguraria os eventos no buffer
+            tipo = Headers(raw=message["headers"]).get("content-type", "")
+            self.content_encoding_set = self.content_encoding_set or tipo.startswith("text/event-stream")
+
+
+class CompressaoGZip(GZipMiddleware):
+    """GZipMiddleware do Starlette, exceto para text/event-stream."""
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("accept-encoding", ""):
+            responder = _RespostaGZip(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -0,0 +1,86 @@
+"""Fixtures dos testes: a aplicação roda contra o mongomock_motor (sem servidor MongoDB).
+
+O cache de entidades e a coalescência ficam desligados para que a contagem de
+comandos dependa só da rota, e não da ordem ou do tempo entre as requisições.
+"""
+import os
+
+# Antes de importar a aplicação: database.py exige DATABASE_URL e os módulos leem o resto na importação
+os.environ["DATABASE_URL"] = "mongodb://localhost:27017"
+os.environ["DATABASE_NAME"] = "facilitae_testes"
+os.environ["CACHE_ENTIDADES_ATIVO"] = "0"
+os.environ["COALESCENCIA_ATIVA"] = "0"
+
+from collections import Counter
+
+import mongomock.collection
+import mongomock_motor
+import pytest
+from fastapi.testclient import TestClient
+from odmantic import AIOEngine
+
+import database
+import main
+
+# Comandos contados por coleção (os mesmos nomes dos métodos do Motor)
+COMANDOS = [
+    "aggregate", "bulk_write", "count_documents", "delete_many", "delete_one", "estimated_document_count",
+    "find", "find_one", "find_one_and_delete", "find_one_and_replace", "find_one_and_update",
+    "insert_many", "insert_one", "replace_one", "update_many", "update_one",
+]
+
+
+# O pymongo 4.11 passa `sort` para o add_update do bulk, que o mongomock ainda não aceita
+_add_update = mongomock.collection.BulkOperationBuilder.add_update
+
+
+def _add_update_sem_sort(self, *args, sort=None, **kwargs):
+    return _add_update(self, *args, **kwargs)
+
+
+mongomock.collection.BulkOperationBuilder.add_update = _add_update_sem_sort
+
+
+# engine.save abre uma sessão, que o mongomock não implementa: uma sessão vazia basta (sem transações)
+class _SessaoVazia:
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *excecao):
+        return False
+
+
+async def _iniciar_sessao(*args, **kwargs) -> _SessaoVazia:
+    return _SessaoVazia()
+
+
+async def _conectar_mongomock() -> AIOEngine:
+    database.client = mongomock_motor.AsyncMongoMockClient()
+    database.client.start_session = _iniciar_sessao
+    database._engine = AIOEngine(client=database.client, database=database.DATABASE_NAME)
+    return database._engine
+
+
+@pytest.fixture
+def cliente(monkeypatch):
+    """TestClient com o lifespan completo sobre um banco mongomock novo."""
+    monkeypatch.setattr(main, "conectar", _conectar_mongomock)
+    with TestClient(main.app) as cliente:
+        yield cliente
+
+
+@pytest.fixture
+def comandos(monkeypatch):
+    """Counter de (coleção, comando) chamados pela aplicação; use `.clear()` antes do trecho medido."""
+    contagem = Counter()
+    classe = mongomock_motor.AsyncMongoMockCollection
+    for nome in COMANDOS:
+        original = getattr(classe, nome)
+
+        def contar(self, *args, _original=original, _nome=nome, **kwargs):
+            contagem[(self.name, _nome)] += 1
+            return _original(self, *args, **kwargs)
+
+        monkeypatch.setattr(classe, nome, contar)
+    return contagem
+
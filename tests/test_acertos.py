@@ -0,0 +1,45 @@
+from collections import defaultdict
+
+import pytest
+
+from acertos import plano_de_acertos
+
+
+def _saldos_finais(saldos, transferencias):
+    finais = defaultdict(int, {usuario_id: round(valor * 100) for usuario_id, valor in saldos.items()})
+    for transferencia in transferencias:
+        centavos = round(transferencia["valor"] * 100)
+        finais[transferencia["de"]] += centavos
+        finais[transferencia["para"]] -= centavos
+    return finais
+
+
+@pytest.mark.parametrize("saldos", [
+    {"a": 30.0, "b": -10.0, "c": -20.0},
+    {"a": 50.0, "b": 25.5, "c": -40.25, "d": -35.25},
+    {"a": 10.0, "b": -3.33, "c": -3.33, "d": -3.34},
+])
+def test_plano_zera_os_saldos(saldos):
+    transferencias = plano_de_acertos(saldos)
+    assert len(transferencias) <= len(saldos) - 1
+    assert all(t["valor"] > 0 for t in transferencias)
+    assert all(saldos[t["de"]] < 0 < saldos[t["para"]] for t in transferencias)
+    assert not any(_saldos_finais(saldos, transferencias).values())
+
+
+def test_maior_devedor_paga_maior_credor():
+    transferencias = plano_de_acertos({"a": 70.0, "b": 30.0, "c": -60.0, "d": -40.0})
+    assert transferencias[0] == {"de": "c", "para": "a", "valor": 60.0}
+
+
+def test_sobra_de_arredondamento_nao_gera_transferencia_a_mais():
+    # 10 dividido por 3: os saldos não fecham em centavos
+    saldos = {"a": 20 / 3, "b": -10 / 3, "c": -10 / 3}
+    transferencias = plano_de_acertos(saldos)
+    assert len(transferencias) == 2
+    assert sum(t["valor"] for t in transferencias) == pytest.approx(6.67, abs=0.01)
+
+
+def test_saldos_zerados_nao_geram_transferencias():
+    assert plano_de_acertos({}) == []
+    assert plano_de_acertos({"a": 0.0, "b": 0.0}) == []
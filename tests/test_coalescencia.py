@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from coalescencia import Coalescedor
+
+
+def _rodar(corrotina):
+    return asyncio.run(corrotina)
+
+
+def _consulta_contada(resultado="ok", espera=0.01):
+    chamadas = []
+
+    async def consulta():
+        chamadas.append(1)
+        await asyncio.sleep(espera)
+        return resultado
+
+    return consulta, chamadas
+
+
+def test_leituras_simultaneas_compartilham_a_consulta():
+    coalescedor = Coalescedor(janela=0)
+    consulta, chamadas = _consulta_contada()
+
+    async def cenario():
+        return await asyncio.gather(*(coalescedor.executar(("c", 1), consulta) for _ in range(10)))
+
+    assert _rodar(cenario()) == ["ok"] * 10
+    assert len(chamadas) == 1
+    assert (coalescedor.executadas, coalescedor.coalescidas) == (1, 9)
+
+
+def test_chaves_diferentes_nao_se_misturam():
+    coalescedor = Coalescedor(janela=0)
+    consulta, chamadas = _consulta_contada()
+
+    async def cenario():
+        await asyncio.gather(coalescedor.executar(("c", 1), consulta), coalescedor.executar(("c", 2), consulta))
+
+    _rodar(cenario())
+    assert len(chamadas) == 2
+
+
+def test_janela_reaproveita_e_expira():
+    coalescedor = Coalescedor(janela=0.05)
+    consulta, chamadas = _consulta_contada(espera=0)
+
+    async def cenario():
+        await coalescedor.executar(("c",), consulta)
+        await coalescedor.executar(("c",), consulta)  # dentro da janela
+        await asyncio.sleep(0.08)
+        await coalescedor.executar(("c",), consulta)  # janela expirada
+
+    _rodar(cenario())
+    assert len(chamadas) == 2
+    assert coalescedor.na_janela == 1
+
+
+def test_invalidar_descarta_resultado_recente_e_consulta_em_andamento():
+    coalescedor = Coalescedor(janela=10)
+    consulta, chamadas = _consulta_contada()
+
+    async def cenario():
+        await coalescedor.executar(("c",), consulta)
+        coalescedor.invalidar()
+        em_andamento = asyncio.ensure_future(coalescedor.executar(("c",), consulta))
+        await asyncio.sleep(0)
+        coalescedor.invalidar()  # uma escrita durante a consulta
+        await coalescedor.executar(("c",), consulta)
+        await em_andamento
+
+    _rodar(cenario())
+    assert len(chamadas) == 3
+    assert coalescedor.estatisticas()["em_andamento"] == 0
+
+
+def test_erro_chega_a_todos_e_nao_fica_guardado():
+    coalescedor = Coalescedor(janela=10)
+    chamadas = []
+
+    async def falha():
+        chamadas.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("servidor indisponível")
+
+    async def cenario():
+        resultados = await asyncio.gather(
+            *(coalescedor.executar(("c",), falha) for _ in range(3)), return_exceptions=True
+        )
+        assert all(isinstance(r, RuntimeError) for r in resultados)
+        with pytest.raises(RuntimeError):
+            await coalescedor.executar(("c",), falha)
+
+    _rodar(cenario())
+    assert len(chamadas) == 2
+
+
+def test_desligado_sempre_consulta():
+    coalescedor = Coalescedor(ativo=False)
+    consulta, chamadas = _consulta_contada()
+
+    async def cenario():
+        await asyncio.gather(*(coalescedor.executar(("c",), consulta) for _ in range(4)))
+
+    _rodar(cenario())
+    assert len(chamadas) == 4
@@ -0,0 +1,84 @@
+"""Quantos comandos do MongoDB cada rota envia (contados no mongomock_motor, por coleção)."""
+from collections import Counter
+
+from bson import ObjectId
+
+
+def _por_colecao(comandos: Counter) -> Counter:
+    total = Counter()
+    for (colecao, _), quantidade in comandos.items():
+        total[colecao] += quantidade
+    return total
+
+
+def _grupo_com_despesas(cliente, quantidade: int) -> str:
+    grupo_id = cliente.post("/grupos/", json={"nome": "Viagem"}).json()["id"]
+    for i in range(quantidade):
+        resposta = cliente.post("/despesas/", json={
+            "titulo": f"Despesa {i}", "valor": 10 + i, "grupo_id": grupo_id, "data": f"2024-01-{i + 1:02d}T12:00:00",
+        })
+        assert resposta.status_code == 200
+    return grupo_id
+
+
+def test_304_nao_consulta_despesas(cliente, comandos):
+    grupo_id = _grupo_com_despesas(cliente, 3)
+    primeira = cliente.get(f"/despesas/grupo/{grupo_id}")
+    assert primeira.status_code == 200 and len(primeira.json()) == 3
+
+    comandos.clear()
+    resposta = cliente.get(f"/despesas/grupo/{grupo_id}", headers={"If-None-Match": primeira.headers["etag"]})
+
+    assert resposta.status_code == 304
+    assert _por_colecao(comandos) == Counter({"versao": 1})
+
+
+def test_resumo_le_um_documento(cliente, comandos):
+    grupo_id = _grupo_com_despesas(cliente, 5)
+
+    comandos.clear()
+    resposta = cliente.get(f"/despesas/grupo/{grupo_id}/despesas")
+
+    assert resposta.json()["total"] == sum(10 + i for i in range(5))
+    assert comandos[("resumo_grupo", "find_one")] == 1
+    assert _por_colecao(comandos)["despesa"] == 0
+
+
+def test_remover_membros_em_dois_comandos(cliente, comandos):
+    grupo_id = cliente.post("/grupos/", json={"nome": "Casa"}).json()["id"]
+    usuarios = [
+        cliente.post("/usuarios/", json={"nome": f"Usuário {i}", "email": f"u{i}@exemplo.com"}).json()["id"]
+        for i in range(30)
+    ]
+    assert len(cliente.post(f"/grupos/{grupo_id}/usuarios", json=usuarios).json()["adicionados"]) == 30
+
+    comandos.clear()
+    resposta = cliente.request("DELETE", f"/grupos/{grupo_id}/usuarios", json=usuarios + [str(ObjectId())])
+
+    assert resposta.json()["removidos"] == usuarios
+    membro = {comando: n for (colecao, comando), n in comandos.items() if colecao == "membro"}
+    assert membro == {"find": 1, "delete_many": 1}
+
+
+def test_importacao_um_insert_por_lote(cliente, comandos):
+    grupo_id = cliente.post("/grupos/", json={"nome": "Importação"}).json()["id"]
+    linhas = [{"titulo": f"Linha {i}", "valor": i, "grupo_id": grupo_id} for i in range(25)]
+
+    comandos.clear()
+    resultado = cliente.post("/despesas/bulk?tamanho_lote=10", json=linhas).json()
+
+    assert resultado["inseridos"] == 25 and not resultado["erros"]
+    assert comandos[("despesa", "insert_many")] == 3
+    # Sem ids enviados pelo cliente, o arquivo não é consultado
+    assert _por_colecao(comandos)["despesa_arquivo"] == 0
+
+
+def test_importacao_consulta_arquivo_uma_vez_por_lote(cliente, comandos):
+    grupo_id = cliente.post("/grupos/", json={"nome": "Importação"}).json()["id"]
+    linhas = [{"id": str(ObjectId()), "titulo": f"Linha {i}", "valor": i, "grupo_id": grupo_id} for i in range(25)]
+
+    comandos.clear()
+    resultado = cliente.post("/despesas/bulk?tamanho_lote=10", json=linhas).json()
+
+    assert resultado["inseridos"] == 25
+    assert comandos[("despesa_arquivo", "find")] == 3
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from importacao import _linhas_csv, _registros_csv
+
+
+class _Corpo:
+    """Requisição mínima: só o stream do corpo, entregue nos pedaços dados."""
+
+    def __init__(self, pedacos):
+        self.pedacos = pedacos
+
+    async def stream(self):
+        for pedaco in self.pedacos:
+            yield pedaco
+
+
+def _ler(gerador):
+    async def coletar():
+        return [item async for item in gerador]
+    return asyncio.run(coletar())
+
+
+def _em_pedacos(texto: str, tamanho: int):
+    dados = texto.encode("utf-8")
+    return [dados[i:i + tamanho] for i in range(0, len(dados), tamanho)]
+
+
+CSV = (
+    '\ufefftitulo,valor,grupo_id,usuarios_ids\r\n'  # com BOM, como o Excel grava
+    'Mercado,10.5,g1,u1;u2\r\n'
+    '"Jantar, com ""vinho""",42,g1,u1\r\n'
+    '"Conta\nem duas\nlinhas",7,g2,\r\n'
+    'Padaria,3,g2,u3'  # sem quebra de linha no fim
+)
+
+ESPERADO = [
+    ["titulo", "valor", "grupo_id", "usuarios_ids"],
+    ["Mercado", "10.5", "g1", "u1;u2"],
+    ['Jantar, com "vinho"', "42", "g1", "u1"],
+    ["Conta\nem duas\nlinhas", "7", "g2", ""],
+    ["Padaria", "3", "g2", "u3"],
+]
+
+
+@pytest.mark.parametrize("tamanho", [1, 2, 3, 7, 64, 10_000])
+def test_registros_independem_da_divisao_do_corpo(tamanho):
+    # Pedaços de 1 byte também cortam caracteres UTF-8 e o BOM ao meio
+    assert _ler(_registros_csv(_Corpo(_em_pedacos(CSV, tamanho)))) == ESPERADO
+
+
+def test_linhas_convertidas_pelo_cabecalho():
+    linhas = _ler(_linhas_csv(_Corpo(_em_pedacos(CSV + "\n\n", 5))))
+    assert linhas[0] == {"titulo": "Mercado", "valor": "10.5", "grupo_id": "g1", "usuarios_ids": ["u1", "u2"]}
+    # Campo vazio fica de fora (o modelo aplica o padrão); linhas em branco são ignoradas
+    assert linhas[2] == {"titulo": "Conta\nem duas\nlinhas", "valor": "7", "grupo_id": "g2"}
+    assert len(linhas) == 4
+
+
+def test_corpo_vazio():
+    assert _ler(_registros_csv(_Corpo([]))) == []
+    assert _ler(_linhas_csv(_Corpo([b"titulo,valor\n"]))) == []
@@ -0,0 +1,38 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException, Response
+
+from paginacao import HEADER_PROXIMO_CURSOR, codificar_cursor, decodificar_cursor, definir_proximo_cursor
+
+
+@pytest.mark.parametrize("valor", [datetime(2024, 2, 29, 13, 45, 7, 123000), "usuário-ção", ""])
+def test_cursor_ida_e_volta(valor):
+    _id = ObjectId()
+    assert decodificar_cursor(codificar_cursor(valor, _id)) == (valor, _id)
+
+
+def test_cursor_e_seguro_para_url():
+    cursor = codificar_cursor(datetime(2024, 1, 1), ObjectId())
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+
+
+@pytest.mark.parametrize("cursor", ["", "nao-e-base64!", codificar_cursor("x", ObjectId())[:-4]])
+def test_cursor_invalido_da_400(cursor):
+    with pytest.raises(HTTPException) as erro:
+        decodificar_cursor(cursor)
+    assert erro.value.status_code == 400
+
+
+def test_proximo_cursor_so_com_pagina_cheia():
+    docs = [{"_id": ObjectId(), "data": datetime(2024, 1, dia)} for dia in (1, 2, 3)]
+
+    incompleta = Response()
+    assert definir_proximo_cursor(incompleta, docs, 4, "data") is None
+    assert HEADER_PROXIMO_CURSOR not in incompleta.headers
+
+    cheia = Response()
+    cursor = definir_proximo_cursor(cheia, docs, 3, "data")
+    assert cheia.headers[HEADER_PROXIMO_CURSOR] == cursor
+    assert decodificar_cursor(cursor) == (docs[-1]["data"], docs[-1]["_id"])
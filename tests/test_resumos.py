@@ -0,0 +1,39 @@
+import asyncio
+from datetime import datetime
+
+import mongomock_motor
+from odmantic import AIOEngine
+
+from models import Despesa, ResumoGrupo
+from resumos import _recalcular_ultima_data, registrar_despesas
+
+
+def _despesa(data: datetime) -> dict:
+    return Despesa(titulo="Mercado", valor=10, grupo_id="g1", data=data).model_dump_doc()
+
+
+def test_recalculo_nao_sobrescreve_max_concorrente(monkeypatch):
+    engine = AIOEngine(client=mongomock_motor.AsyncMongoMockClient(), database="facilitae_testes")
+    nova = _despesa(datetime(2024, 5, 1))
+    concorrente = []
+    classe = mongomock_motor.AsyncMongoMockCollection
+    find_one = classe.find_one
+
+    # Uma despesa mais recente é gravada e registrada ($max) enquanto o recálculo lê o arquivo
+    async def find_one_com_escrita_concorrente(self, *args, **kwargs):
+        resultado = await find_one(self, *args, **kwargs)
+        if self.name == "despesa_arquivo" and not concorrente:
+            concorrente.append(nova)
+            await engine.get_collection(Despesa).insert_one(nova)
+            await registrar_despesas(engine, [nova])
+        return resultado
+
+    async def cenario():
+        antiga = _despesa(datetime(2024, 1, 1))
+        await engine.get_collection(Despesa).insert_one(antiga)
+        await registrar_despesas(engine, [antiga, _despesa(datetime(2024, 3, 1))])  # a de março foi excluída
+        monkeypatch.setattr(classe, "find_one", find_one_com_escrita_concorrente)
+        await _recalcular_ultima_data(engine, "g1")
+        return await engine.get_collection(ResumoGrupo).find_one({"_id": "g1"})
+
+    assert asyncio.run(cenario())["ultima_data"] == datetime(2024, 5, 1)
@@ -0,0 +1,84 @@
+"""Versões das entidades e listagens, usadas para ETag / If-None-Match.
+
+Cada chave ("grupo:<id>", "grupo:<id>:despesas", ...) é um contador na coleção
+`versao`, incrementado pelas rotas de escrita em rotas/. Uma leitura condicional
+busca só as versões de que depende (uma consulta `_id $in` nessa coleção) e,
+se a ETag bate com `If-None-Match`, responde 304 sem ler despesas, montar
+modelos ou serializar o corpo.
+
+Escritas feitas fora das rotas (scripts, migrações) não incrementam versões;
+depois delas, use `incrementar` nas chaves afetadas. `incrementar` também
+descarta as leituras coalescidas do processo (ver coalescencia.py).
+"""
+import hashlib
+from typing import Iterable, List, Optional
+
+from fastapi import Request, Response
+from odmantic import AIOEngine
+from pymongo import UpdateOne
+
+from coalescencia import buscar_documentos, coalescedor
+
+COLECAO_VERSOES = "versao"
+
+# Versão comum a todos os usuários: listagens com expand=usuarios dependem dela
+USUARIOS = "usuarios"
+
+
+def chave_grupo(grupo_id) -> str:
+    return f"grupo:{grupo_id}"
+
+
+def chave_despesas_do_grupo(grupo_id) -> str:
+    return f"grupo:{grupo_id}:despesas"
+
+
+def chave_membros_do_grupo(grupo_id) -> str:
+    return f"grupo:{grupo_id}:membros"
+
+
+def chave_usuario(usuario_id) -> str:
+    return f"usuario:{usuario_id}"
+
+
+def chave_despesa(despesa_id) -> str:
+    return f"despesa:{despesa_id}"
+
+
+async def incrementar(engine: AIOEngine, *chaves: str) -> None:
+    if not chaves:
+        return
+    operacoes = [UpdateOne({"_id": chave}, {"$inc": {"v": 1}}, upsert=True) for chave in set(chaves)]
+    await engine.database[COLECAO_VERSOES].bulk_write(operacoes, ordered=False)
+    coalescedor.invalidar()
+
+
+async def versoes(engine: AIOEngine, chaves: List[str]) -> dict:
+    docs = await buscar_documentos(engine.database[COLECAO_VERSOES], {"_id": {"$in": chaves}})
+    return {doc["_id"]: doc["v"] for doc in docs}
+
+
+def _etag(request: Request, chaves: List[str], atuais: dict) -> str:
+    # A query string entra no hash: limit/expand diferentes geram ETags diferentes
+    base = "|".join([request.url.path, str(request.url.query)] + [f"{c}={atuais.get(c, 0)}" for c in chaves])
+    return f'W/"{hashlib.sha1(base.encode()).hexdigest()[:20]}"'
+
+
+def _casa(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # Comparação fraca; "*" não é aceito porque a versão não diz se a entidade ainda existe
+    candidatos = [valor.strip().removeprefix("W/") for valor in if_none_match.split(",")]
+    return etag.removeprefix("W/") in candidatos
+
+
+async def responder_se_nao_modificado(
+    engine: AIOEngine, request: Request, response: Response, chaves: Iterable[str]
+) -> Optional[Response]:
+    """Devolve um 304 se o cliente já tem a versão atual; senão põe a ETag em `response`."""
+    chaves = sorted(set(chaves))
+    etag = _etag(request, chaves, await versoes(engine, chaves))
+    if _casa(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None